@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+'''
+Loader mechanism for the master's minion data cache
+
+.. versionadded:: Boron
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import logging
+
+# Import salt libs
+import salt.loader
+import salt.payload
+from salt.exceptions import SaltCacheError
+
+log = logging.getLogger(__name__)
+
+
+class Cache(object):
+    '''
+    Base caching object providing access to the modular cache subsystem.
+
+    The cache driver is selected with the ``cache`` option, which is the name
+    of a module in the ``salt.cache`` package and defaults to ``localfs``.
+
+    The cache is organized as a tree of banks, like a filesystem. Each bank
+    can contain any number of keys and nested banks, each key holds a single
+    data structure which can be serialized with ``salt.payload.Serial``. Any
+    piece of data in the cache is addressed by the path of its bank and the
+    name of its key, for example the cached grains and pillar of a minion are
+    stored in the ``minions/<minion id>`` bank under the ``data`` key.
+
+    Each cache module has to provide the ``store``, ``fetch``, ``updated``,
+    ``flush``, ``list`` and ``contains`` functions, ``fetch_many`` can be
+    provided to read the same key of many banks at once.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.driver = opts.get('cache', 'localfs')
+        self.serial = salt.payload.Serial(opts)
+        self._modules = None
+
+    @property
+    def modules(self):
+        '''
+        Lazily load the cache modules
+        '''
+        if self._modules is None:
+            self._modules = salt.loader.cache(self.opts, self.serial)
+        return self._modules
+
+    def _get_func(self, name):
+        '''
+        Return the function of the configured driver
+        '''
+        fun = '{0}.{1}'.format(self.driver, name)
+        if fun not in self.modules:
+            raise SaltCacheError(
+                'Cache driver \'{0}\' does not provide {1}()'.format(
+                    self.driver, name
+                )
+            )
+        return self.modules[fun]
+
+    def store(self, bank, key, data):
+        '''
+        Store data using the specified module
+
+        :param bank:
+            The name of the location inside the cache which will hold the key
+            and its associated data.
+
+        :param key:
+            The name of the key (or file inside a directory) which will hold
+            the data. File extensions should not be provided, as they will be
+            added by the driver itself.
+
+        :param data:
+            The data which will be stored in the cache. This data should be
+            in a format which can be serialized by msgpack.
+
+        :raises SaltCacheError:
+            Raises an exception if cache driver detected an error accessing
+            data in the cache backend (auth, permissions, etc).
+        '''
+        return self._get_func('store')(bank, key, data)
+
+    def fetch(self, bank, key):
+        '''
+        Fetch data using the specified module
+
+        :param bank:
+            The name of the location inside the cache which will hold the key
+            and its associated data.
+
+        :param key:
+            The name of the key (or file inside a directory) which will hold
+            the data. File extensions should not be provided, as they will be
+            added by the driver itself.
+
+        :return:
+            Return the deserialized data stored under the key, or None if
+            the key does not exist.
+
+        :raises SaltCacheError:
+            Raises an exception if cache driver detected an error accessing
+            data in the cache backend (auth, permissions, etc).
+        '''
+        return self._get_func('fetch')(bank, key)
+
+    def fetch_many(self, banks, key):
+        '''
+        Fetch the same key from a number of banks. Drivers which can read
+        many keys at once, like database backed drivers reading them in a
+        single transaction, provide a ``fetch_many`` function, otherwise each
+        key is fetched on its own.
+
+        :param banks:
+            An iterable with the names of the banks to read.
+
+        :param key:
+            The name of the key to read from each of the banks.
+
+        :return:
+            A dict mapping the names of the banks which hold the key to the
+            deserialized data.
+        '''
+        fun = '{0}.fetch_many'.format(self.driver)
+        if fun in self.modules:
+            return self.modules[fun](banks, key)
+        fetch = self._get_func('fetch')
+        ret = {}
+        for bank in banks:
+            data = fetch(bank, key)
+            if data is not None:
+                ret[bank] = data
+        return ret
+
+    def updated(self, bank, key):
+        '''
+        Get the last updated epoch for the specified key
+
+        :return:
+            Return the epoch time of the last update of the key, or None if
+            the key does not exist.
+        '''
+        return self._get_func('updated')(bank, key)
+
+    def flush(self, bank, key=None):
+        '''
+        Remove the key from the cache bank with all the key content. If no key
+        is specified remove the entire bank with all keys and sub-banks inside.
+
+        :raises SaltCacheError:
+            Raises an exception if cache driver detected an error accessing
+            data in the cache backend (auth, permissions, etc).
+        '''
+        return self._get_func('flush')(bank, key=key)
+
+    def list(self, bank):
+        '''
+        Lists entries stored in the specified bank.
+
+        :return:
+            A list of the names of the keys and sub-banks stored in the bank,
+            an empty list if the bank does not exist.
+        '''
+        return self._get_func('list')(bank)
+
+    def contains(self, bank, key=None):
+        '''
+        Checks if the specified bank contains the specified key, or if the
+        bank exists when no key is given.
+
+        :return:
+            Returns True if the specified key exists in the given bank and
+            False if not.
+        '''
+        return self._get_func('contains')(bank, key)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+'''
+Cache data in the filesystem
+
+.. versionadded:: Boron
+
+This is the default cache driver. The data is stored in the master's cachedir
+with one directory per bank and one file per key, which is the layout the
+minion data cache has always used: the grains and pillar of a minion are
+stored in ``<cachedir>/minions/<minion id>/data.p``.
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import errno
+import logging
+import os
+import shutil
+import tempfile
+
+# Import salt libs
+import salt.utils
+import salt.utils.atomicfile
+from salt.exceptions import SaltCacheError
+
+log = logging.getLogger(__name__)
+
+
+def _bank_dir(bank):
+    '''
+    Return the directory of a bank
+    '''
+    return os.path.join(__opts__['cachedir'], os.path.normpath(bank))
+
+
+def _key_file(bank, key):
+    '''
+    Return the file holding a key
+    '''
+    return os.path.join(_bank_dir(bank), '{0}.p'.format(key))
+
+
+def store(bank, key, data):
+    '''
+    Store information in a file.
+    '''
+    base = _bank_dir(bank)
+    if not os.path.isdir(base):
+        try:
+            os.makedirs(base)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise SaltCacheError(
+                    'The cache directory, {0}, could not be created: {1}'.format(
+                        base, exc
+                    )
+                )
+
+    outfile = _key_file(bank, key)
+    tmpfh, tmpfname = tempfile.mkstemp(dir=base)
+    os.close(tmpfh)
+    try:
+        with salt.utils.fopen(tmpfname, 'w+b') as fh_:
+            fh_.write(__context__['serial'].dumps(data))
+        # On Windows, os.rename will fail if the destination file exists.
+        salt.utils.atomicfile.atomic_rename(tmpfname, outfile)
+    except IOError as exc:
+        raise SaltCacheError(
+            'There was an error writing the cache file, {0}: {1}'.format(
+                outfile, exc
+            )
+        )
+
+
+def fetch(bank, key):
+    '''
+    Fetch information from a file.
+    '''
+    key_file = _key_file(bank, key)
+    try:
+        with salt.utils.fopen(key_file, 'rb') as fh_:
+            return __context__['serial'].load(fh_)
+    except IOError as exc:
+        if exc.errno == errno.ENOENT:
+            return None
+        raise SaltCacheError(
+            'There was an error reading the cache file, {0}: {1}'.format(
+                key_file, exc
+            )
+        )
+
+
+def updated(bank, key):
+    '''
+    Return the epoch of the mtime for this cache file
+    '''
+    try:
+        return os.path.getmtime(_key_file(bank, key))
+    except (IOError, OSError):
+        return None
+
+
+def flush(bank, key=None):
+    '''
+    Remove the key from the cache bank with all the key content.
+    '''
+    try:
+        if key is None:
+            target = _bank_dir(bank)
+            if not os.path.isdir(target):
+                return False
+            shutil.rmtree(target)
+        else:
+            target = _key_file(bank, key)
+            if not os.path.isfile(target):
+                return False
+            os.remove(target)
+    except OSError as exc:
+        raise SaltCacheError(
+            'There was an error removing "{0}": {1}'.format(target, exc)
+        )
+    return True
+
+
+def list(bank):  # pylint: disable=redefined-builtin
+    '''
+    Return an iterable object containing all entries stored in the specified
+    bank.
+    '''
+    base = _bank_dir(bank)
+    try:
+        items = os.listdir(base)
+    except OSError as exc:
+        if exc.errno == errno.ENOENT:
+            return []
+        raise SaltCacheError(
+            'There was an error accessing directory "{0}": {1}'.format(
+                base, exc
+            )
+        )
+    ret = []
+    for item in items:
+        if item.endswith('.p'):
+            ret.append(item[:-2])
+        elif os.path.isdir(os.path.join(base, item)):
+            ret.append(item)
+    return ret
+
+
+def contains(bank, key):
+    '''
+    Checks if the specified bank contains the specified key.
+    '''
+    if key is None:
+        return os.path.isdir(_bank_dir(bank))
+    return os.path.isfile(_key_file(bank, key))
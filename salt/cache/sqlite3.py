@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+'''
+Cache data in a single SQLite database file
+
+.. versionadded:: Boron
+
+Instead of one directory per bank and one file per key, all of the cached
+data is kept in a single database file, which spares the inodes and the
+dentry cache of the master on installations with tens of thousands of
+minions and lets ``fetch_many`` read the data of many minions in one
+transaction.
+
+To use this driver, set the ``cache`` option in the master configuration:
+
+.. code-block:: yaml
+
+    cache: sqlite3
+
+The database is created in the master's cachedir as ``cache.db``, a different
+location can be set with ``cache_sqlite3_database``:
+
+.. code-block:: yaml
+
+    cache_sqlite3_database: /var/cache/salt/master/cache.db
+
+The database is opened in write-ahead logging mode, so that readers do not
+block the MWorkers writing data, ``cache_sqlite3_timeout`` sets how many
+seconds a writer waits for the database lock (default: 30).
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import logging
+import os
+import time
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
+
+# Import salt libs
+from salt.exceptions import SaltCacheError
+
+log = logging.getLogger(__name__)
+
+__virtualname__ = 'sqlite3'
+
+# SQLite limits the number of host parameters of a statement to 999
+_MAX_PARAMS = 500
+
+
+def __virtual__():
+    '''
+    Only load if sqlite3 is available.
+    '''
+    if not HAS_SQLITE3:
+        return False
+    return __virtualname__
+
+
+def _conn():
+    '''
+    Return a connection to the cache database, one connection is kept per
+    process since SQLite connections can not be shared across a fork
+    '''
+    pid = os.getpid()
+    conn = __context__.get('sqlite3_conn')
+    if conn is not None and __context__.get('sqlite3_pid') == pid:
+        return conn
+    database = __opts__.get('cache_sqlite3_database') or os.path.join(
+        __opts__['cachedir'], 'cache.db')
+    try:
+        conn = sqlite3.connect(database,
+                               timeout=__opts__.get('cache_sqlite3_timeout', 30))
+        conn.text_factory = str
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                     '(bank TEXT NOT NULL, key TEXT NOT NULL, data BLOB, '
+                     'updated REAL, PRIMARY KEY (bank, key))')
+        conn.commit()
+    except sqlite3.Error as exc:
+        raise SaltCacheError(
+            'Unable to open the cache database {0}: {1}'.format(database, exc)
+        )
+    __context__['sqlite3_conn'] = conn
+    __context__['sqlite3_pid'] = pid
+    return conn
+
+
+def _bank(bank):
+    '''
+    Normalize the name of a bank
+    '''
+    return bank.strip('/')
+
+
+def _execute(query, params=()):
+    '''
+    Execute a query in its own transaction and return all the rows
+    '''
+    conn = _conn()
+    try:
+        with conn:
+            return conn.execute(query, params).fetchall()
+    except sqlite3.Error as exc:
+        raise SaltCacheError(
+            'There was an error accessing the cache database: {0}'.format(exc)
+        )
+
+
+def store(bank, key, data):
+    '''
+    Store information in the database.
+    '''
+    _execute('INSERT OR REPLACE INTO cache (bank, key, data, updated) '
+             'VALUES (?, ?, ?, ?)',
+             (_bank(bank),
+              key,
+              sqlite3.Binary(__context__['serial'].dumps(data)),
+              time.time()))
+
+
+def fetch(bank, key):
+    '''
+    Fetch information from the database.
+    '''
+    rows = _execute('SELECT data FROM cache WHERE bank = ? AND key = ?',
+                    (_bank(bank), key))
+    if not rows:
+        return None
+    return __context__['serial'].loads(bytes(rows[0][0]))
+
+
+def fetch_many(banks, key):
+    '''
+    Fetch the same key from many banks in a single transaction.
+    '''
+    banks = [_bank(bank) for bank in banks]
+    ret = {}
+    conn = _conn()
+    try:
+        with conn:
+            for idx in range(0, len(banks), _MAX_PARAMS):
+                chunk = banks[idx:idx + _MAX_PARAMS]
+                rows = conn.execute(
+                    'SELECT bank, data FROM cache WHERE key = ? AND bank IN '
+                    '({0})'.format(', '.join('?' * len(chunk))),
+                    [key] + chunk
+                ).fetchall()
+                for bank, data in rows:
+                    ret[bank] = __context__['serial'].loads(bytes(data))
+    except sqlite3.Error as exc:
+        raise SaltCacheError(
+            'There was an error accessing the cache database: {0}'.format(exc)
+        )
+    return ret
+
+
+def updated(bank, key):
+    '''
+    Return the epoch of the last update of the key
+    '''
+    rows = _execute('SELECT updated FROM cache WHERE bank = ? AND key = ?',
+                    (_bank(bank), key))
+    if not rows:
+        return None
+    return rows[0][0]
+
+
+def flush(bank, key=None):
+    '''
+    Remove the key from the cache bank with all the key content, or the whole
+    bank including its sub-banks if no key is given.
+    '''
+    bank = _bank(bank)
+    if key is None:
+        prefix = bank + '/'
+        _execute('DELETE FROM cache WHERE bank = ? OR '
+                 'substr(bank, 1, ?) = ?',
+                 (bank, len(prefix), prefix))
+    else:
+        _execute('DELETE FROM cache WHERE bank = ? AND key = ?', (bank, key))
+    return True
+
+
+def list(bank):  # pylint: disable=redefined-builtin
+    '''
+    Return the names of the keys and sub-banks stored in the specified bank.
+    '''
+    bank = _bank(bank)
+    prefix = bank + '/'
+    ret = set()
+    for row in _execute('SELECT key FROM cache WHERE bank = ?', (bank,)):
+        ret.add(row[0])
+    for row in _execute('SELECT DISTINCT bank FROM cache WHERE '
+                        'substr(bank, 1, ?) = ?',
+                        (len(prefix), prefix)):
+        ret.add(row[0][len(prefix):].split('/', 1)[0])
+    return sorted(ret)
+
+
+def contains(bank, key):
+    '''
+    Checks if the specified bank contains the specified key, or if the bank
+    holds any data when no key is given.
+    '''
+    bank = _bank(bank)
+    if key is not None:
+        return bool(_execute('SELECT 1 FROM cache WHERE bank = ? AND key = ?',
+                             (bank, key)))
+    prefix = bank + '/'
+    return bool(_execute('SELECT 1 FROM cache WHERE bank = ? OR '
+                         'substr(bank, 1, ?) = ? LIMIT 1',
+                         (bank, len(prefix), prefix)))
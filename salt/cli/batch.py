@@ -14,6 +14,8 @@ from datetime import datetime, timedelta
 import salt.client
 import salt.output
 import salt.exceptions
+import salt.utils.cache
+import salt.utils.minions
 from salt.utils import print_cli
 
 # Import 3rd-party libs
@@ -38,6 +40,20 @@ class Batch(object):
         '''
         Return a list of minions to use for the batch run
         '''
+        registry = salt.utils.cache.get_connected_registry(self.opts)
+        if registry:
+            # The connected registry knows which of the targeted minions are
+            # up, there is no need to ping them first
+            expr_form = self.opts.get('selected_target_option') or \
+                self.opts.get('expr_form', 'glob')
+            minions = registry.filter(
+                salt.utils.minions.CkMinions(self.opts).check_minions(
+                    self.opts['tgt'], expr_form))
+            if minions is not None:
+                if not minions:
+                    raise salt.exceptions.SaltClientError('No minions matched the target.')
+                return (minions, iter(()))
+
         args = [self.opts['tgt'],
                 'test.ping',
                 [],
@@ -41,6 +41,7 @@ import salt.loader
 import salt.minion
 import salt.utils
 import salt.utils.args
+import salt.utils.cache
 import salt.utils.event
 import salt.utils.minions
 import salt.utils.verify
@@ -159,6 +160,11 @@ class LocalClient(object):
                 opts=self.opts,
                 listen=False,
                 io_loop=io_loop)
+        if io_loop is None:
+            # Only the events of the jobs are read, so have the event
+            # publisher drop the others. The listeners sharing a passed
+            # io_loop share its subscriber, and may read any event.
+            self.event.set_tag_filter(['salt/job/', 'syndic/'], 'startswith')
         self.utils = salt.loader.utils(self.opts)
         self.functions = salt.loader.minion_mods(self.opts, utils=self.utils)
         self.returners = salt.loader.returners(self.opts, self.functions)
@@ -379,6 +385,14 @@ class LocalClient(object):
             >>> SLC.cmd_subset('*', 'test.ping', sub=1)
             {'jerry': True}
         '''
+        registry = salt.utils.cache.get_connected_registry(self.opts)
+        if registry:
+            # Only ask the connected minions for their functions
+            minions = registry.filter(
+                salt.utils.minions.CkMinions(self.opts).check_minions(
+                    tgt, expr_form))
+            if minions is not None:
+                tgt, expr_form = minions, 'list'
         group = self.cmd(tgt, 'sys.list_functions', expr_form=expr_form, **kwargs)
         f_tgt = []
         for minion, ret in six.iteritems(group):
@@ -623,6 +637,7 @@ class LocalClient(object):
                         expr_form,
                         verbose,
                         progress,
+                        missing=pub_data.get('missing'),
                         **kwargs):
 
                     if not fn_ret:
@@ -1053,7 +1068,7 @@ class LocalClient(object):
         while True:
             time_left = timeout_at - int(time.time())
             wait = max(1, time_left)
-            raw = self.event.get_event(wait, jid)
+            raw = self.event.get_event(wait, 'salt/job/{0}'.format(jid))
             if raw is not None and 'return' in raw:
                 found.add(raw['id'])
                 ret[raw['id']] = raw['return']
@@ -1250,9 +1265,13 @@ class LocalClient(object):
             progress=False,
             show_timeout=False,
             show_jid=False,
+            missing=None,
             **kwargs):
         '''
         Get the returns for the command line interface via the event system
+
+        ``missing`` is the list of targeted minions the master found not to be
+        connected when publishing the job, if it keeps track of them
         '''
         log.trace('func get_cli_event_returns()')
 
@@ -1284,7 +1303,10 @@ class LocalClient(object):
             for id_, min_ret in six.iteritems(ret):
                 if min_ret.get('failed') is True:
                     if connected_minions is None:
-                        connected_minions = salt.utils.minions.CkMinions(self.opts).connected_ids()
+                        if missing is not None:
+                            connected_minions = set(minions).difference(missing)
+                        else:
+                            connected_minions = salt.utils.minions.CkMinions(self.opts).connected_ids()
                     if connected_minions and id_ not in connected_minions:
                         yield {id_: {'out': 'no_return',
                                      'ret': 'Minion did not return. [Not connected]'}}
@@ -1490,8 +1512,11 @@ class LocalClient(object):
         # We have the payload, let's get rid of the channel fast(GC'ed faster)
         del channel
 
-        return {'jid': payload['load']['jid'],
-                'minions': payload['load']['minions']}
+        ret = {'jid': payload['load']['jid'],
+               'minions': payload['load']['minions']}
+        if 'missing' in payload['load']:
+            ret['missing'] = payload['load']['missing']
+        return ret
 
     def __del__(self):
         # This IS really necessary!
@@ -252,6 +252,12 @@ VALID_OPTS = {
     # The chunk size to use when streaming files with the file server
     'file_buffer_size': int,
 
+    # The number of chunks of a file sent in a single reply of the file server
+    'file_transfer_window': int,
+
+    # Store the files cached from the master as blobs named after their hash
+    'file_cache_blobs': bool,
+
     # The TCP port on which minion events should be published if ipc_mode is TCP
     'tcp_pub_port': int,
 
@@ -271,6 +277,9 @@ VALID_OPTS = {
     # The TCP port for mworkers to connect to on the master
     'tcp_master_workers': int,
 
+    # The TCP port for the auth mworkers to connect to on the master
+    'tcp_master_auth_workers': int,
+
     # The file to send logging data to
     'log_file': str,
 
@@ -298,6 +307,14 @@ VALID_OPTS = {
     # If an event is above this size, it will be trimmed before putting it on the event bus
     'max_event_size': int,
 
+    # The size in bytes of the events queued for an event listener before
+    # event_subscriber_overflow is applied, 0 for no limit
+    'event_subscriber_queue_size': int,
+
+    # What to do when an event listener's queue is full: drop_oldest,
+    # drop_newest or disconnect
+    'event_subscriber_overflow': str,
+
     # Always execute states with test=True if this flag is set
     'test': bool,
 
@@ -307,6 +324,15 @@ VALID_OPTS = {
     # Tell the loader to attempt to import *.zip archives
     'enable_zip_modules': bool,
 
+    # Tell the loader to look modules up in the index of what they loaded as before
+    'loader_index': bool,
+
+    # The number of threads running the __virtual__ functions when the loader loads all modules
+    'loader_virtual_workers': int,
+
+    # The execution modules loaded by the process the jobs or the master workers are forked from
+    'preload_modules': list,
+
     # Tell the client to show minions that have timed out
     'show_timeout': bool,
 
@@ -328,6 +354,9 @@ VALID_OPTS = {
     # Fire events as state chunks are processed by the state compiler
     'state_events': bool,
 
+    # The number of processes calling the state chunks which do not require each other at once
+    'state_workers': int,
+
     # The number of seconds a minion should wait before retry when attempting authentication
     'acceptance_wait_time': float,
 
@@ -439,6 +468,19 @@ VALID_OPTS = {
     # the number of connected minions increases.
     'worker_threads': int,
 
+    # The number of MWorker processes dedicated to the minion authentication requests, so
+    # that a reconnecting fleet does not hold up the other requests. 0 lets the regular
+    # MWorkers handle them.
+    'auth_workers': int,
+
+    # The number of minion authentication requests per second the master handles, the
+    # minions over the limit are told when to try again. 0 means no limit.
+    'auth_rate_limit': float,
+
+    # The number of authentication requests the master handles at once before the
+    # auth_rate_limit applies. 0 uses the value of auth_rate_limit.
+    'auth_rate_burst': int,
+
     # The port for the master to listen to returns on. The minion needs to connect to this port
     # to send returns.
     'ret_port': int,
@@ -464,6 +506,8 @@ VALID_OPTS = {
     'git_pillar_privkey': str,
     'git_pillar_pubkey': str,
     'git_pillar_passphrase': str,
+    'git_pillar_fetch_workers': int,
+    'git_pillar_fetch_timeout': int,
     'gitfs_remotes': list,
     'gitfs_mountpoint': str,
     'gitfs_root': str,
@@ -477,6 +521,8 @@ VALID_OPTS = {
     'gitfs_env_whitelist': list,
     'gitfs_env_blacklist': list,
     'gitfs_ssl_verify': bool,
+    'gitfs_fetch_workers': int,
+    'gitfs_fetch_timeout': int,
     'hgfs_remotes': list,
     'hgfs_mountpoint': str,
     'hgfs_root': str,
@@ -515,6 +561,15 @@ VALID_OPTS = {
     # Recursively merge lists by aggregating them instead of replacing them.
     'pillar_merge_lists': bool,
 
+    # Cache the compiled pillar of the minions on the master
+    'pillar_cache': bool,
+
+    # The number of seconds a compiled pillar stays in the pillar cache
+    'pillar_cache_ttl': int,
+
+    # Encrypt the compiled pillar in the pillar cache
+    'pillar_cache_encrypt': bool,
+
     # How to merge multiple top files from multiple salt environments
     # (saltenvs); can be 'merge' or 'same'
     'top_file_merging_strategy': str,
@@ -548,6 +603,9 @@ VALID_OPTS = {
     'fileserver_ignoresymlinks': bool,
     'fileserver_limit_traversal': bool,
 
+    # Keep the file lists of the roots fileserver up to date from inotify events
+    'fileserver_watch': bool,
+
     # The number of open files a daemon is allowed to have open. Frequently needs to be increased
     # higher than the system default in order to account for the way zeromq consumes file handles.
     'max_open_files': int,
@@ -579,12 +637,35 @@ VALID_OPTS = {
     # Specify whether the master should store end times for jobs as returns come in
     'job_cache_store_endtime': bool,
 
+    # Buffer the returns in the local_cache returner and write them in batches
+    'job_cache_batch_returns': bool,
+
+    # Flush the buffered returns once this many are pending
+    'job_cache_batch_size': int,
+
+    # Flush the buffered returns at least every this many seconds
+    'job_cache_batch_interval': float,
+
     # The minion data cache is a cache of information about the minions stored on the master.
     # This information is primarily the pillar and grains data. The data is cached in the master
     # cachedir under the name of the minion and used to predetermine what minions are expected to
     # reply from executions.
     'minion_data_cache': bool,
 
+    # Keep the minion data cache resident in a dedicated master process which indexes the grains
+    # and pillar values, so grain and pillar targeting does not need to load every minion's data
+    'minion_data_cache_index': bool,
+
+    # The number of seconds between rescans of the minion data cache by the indexing process
+    'minion_data_cache_index_interval': int,
+
+    # The cache driver (salt.cache module) used to store the minion data cache
+    'cache': str,
+
+    # The database file and the lock timeout of the sqlite3 cache driver
+    'cache_sqlite3_database': str,
+    'cache_sqlite3_timeout': int,
+
     # The number of seconds between AES key rotations on the master
     'publish_session': int,
 
@@ -594,7 +675,7 @@ VALID_OPTS = {
     # The TTL for the cache of the reactor configuration
     'reactor_refresh_interval': int,
 
-    # The number of workers for the runner/wheel in the reactor
+    # The number of workers for the local/runner/wheel in the reactor
     'reactor_worker_threads': int,
 
     # The queue size for workers in the reactor
@@ -655,6 +736,10 @@ VALID_OPTS = {
     # If this is set to True the first newline after a Jinja block is removed
     'jinja_trim_blocks': bool,
 
+    # Keep the compiled Jinja templates in the cachedir, so that unchanged
+    # templates are not compiled again
+    'jinja_bytecode_cache': bool,
+
     # FIXME Appears to be unused
     'minion_id_caching': bool,
 
@@ -752,6 +837,13 @@ VALID_OPTS = {
 
     # Connection caching. Can greatly speed up salt performance.
     'con_cache': bool,
+
+    # Keep track of the connected minions in a memory mapped file shared by
+    # the master processes
+    'connected_registry': bool,
+
+    # The number of minions the connected registry can track
+    'connected_registry_size': int,
     'rotate_aes_key': bool,
 
     # Cache ZeroMQ connections. Can greatly improve salt performance.
@@ -849,6 +941,8 @@ DEFAULT_MINION_OPTS = {
     'git_pillar_privkey': '',
     'git_pillar_pubkey': '',
     'git_pillar_passphrase': '',
+    'git_pillar_fetch_workers': 4,
+    'git_pillar_fetch_timeout': 300,
     'gitfs_remotes': [],
     'gitfs_mountpoint': '',
     'gitfs_root': '',
@@ -862,6 +956,8 @@ DEFAULT_MINION_OPTS = {
     'gitfs_env_whitelist': [],
     'gitfs_env_blacklist': [],
     'gitfs_ssl_verify': False,
+    'gitfs_fetch_workers': 4,
+    'gitfs_fetch_timeout': 300,
     'hash_type': 'md5',
     'disable_modules': [],
     'disable_returners': [],
@@ -885,6 +981,8 @@ DEFAULT_MINION_OPTS = {
     'ipc_mode': _DFLT_IPC_MODE,
     'ipv6': False,
     'file_buffer_size': 262144,
+    'file_transfer_window': 8,
+    'file_cache_blobs': True,
     'tcp_pub_port': 4510,
     'tcp_pull_port': 4511,
     'log_file': os.path.join(salt.syspaths.LOGS_DIR, 'minion'),
@@ -896,16 +994,23 @@ DEFAULT_MINION_OPTS = {
     'log_fmt_logfile': _DFLT_LOG_FMT_LOGFILE,
     'log_granular_levels': {},
     'max_event_size': 1048576,
+    'event_subscriber_queue_size': 100 * 1024 * 1024,  # 100MB
+    'event_subscriber_overflow': 'drop_oldest',
     'test': False,
     'ext_job_cache': '',
     'cython_enable': False,
     'enable_zip_modules': False,
+    'loader_index': False,
+    'loader_virtual_workers': 1,
+    'preload_modules': [],
     'state_verbose': True,
     'state_output': 'full',
     'state_output_diff': False,
     'state_auto_order': True,
     'state_events': False,
     'state_aggregate': False,
+    'state_workers': 1,
+    'jinja_bytecode_cache': True,
     'acceptance_wait_time': 10,
     'acceptance_wait_time_max': 0,
     'rejected_retry': False,
@@ -997,6 +1102,9 @@ DEFAULT_MASTER_OPTS = {
     'auth_mode': 1,
     'user': 'root',
     'worker_threads': 5,
+    'auth_workers': 0,
+    'auth_rate_limit': 0,
+    'auth_rate_burst': 0,
     'sock_dir': os.path.join(salt.syspaths.SOCK_DIR, 'master'),
     'ret_port': '4506',
     'timeout': 5,
@@ -1030,6 +1138,8 @@ DEFAULT_MASTER_OPTS = {
     'git_pillar_privkey': '',
     'git_pillar_pubkey': '',
     'git_pillar_passphrase': '',
+    'git_pillar_fetch_workers': 4,
+    'git_pillar_fetch_timeout': 300,
     'gitfs_remotes': [],
     'gitfs_mountpoint': '',
     'gitfs_root': '',
@@ -1043,6 +1153,8 @@ DEFAULT_MASTER_OPTS = {
     'gitfs_env_whitelist': [],
     'gitfs_env_blacklist': [],
     'gitfs_ssl_verify': False,
+    'gitfs_fetch_workers': 4,
+    'gitfs_fetch_timeout': 300,
     'hgfs_remotes': [],
     'hgfs_mountpoint': '',
     'hgfs_root': '',
@@ -1061,6 +1173,8 @@ DEFAULT_MASTER_OPTS = {
     'svnfs_env_whitelist': [],
     'svnfs_env_blacklist': [],
     'max_event_size': 1048576,
+    'event_subscriber_queue_size': 100 * 1024 * 1024,  # 100MB
+    'event_subscriber_overflow': 'drop_oldest',
     'minionfs_env': 'base',
     'minionfs_mountpoint': '',
     'minionfs_whitelist': [],
@@ -1071,6 +1185,9 @@ DEFAULT_MASTER_OPTS = {
     'pillar_safe_render_error': True,
     'pillar_source_merging_strategy': 'smart',
     'pillar_merge_lists': False,
+    'pillar_cache': False,
+    'pillar_cache_ttl': 3600,
+    'pillar_cache_encrypt': False,
     'ping_on_rotate': False,
     'peer': {},
     'preserve_minion_cache': False,
@@ -1090,12 +1207,14 @@ DEFAULT_MASTER_OPTS = {
     'file_recv': False,
     'file_recv_max_size': 100,
     'file_buffer_size': 1048576,
+    'file_transfer_window': 8,
     'file_ignore_regex': None,
     'file_ignore_glob': None,
     'fileserver_backend': ['roots'],
     'fileserver_followsymlinks': True,
     'fileserver_ignoresymlinks': False,
     'fileserver_limit_traversal': False,
+    'fileserver_watch': False,
     'max_open_files': 100000,
     'hash_type': 'md5',
     'conf_file': os.path.join(salt.syspaths.CONFIG_DIR, 'master'),
@@ -1111,7 +1230,15 @@ DEFAULT_MASTER_OPTS = {
     'ext_job_cache': '',
     'master_job_cache': 'local_cache',
     'job_cache_store_endtime': False,
+    'job_cache_batch_returns': False,
+    'job_cache_batch_size': 500,
+    'job_cache_batch_interval': 1.0,
     'minion_data_cache': True,
+    'minion_data_cache_index': False,
+    'minion_data_cache_index_interval': 60,
+    'cache': 'localfs',
+    'cache_sqlite3_database': None,
+    'cache_sqlite3_timeout': 30,
     'enforce_mine_cache': False,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipv6': False,
@@ -1119,6 +1246,7 @@ DEFAULT_MASTER_OPTS = {
     'tcp_master_pull_port': 4513,
     'tcp_master_publish_pull': 4514,
     'tcp_master_workers': 4515,
+    'tcp_master_auth_workers': 4516,
     'log_file': os.path.join(salt.syspaths.LOGS_DIR, 'master'),
     'log_level': 'info',
     'log_level_logfile': None,
@@ -1146,12 +1274,16 @@ DEFAULT_MASTER_OPTS = {
     'state_auto_order': True,
     'state_events': False,
     'state_aggregate': False,
+    'state_workers': 1,
     'search': '',
     'search_index_interval': 3600,
     'loop_interval': 60,
     'nodegroups': {},
     'ssh_list_nodegroups': {},
     'cython_enable': False,
+    'loader_index': False,
+    'loader_virtual_workers': 1,
+    'preload_modules': [],
     'enable_gpu_grains': False,
     # XXX: Remove 'key_logfile' support in 2014.1.0
     'key_logfile': os.path.join(salt.syspaths.LOGS_DIR, 'key'),
@@ -1174,6 +1306,7 @@ DEFAULT_MASTER_OPTS = {
     'syndic_wait': 5,
     'jinja_lstrip_blocks': False,
     'jinja_trim_blocks': False,
+    'jinja_bytecode_cache': True,
     'tcp_keepalive': True,
     'tcp_keepalive_idle': 300,
     'tcp_keepalive_cnt': -1,
@@ -1222,6 +1355,8 @@ DEFAULT_MASTER_OPTS = {
     'zmq_filtering': False,
     'zmq_monitor': False,
     'con_cache': False,
+    'connected_registry': False,
+    'connected_registry_size': 65536,
     'rotate_aes_key': True,
     'cache_sreqs': True,
     'dummy_pub': False,
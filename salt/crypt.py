@@ -11,6 +11,7 @@ import sys
 import copy
 import time
 import hmac
+import random
 import base64
 import hashlib
 import logging
@@ -197,6 +198,77 @@ def public_decrypt(pub, message):
     return verifier.verify(message)
 
 
+class MinionKeyCache(object):
+    '''
+    Cache the public keys of the accepted minions, and the tokens they were
+    verified with, so the master does not load and check them again for
+    every request
+
+    A key is loaded again when its file in the pki_dir changes, and forgotten
+    along with the tokens verified with it when the file goes away.
+    '''
+    # The tokens remembered per minion, a minion signs a new one each time it
+    # authenticates
+    max_tokens = 4
+
+    def __init__(self, opts):
+        self.opts = opts
+        # minion id -> (key file stat, key, verified tokens)
+        self.keys = {}
+
+    def _entry(self, id_):
+        '''
+        Return the cache entry of the minion, loading its key if it changed
+        '''
+        path = os.path.join(self.opts['pki_dir'], 'minions', id_)
+        try:
+            st_ = os.stat(path)
+        except OSError:
+            self.keys.pop(id_, None)
+            return None
+        stamp = (st_.st_ino, st_.st_size, st_.st_mtime)
+        entry = self.keys.get(id_)
+        if entry is None or entry[0] != stamp:
+            self.keys.pop(id_, None)
+            with salt.utils.fopen(path) as fp_:
+                key = RSA.importKey(fp_.read())
+            entry = (stamp, key, [])
+            self.keys[id_] = entry
+        return entry
+
+    def get(self, id_):
+        '''
+        Return the RSA public key of the minion, or None if its key is not
+        accepted. A corrupt key raises ValueError, IndexError or TypeError.
+
+        :param str id_: A minion ID
+        '''
+        entry = self._entry(id_)
+        if entry is None:
+            return None
+        return entry[1]
+
+    def verify_token(self, id_, token):
+        '''
+        Return True if the token is the string 'salt' signed by the minion.
+        A token which can not be decrypted raises ValueError.
+
+        :param str id_: A minion ID
+        :param str token: A string signed with the minion private key
+        '''
+        entry = self._entry(id_)
+        if entry is None:
+            return False
+        tokens = entry[2]
+        if token in tokens:
+            return True
+        if public_decrypt(entry[1], token) != 'salt':
+            return False
+        tokens.append(token)
+        del tokens[:-self.max_tokens]
+        return True
+
+
 class MasterKeys(dict):
     '''
     The Master Keys class is used to manage the RSA public key pair used for
@@ -311,6 +383,12 @@ class AsyncAuth(object):
     # mapping of key -> creds
     creds_map = {}
 
+    # The number of seconds a busy master asked to wait before signing in again
+    retry_after = None
+    # How much longer than the wait before signing in again a minion may wait,
+    # to spread out the sign ins of the minions which failed at the same time
+    retry_jitter = 0.5
+
     def __new__(cls, opts, io_loop=None):
         '''
         Only create one instance of SAuth per __key()
@@ -454,13 +532,14 @@ class AsyncAuth(object):
             except SaltClientError:
                 break
             if creds == 'retry':
-                if self.opts.get('caller'):
+                if self.opts.get('caller') and self.retry_after is None:
                     print('Minion failed to authenticate with the master, '
                           'has the minion key been accepted?')
                     sys.exit(2)
-                if acceptance_wait_time:
-                    log.info('Waiting {0} seconds before retry.'.format(acceptance_wait_time))
-                    yield tornado.gen.sleep(acceptance_wait_time)
+                wait = self._retry_wait(acceptance_wait_time)
+                if wait:
+                    log.info('Waiting {0:.1f} seconds before retry.'.format(wait))
+                    yield tornado.gen.sleep(wait)
                 if acceptance_wait_time < acceptance_wait_time_max:
                     acceptance_wait_time += acceptance_wait_time
                     log.debug('Authentication wait time is {0}'.format(acceptance_wait_time))
@@ -480,6 +559,33 @@ class AsyncAuth(object):
             self._crypticle = Crypticle(self.opts, creds['aes'])
             self._authenticate_future.set_result(True)  # mark the sign-in as complete
 
+    def _busy(self, load):
+        '''
+        Remember how long the master asked to wait when it is too busy to
+        authenticate this minion
+        '''
+        try:
+            self.retry_after = float(load.get('retry_after', 0))
+        except (TypeError, ValueError):
+            self.retry_after = 0
+        log.warning(
+            'The Salt Master is busy authenticating other minions, this salt '
+            'minion will wait for at least {0:.1f} seconds before attempting '
+            'to re-authenticate'.format(self.retry_after)
+        )
+
+    def _retry_wait(self, acceptance_wait_time):
+        '''
+        Return the number of seconds to wait before signing in again. The
+        wait asked for by a busy master replaces the acceptance wait time, and
+        is stretched at random to spread out the sign ins of the minions.
+        '''
+        wait = acceptance_wait_time
+        if self.retry_after is not None:
+            wait = self.retry_after
+            self.retry_after = None
+        return random.uniform(wait, wait * (1 + self.retry_jitter))
+
     @tornado.gen.coroutine
     def sign_in(self, timeout=60, safe=True, tries=1):
         '''
@@ -551,6 +657,9 @@ class AsyncAuth(object):
                 # has the master returned that its maxed out with minions?
                 elif payload['load']['ret'] == 'full':
                     raise tornado.gen.Return('full')
+                elif payload['load']['ret'] == 'busy':
+                    self._busy(payload['load'])
+                    raise tornado.gen.Return('retry')
                 else:
                     log.error(
                         'The Salt Master has cached the public key for this '
@@ -977,13 +1086,14 @@ class SAuth(AsyncAuth):
         while True:
             creds = self.sign_in()
             if creds == 'retry':
-                if self.opts.get('caller'):
+                if self.opts.get('caller') and self.retry_after is None:
                     print('Minion failed to authenticate with the master, '
                           'has the minion key been accepted?')
                     sys.exit(2)
-                if acceptance_wait_time:
-                    log.info('Waiting {0} seconds before retry.'.format(acceptance_wait_time))
-                    time.sleep(acceptance_wait_time)
+                wait = self._retry_wait(acceptance_wait_time)
+                if wait:
+                    log.info('Waiting {0:.1f} seconds before retry.'.format(wait))
+                    time.sleep(wait)
                 if acceptance_wait_time < acceptance_wait_time_max:
                     acceptance_wait_time += acceptance_wait_time
                     log.debug('Authentication wait time is {0}'.format(acceptance_wait_time))
@@ -1061,6 +1171,9 @@ class SAuth(AsyncAuth):
                 # has the master returned that its maxed out with minions?
                 elif payload['load']['ret'] == 'full':
                     return 'full'
+                elif payload['load']['ret'] == 'busy':
+                    self._busy(payload['load'])
+                    return 'retry'
                 else:
                     log.error(
                         'The Salt Master has cached the public key for this '
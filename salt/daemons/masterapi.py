@@ -12,9 +12,9 @@ import os
 import re
 import time
 import stat
-import tempfile
 
 # Import salt libs
+import salt.cache
 import salt.crypt
 import salt.utils
 import salt.client
@@ -28,7 +28,6 @@ import salt.minion
 import salt.search
 import salt.key
 import salt.fileserver
-import salt.utils.atomicfile
 import salt.utils.event
 import salt.utils.verify
 import salt.utils.minions
@@ -36,7 +35,7 @@ import salt.utils.gzip_util
 import salt.utils.jid
 from salt.pillar import git_pillar
 from salt.utils.event import tagify
-from salt.exceptions import SaltMasterError
+from salt.exceptions import SaltMasterError, SaltCacheError
 
 # Import 3rd-party libs
 import salt.ext.six as six
@@ -400,7 +399,7 @@ class RemoteFuncs(object):
     Funcitons made available to minions, this class includes the raw routines
     post validation that make up the minion access to the master
     '''
-    def __init__(self, opts):
+    def __init__(self, opts, mminion=None):
         self.opts = opts
         self.event = salt.utils.event.get_event(
                 'master',
@@ -410,15 +409,18 @@ class RemoteFuncs(object):
                 listen=False)
         self.serial = salt.payload.Serial(opts)
         self.ckminions = salt.utils.minions.CkMinions(opts)
+        self.cache = salt.cache.Cache(opts)
         # Create the tops dict for loading external top data
         self.tops = salt.loader.tops(self.opts)
         # Make a client
         self.local = salt.client.get_local_client(mopts=self.opts)
         # Create the master minion to access the external job cache
-        self.mminion = salt.minion.MasterMinion(
-                self.opts,
-                states=False,
-                rend=False)
+        if mminion is None:
+            mminion = salt.minion.MasterMinion(
+                    self.opts,
+                    states=False,
+                    rend=False)
+        self.mminion = mminion
         self.__setup_fileserver()
 
     def __setup_fileserver(self):
@@ -428,6 +430,7 @@ class RemoteFuncs(object):
         fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = fs_.serve_file
         self._file_hash = fs_.file_hash
+        self._file_manifest = fs_.file_manifest
         self._file_list = fs_.file_list
         self._file_list_emptydirs = fs_.file_list_emptydirs
         self._dir_list = fs_.dir_list
@@ -569,19 +572,19 @@ class RemoteFuncs(object):
                 match_type,
                 greedy=False
                 )
+        try:
+            mine = self.cache.fetch_many(
+                ['minions/{0}'.format(minion) for minion in minions], 'mine')
+        except SaltCacheError as exc:
+            log.error('Unable to read the mine data: {0}'.format(exc))
+            return ret
         for minion in minions:
-            mine = os.path.join(
-                    self.opts['cachedir'],
-                    'minions',
-                    minion,
-                    'mine.p')
             try:
-                with salt.utils.fopen(mine, 'rb') as fp_:
-                    fdata = self.serial.load(fp_).get(load['fun'])
-                    if fdata:
-                        ret[minion] = fdata
-            except Exception:
+                fdata = mine.get('minions/{0}'.format(minion), {}).get(load['fun'])
+            except AttributeError:
                 continue
+            if fdata:
+                ret[minion] = fdata
         return ret
 
     def _mine(self, load, skip_verify=False):
@@ -592,19 +595,13 @@ class RemoteFuncs(object):
             if 'id' not in load or 'data' not in load:
                 return False
         if self.opts.get('minion_data_cache', False) or self.opts.get('enforce_mine_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
-            if not os.path.isdir(cdir):
-                os.makedirs(cdir)
-            datap = os.path.join(cdir, 'mine.p')
+            bank = 'minions/{0}'.format(load['id'])
             if not load.get('clear', False):
-                if os.path.isfile(datap):
-                    with salt.utils.fopen(datap, 'rb') as fp_:
-                        new = self.serial.load(fp_)
-                    if isinstance(new, dict):
-                        new.update(load['data'])
-                        load['data'] = new
-            with salt.utils.fopen(datap, 'w+b') as fp_:
-                fp_.write(self.serial.dumps(load['data']))
+                new = self.cache.fetch(bank, 'mine')
+                if isinstance(new, dict):
+                    new.update(load['data'])
+                    load['data'] = new
+            self.cache.store(bank, 'mine', load['data'])
         return True
 
     def _mine_delete(self, load):
@@ -614,20 +611,16 @@ class RemoteFuncs(object):
         if 'id' not in load or 'fun' not in load:
             return False
         if self.opts.get('minion_data_cache', False) or self.opts.get('enforce_mine_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
-            if not os.path.isdir(cdir):
-                return False
-            datap = os.path.join(cdir, 'mine.p')
-            if os.path.isfile(datap):
-                try:
-                    with salt.utils.fopen(datap, 'rb') as fp_:
-                        mine_data = self.serial.load(fp_)
-                    if isinstance(mine_data, dict):
-                        if mine_data.pop(load['fun'], False):
-                            with salt.utils.fopen(datap, 'w+b') as fp_:
-                                fp_.write(self.serial.dumps(mine_data))
-                except OSError:
+            bank = 'minions/{0}'.format(load['id'])
+            try:
+                if not self.cache.contains(bank):
                     return False
+                mine_data = self.cache.fetch(bank, 'mine')
+                if isinstance(mine_data, dict):
+                    if mine_data.pop(load['fun'], False):
+                        self.cache.store(bank, 'mine', mine_data)
+            except SaltCacheError:
+                return False
         return True
 
     def _mine_flush(self, load, skip_verify=False):
@@ -637,15 +630,13 @@ class RemoteFuncs(object):
         if not skip_verify and 'id' not in load:
             return False
         if self.opts.get('minion_data_cache', False) or self.opts.get('enforce_mine_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
-            if not os.path.isdir(cdir):
-                return False
-            datap = os.path.join(cdir, 'mine.p')
-            if os.path.isfile(datap):
-                try:
-                    os.remove(datap)
-                except OSError:
+            bank = 'minions/{0}'.format(load['id'])
+            try:
+                if not self.cache.contains(bank):
                     return False
+                self.cache.flush(bank, 'mine')
+            except SaltCacheError:
+                return False
         return True
 
     def _file_recv(self, load):
@@ -720,20 +711,9 @@ class RemoteFuncs(object):
         pillar_dirs = {}
         data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
         if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
-            if not os.path.isdir(cdir):
-                os.makedirs(cdir)
-            datap = os.path.join(cdir, 'data.p')
-            tmpfh, tmpfname = tempfile.mkstemp(dir=cdir)
-            os.close(tmpfh)
-            with salt.utils.fopen(tmpfname, 'w+b') as fp_:
-                fp_.write(
-                        self.serial.dumps(
-                            {'grains': load['grains'],
-                             'pillar': data})
-                            )
-            # On Windows, os.rename will fail if the destination file exists.
-            salt.utils.atomicfile.atomic_rename(tmpfname, datap)
+            self.cache.store('minions/{0}'.format(load['id']),
+                             'data',
+                             {'grains': load['grains'], 'pillar': data})
         return data
 
     def _minion_event(self, load):
@@ -1020,7 +1000,7 @@ class LocalFuncs(object):
     # the clear:
     # publish (The publish from the LocalClient)
     # _auth
-    def __init__(self, opts, key):
+    def __init__(self, opts, key, mminion=None):
         self.opts = opts
         self.serial = salt.payload.Serial(opts)
         self.key = key
@@ -1038,10 +1018,12 @@ class LocalFuncs(object):
         # Make an Auth object
         self.loadauth = salt.auth.LoadAuth(opts)
         # Stand up the master Minion to access returner data
-        self.mminion = salt.minion.MasterMinion(
-                self.opts,
-                states=False,
-                rend=False)
+        if mminion is None:
+            mminion = salt.minion.MasterMinion(
+                    self.opts,
+                    states=False,
+                    rend=False)
+        self.mminion = mminion
         # Make a wheel object
         self.wheel_ = salt.wheel.Wheel(opts)
 
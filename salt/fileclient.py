@@ -6,11 +6,13 @@ from __future__ import absolute_import
 
 # Import python libs
 import contextlib
+import errno
 import logging
 import hashlib
 import os
 import shutil
 import ftplib
+import time
 
 # Import salt libs
 from salt.exceptions import (
@@ -23,6 +25,7 @@ import salt.payload
 import salt.transport
 import salt.fileserver
 import salt.utils
+import salt.utils.atomicfile
 import salt.utils.files
 import salt.utils.templates
 import salt.utils.url
@@ -33,6 +36,7 @@ from salt.utils.locales import sdecode
 from salt.utils.openstack.swift import SaltSwift
 
 # pylint: disable=no-name-in-module,import-error
+import salt.ext.six as six
 import salt.ext.six.moves.BaseHTTPServer as BaseHTTPServer
 from salt.ext.six.moves.urllib.error import HTTPError, URLError
 from salt.ext.six.moves.urllib.parse import urlparse, urlunparse
@@ -40,6 +44,9 @@ from salt.ext.six.moves.urllib.parse import urlparse, urlunparse
 
 log = logging.getLogger(__name__)
 
+# The number of seconds between two removals of the orphaned blobs
+BLOB_CLEAN_INTERVAL = 86400
+
 
 def get_file_client(opts, pillar=False):
     '''
@@ -56,10 +63,259 @@ def get_file_client(opts, pillar=False):
     }.get(client, RemoteClient)(opts)
 
 
+class BlobCache(object):
+    '''
+    Content addressed store of the files cached from the master
+
+    The files in the minion file cache are hard links to blobs named after
+    the hash of their content, so a file which is cached for several saltenvs
+    or paths is downloaded and stored only once. An index of the hash of the
+    cached files, checked against their inode, size and mtime, spares hashing
+    the files again to find out whether they changed.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.serial = salt.payload.Serial(opts)
+        self.blob_dir = os.path.join(opts['cachedir'], 'blobs')
+        self.index_path = os.path.join(self.blob_dir, 'index.p')
+        # Without hard links the cached files are only indexed
+        self.links = (opts.get('file_cache_blobs', True)
+                      and hasattr(os, 'link')
+                      and not salt.utils.is_windows())
+        self._index = None
+        self._changed = {}
+        self._saved = 0
+
+    @property
+    def index(self):
+        '''
+        The index of the hashes of the cached files, loaded when first needed
+        '''
+        if self._index is None:
+            self._index = self._load()
+        return self._index
+
+    def _load(self):
+        '''
+        Read the index from the disk
+        '''
+        try:
+            with salt.utils.fopen(self.index_path, 'rb') as fp_:
+                index = self.serial.load(fp_)
+        except Exception:
+            return {}
+        if not isinstance(index, dict):
+            return {}
+        return index
+
+    def save(self, force=False):
+        '''
+        Write the changes to the index to the disk. The index is written at
+        most once a second unless force is True, an entry missing from the
+        index only costs hashing the file again.
+        '''
+        if force:
+            self.clean(BLOB_CLEAN_INTERVAL)
+        if not self._changed:
+            return
+        if not force and time.time() - self._saved < 1:
+            return
+        # Keep the entries the other processes stored meanwhile
+        index = self._load()
+        index.update(self._changed)
+        try:
+            if not os.path.isdir(self.blob_dir):
+                os.makedirs(self.blob_dir)
+            with salt.utils.atomicfile.atomic_open(self.index_path, 'wb') as fp_:
+                self.serial.dump(index, fp_)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to write the file cache index: {0}'.format(exc))
+            return
+        self._index = index
+        self._changed = {}
+        self._saved = time.time()
+
+    def clean(self, interval=0):
+        '''
+        Remove the blobs which no cached file links to anymore, and the index
+        entries of the files which do not exist anymore. Cached files removed
+        outside of the file client, for instance by hand, leave their blob
+        behind until then. Nothing is done if the blobs were cleaned less
+        than interval seconds ago.
+        '''
+        if not self.links or not os.path.isdir(self.blob_dir):
+            return
+        stamp = os.path.join(self.blob_dir, '.cleaned')
+        try:
+            if time.time() - os.path.getmtime(stamp) < interval:
+                return
+        except OSError:
+            pass
+        try:
+            with salt.utils.fopen(stamp, 'w'):
+                pass
+        except (IOError, OSError) as exc:
+            log.debug('Unable to clean the file cache blobs: {0}'.format(exc))
+            return
+        for hash_type in os.listdir(self.blob_dir):
+            type_dir = os.path.join(self.blob_dir, hash_type)
+            if not os.path.isdir(type_dir):
+                continue
+            for root, _, files in os.walk(type_dir):
+                for name in files:
+                    blob = os.path.join(root, name)
+                    try:
+                        if os.stat(blob).st_nlink == 1:
+                            os.remove(blob)
+                    except OSError:
+                        pass
+        index = self._load()
+        missing = [path for path in index if not os.path.exists(path)]
+        if not missing:
+            return
+        for path in missing:
+            index.pop(path)
+            self._changed.pop(path, None)
+        try:
+            with salt.utils.atomicfile.atomic_open(self.index_path, 'wb') as fp_:
+                self.serial.dump(index, fp_)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to write the file cache index: {0}'.format(exc))
+            return
+        self._index = index
+
+    @staticmethod
+    def _stamp(path):
+        '''
+        Return what tells whether a file changed since it was hashed
+        '''
+        st_ = os.stat(path)
+        return [st_.st_ino, st_.st_size, st_.st_mtime]
+
+    def _record(self, path, hsum, hash_type):
+        '''
+        Store the hash of a file in the index
+        '''
+        entry = [hsum, hash_type] + self._stamp(path)
+        self.index[path] = entry
+        self._changed[path] = entry
+        self.save()
+
+    def blob_path(self, hsum, hash_type):
+        '''
+        Return the path of the blob with the given hash
+        '''
+        return os.path.join(self.blob_dir, hash_type, hsum[:2], hsum)
+
+    def hash(self, path, hash_type):
+        '''
+        Return the hash of a file, from the index if the file did not change
+        since it was last hashed
+        '''
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            return ''
+        entry = self.index.get(path)
+        if entry and entry[1] == hash_type and entry[2:] == stamp:
+            return entry[0]
+        hsum = salt.utils.get_hash(path, hash_type)
+        self._record(path, hsum, hash_type)
+        return hsum
+
+    def _release(self, hsum, hash_type):
+        '''
+        Remove a blob which no cached file links to anymore
+        '''
+        blob = self.blob_path(hsum, hash_type)
+        try:
+            if os.stat(blob).st_nlink == 1:
+                os.remove(blob)
+        except OSError:
+            pass
+
+    def detach(self, path):
+        '''
+        Remove a cached file linked to a blob, so that writing the file does
+        not change the blob and the other files linked to it
+        '''
+        try:
+            if not os.path.isfile(path) or os.stat(path).st_nlink == 1:
+                return
+            os.remove(path)
+        except OSError:
+            return
+        entry = self.index.get(path)
+        if entry:
+            self._release(entry[0], entry[1])
+
+    def link(self, hsum, hash_type, dest):
+        '''
+        Cache the file at dest from the blob with the given hash. Return
+        False if there is no such blob.
+        '''
+        if not self.links or not hsum:
+            return False
+        blob = self.blob_path(hsum, hash_type)
+        if not os.path.isfile(blob):
+            return False
+        if self.hash(blob, hash_type) != hsum:
+            # The blob was changed through one of its links
+            log.debug('Removing the corrupted blob {0}'.format(blob))
+            os.remove(blob)
+            return False
+        previous = self.index.get(dest)
+        tmp_dest = '{0}.{1}.blob'.format(dest, os.getpid())
+        try:
+            if os.path.isdir(dest):
+                salt.utils.rm_rf(dest)
+            os.link(blob, tmp_dest)
+            os.rename(tmp_dest, dest)
+        except OSError as exc:
+            log.debug('Unable to link {0} to {1}: {2}'.format(blob, dest, exc))
+            try:
+                os.remove(tmp_dest)
+            except OSError:
+                pass
+            return False
+        self._record(dest, hsum, hash_type)
+        if previous and previous[0] != hsum:
+            self._release(previous[0], previous[1])
+        return True
+
+    def add(self, path, hash_type):
+        '''
+        Store a file which was downloaded to the file cache as a blob, and
+        return its hash
+        '''
+        hsum = salt.utils.get_hash(path, hash_type)
+        if self.links:
+            blob = self.blob_path(hsum, hash_type)
+            try:
+                if not os.path.isfile(blob):
+                    blob_dir = os.path.dirname(blob)
+                    if not os.path.isdir(blob_dir):
+                        os.makedirs(blob_dir)
+                    os.link(path, blob)
+                elif os.stat(blob).st_ino != os.stat(path).st_ino:
+                    # Keep a single copy of the content
+                    if self.link(hsum, hash_type, path):
+                        return hsum
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    log.debug('Unable to store {0} as a blob: '
+                              '{1}'.format(path, exc))
+        self._record(path, hsum, hash_type)
+        return hsum
+
+
 class Client(object):
     '''
     Base class for Salt file interactions
     '''
+    # The content addressed store of the files cached from the master
+    blobs = None
+
     def __init__(self, opts):
         self.opts = opts
         self.serial = salt.payload.Serial(self.opts)
@@ -190,6 +446,8 @@ class Client(object):
             paths = paths.split(',')
         for path in paths:
             ret.append(self.cache_file(path, saltenv))
+        if self.blobs is not None:
+            self.blobs.save(force=True)
         return ret
 
     def cache_master(self, saltenv='base', env=None):
@@ -209,6 +467,8 @@ class Client(object):
         ret = []
         for path in self.file_list(saltenv):
             ret.append(self.cache_file(salt.utils.url.create(path), saltenv))
+        if self.blobs is not None:
+            self.blobs.save(force=True)
         return ret
 
     def cache_dir(self, path, saltenv='base', include_empty=False,
@@ -250,6 +510,8 @@ class Client(object):
                     fn_ = self.cache_file(salt.utils.url.create(fn_), saltenv)
                     if fn_:
                         ret.append(fn_)
+        if self.blobs is not None:
+            self.blobs.save(force=True)
 
         if include_empty:
             # Break up the path into a list containing the bottom-level
@@ -981,6 +1243,9 @@ class RemoteClient(Client):
             self.auth = self.channel.auth
         else:
             self.auth = ''
+        self.blobs = BlobCache(self.opts)
+        # The manifests of the files being cached, by saltenv
+        self._manifests = {}
 
     def _refresh_channel(self):
         '''
@@ -989,6 +1254,71 @@ class RemoteClient(Client):
         self.channel = salt.transport.Channel.factory(self.opts)
         return self.channel
 
+    @contextlib.contextmanager
+    def _manifest(self, saltenv, prefix='', paths=None):
+        '''
+        Get the hashes of the files cached within the context from a single
+        manifest of the files on the master, instead of asking the master for
+        the hash of every file
+        '''
+        if paths is not None and len(paths) < 2:
+            yield
+            return
+        manifest = self.file_manifest(saltenv, prefix, paths)
+        if not isinstance(manifest, dict):
+            # The master does not know about manifests
+            manifest = {}
+        self._manifests[saltenv] = manifest
+        try:
+            yield
+        finally:
+            self._manifests.pop(saltenv, None)
+
+    def _manifest_hash(self, path, saltenv):
+        '''
+        Return the hash of a file from the manifest of its saltenv, or None
+        if the file is not in a manifest
+        '''
+        if saltenv not in self._manifests or not path.startswith('salt://'):
+            return None
+        return self._manifests[saltenv].get(self._check_proto(path))
+
+    def cache_files(self, paths, saltenv='base', env=None):
+        '''
+        Download a list of files stored on the master and put them in the
+        minion file cache, only the files which changed are downloaded
+        '''
+        if isinstance(paths, str):
+            paths = paths.split(',')
+        manifest_paths = []
+        for path in paths:
+            if not isinstance(path, six.string_types):
+                continue
+            file_path, senv = salt.utils.url.parse(path)
+            if path.startswith('salt://') and senv in (None, env or saltenv):
+                manifest_paths.append(file_path)
+        with self._manifest(env or saltenv, paths=manifest_paths):
+            return Client.cache_files(self, paths, saltenv, env)
+
+    def cache_master(self, saltenv='base', env=None):
+        '''
+        Download and cache all files on a master in a specified environment,
+        only the files which changed are downloaded
+        '''
+        with self._manifest(env or saltenv):
+            return Client.cache_master(self, saltenv, env)
+
+    def cache_dir(self, path, saltenv='base', include_empty=False,
+                  include_pat=None, exclude_pat=None, env=None):
+        '''
+        Download all of the files in a subdir of the master, only the files
+        which changed are downloaded
+        '''
+        prefix = self._check_proto(sdecode(path))
+        with self._manifest(env or saltenv, prefix=prefix):
+            return Client.cache_dir(self, path, saltenv, include_empty,
+                                    include_pat, exclude_pat, env)
+
     def get_file(self,
                  path,
                  dest='',
@@ -1009,7 +1339,9 @@ class RemoteClient(Client):
 
         # Check if file exists on server, before creating files and
         # directories
-        hash_server = self.hash_file(path, saltenv)
+        hash_server = self._manifest_hash(path, saltenv)
+        if hash_server is None:
+            hash_server = self.hash_file(path, saltenv)
         if hash_server == '':
             log.debug(
                 'Could not find file from saltenv \'{0}\', \'{1}\''.format(
@@ -1046,9 +1378,12 @@ class RemoteClient(Client):
             '\'{2}\''.format(saltenv, dest2check, path)
         )
 
-        if dest2check and os.path.isfile(dest2check):
-            hash_local = self.hash_file(dest2check, saltenv)
-            if hash_local == hash_server:
+        hash_type = hash_server.get('hash_type', self.opts['hash_type'])
+        if dest2check and os.path.isfile(dest2check) and (
+                'size' not in hash_server or
+                os.path.getsize(dest2check) == hash_server['size']):
+            hash_local = self.blobs.hash(dest2check, hash_type)
+            if hash_local == hash_server.get('hsum'):
                 log.info(
                     'Fetching file from saltenv \'{0}\', ** skipped ** '
                     'latest already in cache \'{1}\''.format(
@@ -1057,6 +1392,17 @@ class RemoteClient(Client):
                 )
                 return dest2check
 
+        if not dest and self.blobs.link(hash_server.get('hsum'),
+                                        hash_type,
+                                        dest2check):
+            log.info(
+                'Fetching file from saltenv \'{0}\', ** skipped ** '
+                'same content already in cache \'{1}\''.format(
+                    saltenv, path
+                )
+            )
+            return dest2check
+
         log.debug(
             'Fetching file from saltenv \'{0}\', ** attempting ** '
             '\'{1}\''.format(saltenv, path)
@@ -1070,8 +1416,14 @@ class RemoteClient(Client):
         if gzip:
             gzip = int(gzip)
             load['gzip'] = gzip
+        if self.opts.get('file_transfer_window', 0) > 1:
+            # Ask for a window of chunks at a time, masters which do not
+            # know about windows answer with a single chunk
+            load['window'] = self.opts['file_transfer_window']
 
         fn_ = None
+        # Files downloaded to the minion file cache are stored as blobs
+        cache = not dest
         if dest:
             destdir = os.path.dirname(dest)
             if not os.path.isdir(destdir):
@@ -1079,6 +1431,7 @@ class RemoteClient(Client):
                     os.makedirs(destdir)
                 else:
                     return False
+            self.blobs.detach(dest)
             fn_ = salt.utils.fopen(dest, 'wb+')
         else:
             log.debug('No dest file found {0}'.format(dest))
@@ -1090,11 +1443,45 @@ class RemoteClient(Client):
                 load['loc'] = fn_.tell()
             data = self.channel.send(load)
             try:
+                if 'chunks' in data:
+                    if not data['dest']:
+                        # The file is gone from the master
+                        break
+                    if not fn_:
+                        with self._cache_loc(data['dest'], saltenv) as cache_dest:
+                            dest = cache_dest
+                            if os.path.isdir(dest):
+                                salt.utils.rm_rf(dest)
+                            self.blobs.detach(dest)
+                            fn_ = salt.utils.fopen(dest, 'wb+')
+                    for chunk in data['chunks']:
+                        if data.get('gzip', None):
+                            chunk_data = salt.utils.gzip_util.uncompress(chunk['data'])
+                        else:
+                            chunk_data = chunk['data']
+                        fn_.seek(chunk['loc'])
+                        fn_.write(chunk_data)
+                    if 'hsum' in data:
+                        # The window reached the end of the file
+                        fn_.flush()
+                        hsum = salt.utils.get_hash(dest, data.get('hash_type', 'md5'))
+                        if hsum != data['hsum'] and d_tries < 3:
+                            d_tries += 1
+                            log.warn('Bad download of file {0}, attempt {1} '
+                                     'of 3'.format(path, d_tries))
+                            fn_.seek(0)
+                            fn_.truncate()
+                            continue
+                        break
+                    if not data['chunks']:
+                        break
+                    continue
                 if not data['data']:
                     if not fn_ and data['dest']:
                         # This is a 0 byte file on the master
                         with self._cache_loc(data['dest'], saltenv) as cache_dest:
                             dest = cache_dest
+                            self.blobs.detach(dest)
                             with salt.utils.fopen(cache_dest, 'wb+') as ofile:
                                 ofile.write(data['data'])
                     if 'hsum' in data and d_tries < 3:
@@ -1114,6 +1501,7 @@ class RemoteClient(Client):
                         # remove it to avoid a traceback trying to write the file
                         if os.path.isdir(dest):
                             salt.utils.rm_rf(dest)
+                        self.blobs.detach(dest)
                         fn_ = salt.utils.fopen(dest, 'wb+')
                 if data.get('gzip', None):
                     data = salt.utils.gzip_util.uncompress(data['data'])
@@ -1137,6 +1525,8 @@ class RemoteClient(Client):
 
         if fn_:
             fn_.close()
+            if cache:
+                self.blobs.add(dest, hash_type)
             log.info(
                 'Fetching file from saltenv \'{0}\', ** done ** '
                 '\'{1}\''.format(saltenv, path)
@@ -1169,6 +1559,18 @@ class RemoteClient(Client):
 
         return self.channel.send(load)
 
+    def file_manifest(self, saltenv='base', prefix='', paths=None):
+        '''
+        Return the hash, size and mode of the files on the master, either of
+        all of the files under a prefix or of a list of paths
+        '''
+        load = {'saltenv': saltenv,
+                'prefix': prefix,
+                'cmd': '_file_manifest'}
+        if paths is not None:
+            load['paths'] = paths
+        return self.channel.send(load)
+
     def file_list_emptydirs(self, saltenv='base', prefix='', env=None):
         '''
         List the empty dirs on the master
@@ -1305,6 +1707,8 @@ class FSClient(RemoteClient):
         self.opts = opts
         self.channel = salt.fileserver.FSChan(opts)
         self.auth = DumbAuth()
+        self.blobs = BlobCache(self.opts)
+        self._manifests = {}
 
 
 class DumbAuth(object):
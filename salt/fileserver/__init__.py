@@ -10,6 +10,7 @@ import fnmatch
 import logging
 import os
 import re
+import stat
 import time
 
 # Import salt libs
@@ -552,9 +553,45 @@ class Fileserver(object):
             return ret
         fstr = '{0}.serve_file'.format(fnd['back'])
         if fstr in self.servers:
+            if load.get('window'):
+                return self._serve_window(load, fnd)
             return self.servers[fstr](load, fnd)
         return ret
 
+    def _serve_window(self, load, fnd):
+        '''
+        Serve up a window of consecutive chunks of a file, starting at the
+        requested location. Each chunk carries its location in the file, and
+        the hash of the file is sent along with the window reaching the end
+        of the file.
+        '''
+        window = min(int(load['window']),
+                     self.opts.get('file_transfer_window', 8))
+        wstr = '{0}.serve_window'.format(fnd['back'])
+        if wstr in self.servers:
+            ret = self.servers[wstr](load, fnd, window)
+        else:
+            # The backend serves a single chunk at a time
+            fstr = '{0}.serve_file'.format(fnd['back'])
+            ret = {'chunks': [],
+                   'dest': '',
+                   'eof': False}
+            chunk_load = dict(load)
+            while len(ret['chunks']) < window:
+                chunk = self.servers[fstr](chunk_load, fnd)
+                ret['dest'] = chunk['dest']
+                if not chunk['data']:
+                    ret['eof'] = True
+                    break
+                if chunk.get('gzip'):
+                    ret['gzip'] = chunk['gzip']
+                ret['chunks'].append({'loc': chunk_load['loc'],
+                                      'data': chunk['data']})
+                chunk_load['loc'] += self.opts['file_buffer_size']
+        if ret.pop('eof') and ret['dest']:
+            ret.update(self.file_hash(load) or {})
+        return ret
+
     def file_hash(self, load):
         '''
         Return the hash of a given file
@@ -582,6 +619,54 @@ class Fileserver(object):
             return self.servers[fstr](load, fnd)
         return ''
 
+    def file_manifest(self, load):
+        '''
+        Return the hash, size and mode of the files of an environment, either
+        of all of the files under a prefix or of a list of paths
+        '''
+        if 'env' in load:
+            salt.utils.warn_until(
+                'Boron',
+                'Passing a salt environment should be done using \'saltenv\' '
+                'not \'env\'. This functionality will be removed in Salt '
+                'Boron.'
+            )
+            load['saltenv'] = load.pop('env')
+
+        ret = {}
+        if 'saltenv' not in load:
+            return ret
+        if not isinstance(load['saltenv'], six.string_types):
+            load['saltenv'] = six.text_type(load['saltenv'])
+
+        paths = load.get('paths')
+        if paths is None:
+            paths = self.file_list({'saltenv': load['saltenv'],
+                                    'prefix': load.get('prefix', '')})
+        for path in paths:
+            path = salt.utils.locales.sdecode(path)
+            fnd = self.find_file(path, load['saltenv'])
+            if not fnd.get('back'):
+                continue
+            fstr = '{0}.file_hash'.format(fnd['back'])
+            if fstr not in self.servers:
+                continue
+            entry = self.servers[fstr]({'path': path,
+                                        'saltenv': load['saltenv']},
+                                       fnd)
+            if not entry:
+                continue
+            entry = dict(entry)
+            try:
+                st_ = os.stat(fnd['path'])
+                entry['size'] = st_.st_size
+                entry['mode'] = stat.S_IMODE(st_.st_mode)
+            except (OSError, TypeError):
+                # The backend does not keep the file on the local disk
+                pass
+            ret[path] = entry
+        return ret
+
     def file_list(self, load):
         '''
         Return a list of files from the dominant environment
@@ -25,6 +25,11 @@ to specify which provider should be used.
 More detailed information on how to use gitfs can be found in the :ref:`Gitfs
 Walkthrough <tutorial-gitfs>`.
 
+When the remotes are updated, an index of the files of each environment is
+written to the gitfs cachedir, holding the blob ID and hash of each file. The
+file lists and file hashes are served from this index until the tree of the
+environment changes in one of the remotes.
+
 .. note:: Minimum requirements
 
     To use GitPython_ for gitfs requires a minimum GitPython version of 0.3.0,
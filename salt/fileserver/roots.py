@@ -14,6 +14,11 @@ be in the :conf_master:`fileserver_backend` list to enable this backend.
 
 Fileserver environments are defined using the :conf_master:`file_roots`
 configuration option.
+
+When :conf_master:`fileserver_watch` is set and the pyinotify Python module is
+installed, the file lists are kept up to date by the maintenance process from
+the inotify events of the file roots, instead of walking the file roots again
+whenever the cached file lists expire.
 '''
 from __future__ import absolute_import
 
@@ -21,15 +26,33 @@ from __future__ import absolute_import
 import os
 import errno
 import logging
+import threading
+import time
 
 # Import salt libs
 import salt.fileserver
+import salt.payload
 import salt.utils
+import salt.utils.atomicfile
 from salt.utils.event import tagify
 import salt.ext.six as six
 
+# Import third party libs
+try:
+    import pyinotify
+    HAS_PYINOTIFY = True
+except ImportError:
+    HAS_PYINOTIFY = False
+
 log = logging.getLogger(__name__)
 
+# The watcher touches its heartbeat file this often, the file lists it writes
+# are not used anymore once the heartbeat is three times as old
+WATCH_HEARTBEAT = 10
+
+# The file lists written by the watcher, parsed once per change of the file
+_SNAPSHOTS = {}
+
 
 def find_file(path, saltenv='base', env=None, **kwargs):
     '''
@@ -113,6 +136,39 @@ def serve_file(load, fnd):
     return ret
 
 
+def serve_window(load, fnd, window):
+    '''
+    Return a window of consecutive chunks from a file, read with a single
+    open of the file
+    '''
+    ret = {'chunks': [],
+           'dest': '',
+           'eof': False}
+    if 'path' not in load or 'loc' not in load or 'saltenv' not in load:
+        return ret
+    if not fnd['path']:
+        return ret
+    ret['dest'] = fnd['rel']
+    gzip = load.get('gzip', None)
+    buffer_size = __opts__['file_buffer_size']
+    with salt.utils.fopen(os.path.normpath(fnd['path']), 'rb') as fp_:
+        fp_.seek(load['loc'])
+        while len(ret['chunks']) < window:
+            loc = fp_.tell()
+            data = fp_.read(buffer_size)
+            if len(data) < buffer_size:
+                ret['eof'] = True
+            if not data:
+                break
+            if gzip:
+                data = salt.utils.gzip_util.compress(data, gzip)
+                ret['gzip'] = gzip
+            ret['chunks'].append({'loc': loc, 'data': data})
+            if ret['eof']:
+                break
+    return ret
+
+
 def update():
     '''
     When we are asked to update (regular interval) lets reap the cache
@@ -215,7 +271,7 @@ def file_hash(load, fnd):
                     except OSError:
                         pass
                     return file_hash(load, fnd)
-                if os.path.getmtime(path) == mtime:
+                if '{0}'.format(os.path.getmtime(path)) == mtime:
                     # check if mtime changed
                     ret['hsum'] = hsum
                     return ret
@@ -270,6 +326,9 @@ def _file_lists(load, form):
         except os.error:
             log.critical('Unable to make cachedir {0}'.format(list_cachedir))
             return []
+    snapshot = _watch_snapshot(__opts__, load['saltenv'])
+    if snapshot is not None:
+        return snapshot.get(form, [])
     list_cache = os.path.join(list_cachedir, '{0}.p'.format(load['saltenv']))
     w_lock = os.path.join(list_cachedir, '.{0}.w'.format(load['saltenv']))
     cache_match, refresh_cache, save_cache = \
@@ -323,6 +382,326 @@ def _file_lists(load, form):
     return []
 
 
+def _watch_snapshot(opts, saltenv):
+    '''
+    Return the file lists of the saltenv kept up to date by the watcher, or
+    None if the file roots are not watched
+    '''
+    if not opts.get('fileserver_watch', False):
+        return None
+    list_cachedir = os.path.join(opts['cachedir'], 'file_lists/roots')
+    try:
+        heartbeat = os.stat(os.path.join(list_cachedir, '.watch')).st_mtime
+        if time.time() - heartbeat > 3 * WATCH_HEARTBEAT:
+            return None
+        path = os.path.join(list_cachedir, '{0}.snap'.format(saltenv))
+        st_ = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st_.st_ino, st_.st_size, st_.st_mtime)
+    if saltenv in _SNAPSHOTS and _SNAPSHOTS[saltenv][0] == stamp:
+        return _SNAPSHOTS[saltenv][1]
+    try:
+        with salt.utils.fopen(path, 'rb') as fp_:
+            snapshot = salt.payload.Serial(opts).load(fp_)
+    except Exception:
+        return None
+    _SNAPSHOTS[saltenv] = (stamp, snapshot)
+    return snapshot
+
+
+class RootsWatcher(object):
+    '''
+    Keep the file lists of the file roots up to date from their inotify
+    events
+
+    The directories of the file roots are read once, and then only the
+    directories the events are about are read again. The file lists of the
+    saltenvs which changed are written to the list cachedir, where
+    ``_file_lists`` finds them as long as the watcher is alive. The cached
+    hashes of the files which changed are computed again too.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.serial = salt.payload.Serial(opts)
+        self.list_cachedir = os.path.join(opts['cachedir'], 'file_lists/roots')
+        self.roots = {}
+        for saltenv, paths in six.iteritems(opts['file_roots']):
+            for path in paths:
+                self.roots.setdefault(os.path.normpath(path), set()).add(saltenv)
+        # The entries of each directory of each file root
+        self.trees = {}
+        self.changed_dirs = set()
+        self.changed_files = set()
+        self.changed_envs = set()
+        self.wm = None
+        self.notifier = None
+        self.thread = None
+        self.running = False
+        self._heartbeat = 0
+
+    def start(self):
+        '''
+        Watch the file roots from a thread of the calling process. Return
+        False if the file roots can not be watched.
+        '''
+        if not HAS_PYINOTIFY:
+            log.warning('The pyinotify Python module is needed to watch the '
+                        'file roots, the file roots will be walked instead')
+            return False
+        # The file lists written by a previous watcher are out of date
+        self.stop()
+        self.wm = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.wm, self._event)
+        try:
+            self.rescan()
+        except (IOError, OSError) as exc:
+            log.error('Unable to watch the file roots: {0}'.format(exc))
+            self.stop()
+            return False
+        self.running = True
+        self.thread = threading.Thread(target=self._loop,
+                                       name='RootsWatcher')
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def stop(self):
+        '''
+        Stop watching, the file roots are walked again from then on
+        '''
+        self.running = False
+        try:
+            os.remove(os.path.join(self.list_cachedir, '.watch'))
+        except OSError:
+            pass
+        if self.notifier is not None:
+            self.notifier.stop()
+            self.notifier = None
+
+    def _loop(self):
+        '''
+        Read the inotify events and apply them until stopped
+        '''
+        try:
+            while self.running:
+                if self.notifier.check_events(timeout=1000):
+                    self.notifier.read_events()
+                    self.notifier.process_events()
+                self.flush()
+        except Exception as exc:
+            log.error('The file roots watcher failed, the file roots will be '
+                      'walked instead: {0}'.format(exc),
+                      exc_info_on_loglevel=logging.DEBUG)
+            self.stop()
+
+    def _watch(self, path):
+        '''
+        Add an inotify watch on a directory
+        '''
+        if self.wm is None:
+            return
+        mask = (pyinotify.IN_CREATE | pyinotify.IN_DELETE |
+                pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO |
+                pyinotify.IN_CLOSE_WRITE)
+        if path in self.roots:
+            # The other directories are seen going by their parent
+            mask |= pyinotify.IN_DELETE_SELF | pyinotify.IN_MOVE_SELF
+        wds = self.wm.add_watch(path, mask, quiet=False)
+        if wds.get(path, -1) < 0:
+            raise OSError('Unable to add an inotify watch on {0}'.format(path))
+
+    def _unwatch(self, path):
+        '''
+        Remove the inotify watch of a directory which left the file roots
+        '''
+        if self.wm is None:
+            return
+        wd_ = self.wm.get_wd(path)
+        if wd_ is not None:
+            self.wm.rm_watch(wd_, quiet=True)
+
+    def _event(self, event):
+        '''
+        Record what an inotify event changed
+        '''
+        if event.mask & pyinotify.IN_Q_OVERFLOW:
+            log.debug('Events of the file roots were lost, reading them again')
+            self.rescan()
+            return
+        if event.mask & (pyinotify.IN_DELETE_SELF | pyinotify.IN_MOVE_SELF):
+            root = os.path.normpath(event.pathname)
+            if root in self.roots:
+                self.changed_dirs.add((root, '.'))
+            return
+        self.changed(event.pathname, isdir=event.dir)
+
+    def _locate(self, path):
+        '''
+        Return the file roots a path is in, with the path relative to each
+        '''
+        path = os.path.normpath(path)
+        for root in self.roots:
+            if path == root:
+                yield root, '.'
+            elif path.startswith(root + os.sep):
+                yield root, os.path.relpath(path, root)
+
+    def changed(self, path, isdir=False):
+        '''
+        Record that a file or directory in the file roots was created,
+        changed, moved or removed
+        '''
+        for root, rel in self._locate(path):
+            self.changed_dirs.add((root, os.path.dirname(rel) or '.'))
+            if not isdir:
+                self.changed_files.add((root, rel))
+
+    def rescan(self):
+        '''
+        Read all of the file roots again
+        '''
+        for root in list(self.trees):
+            self._drop(root, '.')
+        for root in self.roots:
+            self.trees[root] = {}
+            self._scan(root, '.')
+            self.changed_envs.update(self.roots[root])
+        self.changed_dirs.clear()
+
+    def _scan(self, root, reldir):
+        '''
+        Read a directory of a file root again, and walk the directories
+        which appeared in it
+        '''
+        tree = self.trees[root]
+        full = os.path.normpath(os.path.join(root, reldir))
+        try:
+            names = os.listdir(full)
+        except OSError:
+            self._drop(root, reldir)
+            return
+        if reldir not in tree:
+            self._watch(full)
+        previous = tree.get(reldir, {}).get('walked', set())
+        entry = {'files': set(), 'links': set(), 'dirs': set(), 'walked': set()}
+        for name in names:
+            path = os.path.join(full, name)
+            is_link = os.path.islink(path)
+            if os.path.isdir(path):
+                entry['dirs'].add(name)
+                if self.opts['fileserver_followsymlinks'] or not is_link:
+                    entry['walked'].add(name)
+            else:
+                entry['files'].add(name)
+                if is_link:
+                    entry['links'].add(name)
+        tree[reldir] = entry
+        for name in previous - entry['walked']:
+            self._drop(root, self._join(reldir, name))
+        for name in entry['walked'] - previous:
+            self._scan(root, self._join(reldir, name))
+
+    def _drop(self, root, reldir):
+        '''
+        Forget a directory of a file root and everything under it
+        '''
+        tree = self.trees.get(root, {})
+        prefix = '' if reldir == '.' else reldir + '/'
+        for name in [x for x in tree if x == reldir or x.startswith(prefix)]:
+            del tree[name]
+            self._unwatch(os.path.normpath(os.path.join(root, name)))
+
+    @staticmethod
+    def _join(reldir, name):
+        '''
+        Return the relative path of an entry of a directory
+        '''
+        if reldir == '.':
+            return name
+        return os.path.join(reldir, name)
+
+    def file_lists(self, saltenv):
+        '''
+        Return the file lists of a saltenv, like the walk in _file_lists
+        '''
+        ret = {'files': [], 'dirs': [], 'empty_dirs': [], 'links': []}
+        for path in self.opts['file_roots'].get(saltenv, []):
+            tree = self.trees.get(os.path.normpath(path), {})
+            for reldir in sorted(tree):
+                entry = tree[reldir]
+                ret['dirs'].append(reldir)
+                if not entry['files'] and not entry['dirs']:
+                    if not salt.fileserver.is_file_ignored(self.opts, reldir):
+                        ret['empty_dirs'].append(reldir)
+                for name in sorted(entry['files']):
+                    if name in entry['links']:
+                        ret['links'].append(name)
+                        if self.opts['fileserver_ignoresymlinks']:
+                            continue
+                    rel_fn = self._join(reldir, name)
+                    if not salt.fileserver.is_file_ignored(self.opts, rel_fn):
+                        ret['files'].append(rel_fn)
+        return ret
+
+    def _refresh_hash(self, root, rel):
+        '''
+        Compute again the cached hash of a file which changed, the cached
+        hash is removed if the file is gone
+        '''
+        path = os.path.join(root, rel)
+        for saltenv in self.roots[root]:
+            cache_path = os.path.join(self.opts['cachedir'],
+                                      'roots/hash',
+                                      saltenv,
+                                      u'{0}.hash.{1}'.format(
+                                          rel, self.opts['hash_type']))
+            if not os.path.exists(cache_path):
+                # The file was never served, its hash is computed when it is
+                continue
+            try:
+                if not os.path.isfile(path):
+                    os.remove(cache_path)
+                    continue
+                hsum = salt.utils.get_hash(path, self.opts['hash_type'])
+                with salt.utils.flopen(cache_path, 'w') as fp_:
+                    fp_.write('{0}:{1}'.format(hsum, os.path.getmtime(path)))
+            except (IOError, OSError) as exc:
+                log.debug('Unable to refresh the cached hash of {0}: '
+                          '{1}'.format(path, exc))
+
+    def flush(self):
+        '''
+        Apply the recorded changes and write the file lists of the saltenvs
+        which changed
+        '''
+        for root in self.roots:
+            if '.' not in self.trees.get(root, {}) and os.path.isdir(root):
+                # The file root was created again
+                self.changed_dirs.add((root, '.'))
+        changed_dirs, self.changed_dirs = self.changed_dirs, set()
+        for root, reldir in changed_dirs:
+            if reldir == '.' or reldir in self.trees.get(root, {}):
+                self._scan(root, reldir)
+                self.changed_envs.update(self.roots[root])
+        changed_files, self.changed_files = self.changed_files, set()
+        for root, rel in changed_files:
+            self._refresh_hash(root, rel)
+        if not os.path.isdir(self.list_cachedir):
+            os.makedirs(self.list_cachedir)
+        changed_envs, self.changed_envs = self.changed_envs, set()
+        for saltenv in changed_envs:
+            snapshot = os.path.join(self.list_cachedir,
+                                    '{0}.snap'.format(saltenv))
+            with salt.utils.atomicfile.atomic_open(snapshot, 'wb') as fp_:
+                self.serial.dump(self.file_lists(saltenv), fp_)
+        if changed_envs or time.time() - self._heartbeat > WATCH_HEARTBEAT:
+            heartbeat = os.path.join(self.list_cachedir, '.watch')
+            with salt.utils.fopen(heartbeat, 'a'):
+                os.utime(heartbeat, None)
+            self._heartbeat = time.time()
+
+
 def file_list(load):
     '''
     Return a list of all files on the file server in a specified
@@ -16,6 +16,7 @@ import hashlib
 import logging
 
 # Import salt libs
+import salt.cache
 import salt.crypt
 import salt.utils
 import salt.client
@@ -563,17 +564,18 @@ class Key(object):
         '''
         if preserve_minions is None:
             preserve_minions = []
-        m_cache = os.path.join(self.opts['cachedir'], self.ACC)
-        if not os.path.isdir(m_cache):
+        cache = salt.cache.Cache(self.opts)
+        cached = cache.list('minions')
+        if not cached:
             return
         keys = self.list_keys()
         minions = []
         for key, val in six.iteritems(keys):
             minions.extend(val)
         if not self.opts.get('preserve_minion_cache', False) or not preserve_minions:
-            for minion in os.listdir(m_cache):
+            for minion in cached:
                 if minion not in minions and minion not in preserve_minions:
-                    shutil.rmtree(os.path.join(m_cache, minion))
+                    cache.flush('minions/{0}'.format(minion))
 
     def check_master(self):
         '''
@@ -1025,11 +1027,10 @@ class RaetKey(Key):
         for key, val in six.iteritems(keys):
             minions.extend(val)
 
-        m_cache = os.path.join(self.opts['cachedir'], 'minions')
-        if os.path.isdir(m_cache):
-            for minion in os.listdir(m_cache):
-                if minion not in minions:
-                    shutil.rmtree(os.path.join(m_cache, minion))
+        cache = salt.cache.Cache(self.opts)
+        for minion in cache.list('minions'):
+            if minion not in minions:
+                cache.flush('minions/{0}'.format(minion))
 
         kind = self.opts.get('__role', '')  # application kind
         if kind not in kinds.APPL_KINDS:
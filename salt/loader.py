@@ -14,20 +14,26 @@ import sys
 import salt
 import time
 import logging
+import hashlib
 import inspect
 import tempfile
+import threading
 import functools
 from collections import MutableMapping
+from multiprocessing.pool import ThreadPool
 from zipimport import zipimporter
 
 # Import salt libs
 from salt.exceptions import LoaderError
 from salt.template import check_render_pipe_str
 from salt.utils.decorators import Depends
+import salt.utils.atomicfile
 import salt.utils.context
 import salt.utils.lazy
 import salt.utils.event
 import salt.utils.odict
+import salt.payload
+import salt.version
 
 # Solve the Chicken and egg problem where grains need to run before any
 # of the modules are loaded and are generally available for any usage.
@@ -78,6 +84,9 @@ LIBCLOUD_FUNCS_NOT_SUPPORTED = (
 # Will be set to pyximport module at runtime if cython is enabled in config.
 pyximport = None
 
+# The loader indexes read from the cachedir, parsed once per change of the file
+_LOADER_INDEXES = {}
+
 
 def static_loader(
         opts,
@@ -763,6 +772,18 @@ def queues(opts):
     )
 
 
+def cache(opts, serial):
+    '''
+    Returns the minion data cache modules
+    '''
+    return LazyLoader(
+        _module_dirs(opts, 'cache', 'cache'),
+        opts,
+        tag='cache',
+        pack={'__opts__': opts, '__context__': {'serial': serial}},
+    )
+
+
 def sdb(opts, functions=None, whitelist=None):
     '''
     Make a very small database call
@@ -967,10 +988,24 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         self.loaded_files = set()  # TODO: just remove them from file_mapping?
         self.static_modules = static_modules if static_modules else []
 
+        # time spent importing each file and running its __virtual__
+        self.load_stats = {}
+        # files being loaded -> thread loading them, thread -> file it waits
+        # for, for the threads of _load_all
+        self._lock = threading.RLock()
+        self._loading_cond = threading.Condition(self._lock)
+        self._loading = {}
+        self._waiting = {}
+
         self.disabled = set(self.opts.get('disable_{0}s'.format(self.tag), []))
 
         self.refresh_file_mapping()
 
+        # mapping of file name -> what the file loaded as, by earlier loaders
+        self.index_path = self._index_path()
+        self.index = self._read_index()
+        self.index_dirty = False
+
         super(LazyLoader, self).__init__()  # late init the lazy loader
         # create all of the import namespaces
         _generate_module('{0}.int'.format(self.loaded_base_name))
@@ -1002,16 +1037,45 @@ class LazyLoader(salt.utils.lazy.LazyDict):
 
         # otherwise we assume its jinja template access
         if mod_name not in self.loaded_modules and not self.loaded:
+            self._load_mod_name(mod_name)
+        if mod_name in self.loaded_modules:
+            return self.loaded_modules[mod_name]
+        else:
+            raise AttributeError(mod_name)
+
+    def _load_mod_name(self, mod_name):
+        '''
+        Load the files which may provide the virtual module mod_name, until
+        one of them does
+        '''
+        with self._lock:
             for name in self._iter_files(mod_name):
                 if name in self.loaded_files:
                     continue
                 # if we got what we wanted, we are done
                 if self._load_module(name) and mod_name in self.loaded_modules:
                     break
-        if mod_name in self.loaded_modules:
-            return self.loaded_modules[mod_name]
-        else:
-            raise AttributeError(mod_name)
+            self._write_index()
+
+    def preload(self, names):
+        '''
+        Load the named virtual modules ahead of their first use, or all of
+        them if names contains ``*``, so that the processes forked from this
+        one inherit them already loaded
+        '''
+        if not names or self.loaded:
+            return
+        if '*' in names:
+            self._load_all()
+            return
+        for mod_name in names:
+            if self.whitelist and mod_name not in self.whitelist:
+                continue
+            if mod_name not in self.loaded_modules:
+                self._load_mod_name(mod_name)
+            if mod_name not in self.loaded_modules:
+                log.debug('Unable to preload {0} module \'{1}\''.format(
+                    self.tag, mod_name))
 
     def missing_fun_string(self, function_name):
         '''
@@ -1120,6 +1184,114 @@ class LazyLoader(salt.utils.lazy.LazyDict):
             f_noext = smod.split('.')[-1]
             self.file_mapping[f_noext] = (smod, '.o')
 
+    def _index_path(self):
+        '''
+        Return the path of the index of the modules loaded with the same
+        module dirs and a similar system, or None if the index is disabled
+        '''
+        if not self.opts.get('loader_index', False) \
+                or not self.opts.get('cachedir'):
+            return None
+        grains = self.opts.get('grains', {})
+        fingerprint = [
+            self.tag,
+            self.module_dirs,
+            self.static_modules,
+            sorted(self.disabled),
+            salt.version.__version__,
+            sys.version,
+            [grains.get(x) for x in ('os', 'osfinger', 'kernelrelease',
+                                     'cpuarch')],
+        ]
+        return os.path.join(
+            self.opts['cachedir'],
+            'loader',
+            '{0}.{1}.p'.format(
+                self.tag,
+                hashlib.md5(repr(fingerprint).encode()).hexdigest()
+            )
+        )
+
+    def _read_index(self):
+        '''
+        Read the index of the modules loaded by earlier loaders
+        '''
+        if self.index_path is None:
+            return {}
+        try:
+            st_ = os.stat(self.index_path)
+        except OSError:
+            return {}
+        stamp = (st_.st_ino, st_.st_size, st_.st_mtime)
+        if self.index_path in _LOADER_INDEXES \
+                and _LOADER_INDEXES[self.index_path][0] == stamp:
+            return dict(_LOADER_INDEXES[self.index_path][1])
+        try:
+            with salt.utils.fopen(self.index_path, 'rb') as fp_:
+                index = salt.payload.Serial(self.opts).load(fp_)
+        except Exception as exc:
+            log.debug('Unable to read the loader index {0}: {1}'.format(
+                self.index_path, exc))
+            return {}
+        if not isinstance(index, dict):
+            return {}
+        _LOADER_INDEXES[self.index_path] = (stamp, index)
+        return dict(index)
+
+    def _write_index(self):
+        '''
+        Write the index if modules were loaded which were not in it
+        '''
+        if self.index_path is None or not self.index_dirty:
+            return
+        self.index_dirty = False
+        try:
+            index_dir = os.path.dirname(self.index_path)
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            with salt.utils.atomicfile.atomic_open(self.index_path, 'wb') as fp_:
+                fp_.write(salt.payload.Serial(self.opts).dumps(self.index))
+        except (IOError, OSError, TypeError, ValueError) as exc:
+            log.debug('Unable to write the loader index {0}: {1}'.format(
+                self.index_path, exc))
+
+    def _index_module(self, name, fpath, module_name, functions):
+        '''
+        Record the name a file loaded as and the functions it provided
+        '''
+        try:
+            mtime = os.path.getmtime(fpath)
+        except (OSError, TypeError):
+            # Static modules are not files
+            return
+        entry = {'path': fpath,
+                 'mtime': mtime,
+                 'virtualname': module_name,
+                 'functions': sorted(functions)}
+        if self.index.get(name) != entry:
+            self.index[name] = entry
+            self.index_dirty = True
+
+    def _indexed_files(self, mod_name, func_name=None):
+        '''
+        Return the files which loaded as mod_name the last time they were
+        loaded, unless they changed since. The files which provided func_name
+        come first.
+        '''
+        ret = []
+        for name, entry in six.iteritems(self.index):
+            if entry.get('virtualname') != mod_name \
+                    or name not in self.file_mapping \
+                    or self.file_mapping[name][0] != entry.get('path'):
+                continue
+            try:
+                if os.path.getmtime(entry['path']) != entry.get('mtime'):
+                    continue
+            except OSError:
+                continue
+            ret.append((func_name not in entry.get('functions', []), name))
+        return [name for _, name in sorted(ret)]
+
     def clear(self):
         '''
         Clear the dict
@@ -1153,10 +1325,14 @@ class LazyLoader(salt.utils.lazy.LazyDict):
             mod_opts[key] = val
         return mod_opts
 
-    def _iter_files(self, mod_name):
+    def _iter_files(self, mod_name, func_name=None):
         '''
         Iterate over all file_mapping files in order of closeness to mod_name
         '''
+        # did a file load as mod_name before?
+        for name in self._indexed_files(mod_name, func_name):
+            yield name
+
         # do we have an exact match?
         if mod_name in self.file_mapping:
             yield mod_name
@@ -1185,6 +1361,71 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 self._reload_submodules(submodule)
 
     def _load_module(self, name):
+        '''
+        Import the file, run its __virtual__ function and register its
+        functions. The __virtual__ function runs without holding the lock of
+        the loader, so that _load_all can run several of them at once.
+        '''
+        fpath = self.file_mapping[name][0]
+        with self._lock:
+            self._loading[name] = threading.current_thread()
+        try:
+            with self._lock:
+                start = time.time()
+                imported = self._import_module(name)
+                stats = {'import': time.time() - start,
+                         'virtual': 0,
+                         'loaded': False}
+                self.load_stats[name] = stats
+            if imported is None:
+                return False
+            mod, module_name = imported
+            stats['module'] = module_name
+
+            # if virtual modules are enabled, we need to look for the
+            # __virtual__() function inside that module and run it.
+            if self.virtual_enable:
+                start = time.time()
+                (virtual_ret, module_name, virtual_err) = self.process_virtual(
+                    mod,
+                    module_name,
+                )
+                stats['virtual'] = time.time() - start
+                stats['module'] = module_name
+                if virtual_err is not None:
+                    log.debug('Error loading {0}.{1}: {2}'.format(self.tag,
+                                                                  module_name,
+                                                                  virtual_err,
+                                                                  ))
+
+                # if process_virtual returned a non-True value then we are
+                # supposed to not process this module
+                if virtual_ret is not True:
+                    stats['error'] = virtual_err
+                    with self._lock:
+                        # If a module has information about why it could not be loaded, record it
+                        self.missing_modules[module_name] = virtual_err
+                        self.missing_modules[name] = virtual_err
+                        if self.index.pop(name, None) is not None:
+                            self.index_dirty = True
+                    return False
+
+            with self._lock:
+                stats['loaded'] = self._register_module(name,
+                                                        fpath,
+                                                        mod,
+                                                        module_name)
+            return stats['loaded']
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
+                self._loading_cond.notify_all()
+
+    def _import_module(self, name):
+        '''
+        Import the file and pack the globals into it. Return the module and
+        its default name, or None if the import failed.
+        '''
         mod = None
         fpath, suffix = self.file_mapping[name]
         self.loaded_files.add(name)
@@ -1236,7 +1477,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 ),
                 exc_info=True
             )
-            return False
+            return None
         except Exception as error:
             log.error(
                 'Failed to import {0} {1}, this is due most likely to a '
@@ -1245,7 +1486,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 ),
                 exc_info=True
             )
-            return False
+            return None
         except SystemExit:
             log.error(
                 'Failed to import {0} {1} as the module called exit()\n'.format(
@@ -1253,7 +1494,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 ),
                 exc_info=True
             )
-            return False
+            return None
         finally:
             sys.path.pop()
 
@@ -1285,29 +1526,15 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     exc_info=True)
                 self.missing_modules[module_name] = err_string
                 self.missing_modules[name] = err_string
-                return False
+                return None
 
-        # if virtual modules are enabled, we need to look for the
-        # __virtual__() function inside that module and run it.
-        if self.virtual_enable:
-            (virtual_ret, module_name, virtual_err) = self.process_virtual(
-                mod,
-                module_name,
-            )
-            if virtual_err is not None:
-                log.debug('Error loading {0}.{1}: {2}'.format(self.tag,
-                                                              module_name,
-                                                              virtual_err,
-                                                              ))
-
-            # if process_virtual returned a non-True value then we are
-            # supposed to not process this module
-            if virtual_ret is not True:
-                # If a module has information about why it could not be loaded, record it
-                self.missing_modules[module_name] = virtual_err
-                self.missing_modules[name] = virtual_err
-                return False
+        return mod, module_name
 
+    def _register_module(self, name, fpath, mod, module_name):
+        '''
+        Register the functions of a module whose __virtual__ function let it
+        load
+        '''
         # If this is a proxy minion then MOST modules cannot work. Therefore, require that
         # any module that does work with salt-proxy-minion define __proxyenabled__ as a list
         # containing the names of the proxy types that the module supports.
@@ -1361,6 +1588,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                      'for reasons: {0}'.format(exc))
 
         self.loaded_modules[module_name] = mod_dict
+        self._index_module(name, fpath, module_name, mod_dict)
         return True
 
     def _load(self, key):
@@ -1378,46 +1606,101 @@ class LazyLoader(salt.utils.lazy.LazyDict):
             raise KeyError
 
         def _inner_load(mod_name):
-            for name in self._iter_files(mod_name):
+            for name in self._iter_files(mod_name, key.split('.', 1)[1]):
                 if name in self.loaded_files:
+                    # another thread of _load_all may still be loading it
+                    self._wait_loading(name)
+                    if key in self._dict:
+                        return True
                     continue
                 # if we got what we wanted, we are done
                 if self._load_module(name) and key in self._dict:
                     return True
             return False
 
-        # try to load the module
-        ret = None
-        reloaded = False
-        # re-scan up to once, IOErrors or a failed load cause re-scans of the
-        # filesystem
-        while True:
-            try:
-                ret = _inner_load(mod_name)
-                if not reloaded and ret is not True:
-                    self.refresh_file_mapping()
-                    reloaded = True
+        with self._lock:
+            # try to load the module
+            ret = None
+            reloaded = False
+            # re-scan up to once, IOErrors or a failed load cause re-scans of the
+            # filesystem
+            while True:
+                try:
+                    ret = _inner_load(mod_name)
+                    if not reloaded and ret is not True:
+                        self.refresh_file_mapping()
+                        reloaded = True
+                        continue
+                    break
+                except IOError:
+                    if not reloaded:
+                        self.refresh_file_mapping()
+                        reloaded = True
                     continue
-                break
-            except IOError:
-                if not reloaded:
-                    self.refresh_file_mapping()
-                    reloaded = True
-                continue
 
+            self._write_index()
         return ret
 
+    def _wait_loading(self, name):
+        '''
+        Wait until no other thread is loading the file, unless that thread is
+        itself waiting for this one. Must be called with the lock held.
+        '''
+        this_thread = threading.current_thread()
+        while self._loading.get(name, this_thread) is not this_thread:
+            # follow the threads waiting for each other from the one loading
+            # the file, to not wait in a circle
+            thread = self._loading[name]
+            seen = set()
+            while thread in self._waiting and thread not in seen:
+                seen.add(thread)
+                thread = self._loading.get(self._waiting[thread])
+            if thread is this_thread:
+                return
+            self._waiting[this_thread] = name
+            try:
+                self._loading_cond.wait()
+            finally:
+                del self._waiting[this_thread]
+
     def _load_all(self):
         '''
         Load all of them
         '''
-        for name in self.file_mapping:
-            if name in self.loaded_files or name in self.missing_modules:
-                continue
-            self._load_module(name)
+        workers = self.opts.get('loader_virtual_workers', 1)
+        if workers > 1 and self.virtual_enable:
+            names = [name for name in self.file_mapping
+                     if name not in self.loaded_files
+                     and name not in self.missing_modules]
+            pool = ThreadPool(min(workers, max(len(names), 1)))
+            try:
+                pool.map(self._load_module_once, names)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for name in self.file_mapping:
+                if name in self.loaded_files or name in self.missing_modules:
+                    continue
+                self._load_module(name)
 
+        with self._lock:
+            self._write_index()
         self.loaded = True
 
+    def _load_module_once(self, name):
+        '''
+        Load the file from a thread of _load_all, unless it was loaded in the
+        meantime to satisfy the __virtual__ function of another file
+        '''
+        with self._lock:
+            if name in self.loaded_files or name in self.missing_modules:
+                return False
+            # claim the file before releasing the lock
+            self.loaded_files.add(name)
+            self._loading[name] = threading.current_thread()
+        return self._load_module(name)
+
     def _apply_outputter(self, func, mod):
         '''
         Apply the __outputter__ variable to the functions
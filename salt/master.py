@@ -14,11 +14,9 @@ import time
 import errno
 import signal
 import logging
-import tempfile
 import traceback
 
 # Import third party libs
-from Crypto.PublicKey import RSA
 # pylint: disable=import-error,no-name-in-module,redefined-builtin
 import salt.ext.six as six
 from salt.ext.six.moves import range
@@ -40,6 +38,7 @@ except ImportError:
 import tornado.gen  # pylint: disable=F0401
 
 # Import salt libs
+import salt.cache
 import salt.crypt
 import salt.utils
 import salt.client
@@ -55,11 +54,12 @@ import salt.key
 import salt.acl
 import salt.engines
 import salt.fileserver
+import salt.fileserver.roots
 import salt.daemons.masterapi
 import salt.defaults.exitcodes
 import salt.transport.server
 import salt.log.setup
-import salt.utils.atomicfile
+import salt.utils.cache
 import salt.utils.event
 import salt.utils.job
 import salt.utils.reactor
@@ -75,7 +75,7 @@ from salt.utils.debug import (
     enable_sigusr1_handler, enable_sigusr2_handler, inspect_stack
 )
 from salt.utils.event import tagify
-from salt.utils.master import ConnectedCache
+from salt.utils.master import ConnectedCache, MinionDataCache
 from salt.utils.process import default_signals, SignalHandlingMultiprocessingProcess
 
 try:
@@ -187,10 +187,28 @@ class Maintenance(SignalHandlingMultiprocessingProcess):
                                                      runner_client.functions_dict(),
                                                      returners=self.returners)
         self.ckminions = salt.utils.minions.CkMinions(self.opts)
+        # The ZeroMQ publisher can not report disconnected minions to the
+        # connected registry, it is reconciled here instead
+        if self.opts.get('transport', 'zeromq') == 'zeromq':
+            self.registry = salt.utils.cache.get_connected_registry(self.opts)
+        else:
+            self.registry = None
         # Make Event bus for firing
         self.event = salt.utils.event.get_master_event(self.opts, self.opts['sock_dir'], listen=False)
         # Init any values needed by the git ext pillar
         self.git_pillar = salt.daemons.masterapi.init_git_pillar(self.opts)
+        # The compiled pillar is cleared when its sources change
+        if self.opts.get('pillar_cache', False):
+            self.pillar_cache = salt.pillar.PillarCache(self.opts)
+        else:
+            self.pillar_cache = None
+        # Keep the file lists of the roots fileserver up to date
+        self.roots_watcher = None
+        if self.opts.get('fileserver_watch', False) and \
+                'roots' in self.opts['fileserver_backend']:
+            watcher = salt.fileserver.roots.RootsWatcher(self.opts)
+            if watcher.start():
+                self.roots_watcher = watcher
         # Set up search object
         self.search = salt.search.Search(self.opts)
 
@@ -222,7 +240,9 @@ class Maintenance(SignalHandlingMultiprocessingProcess):
                 salt.daemons.masterapi.clean_expired_tokens(self.opts)
             self.handle_search(now, last)
             self.handle_git_pillar()
+            self.handle_pillar_cache()
             self.handle_schedule()
+            self.handle_connected_registry()
             self.handle_presence(old_present)
             self.handle_key_rotate(now)
             salt.daemons.masterapi.fileserver_update(self.fileserver)
@@ -278,7 +298,9 @@ class Maintenance(SignalHandlingMultiprocessingProcess):
         '''
         try:
             for pillar in self.git_pillar:
-                pillar.update()
+                if pillar.update() and self.pillar_cache is not None:
+                    # The git_pillar remotes were fetched
+                    self.pillar_cache.clear()
         except Exception as exc:
             log.error(
                 'Exception \'{0}\' caught while updating git_pillar'
@@ -286,6 +308,21 @@ class Maintenance(SignalHandlingMultiprocessingProcess):
                 exc_info_on_loglevel=logging.DEBUG
             )
 
+    def handle_pillar_cache(self):
+        '''
+        Clear the compiled pillar cache if the pillar_roots changed
+        '''
+        if self.pillar_cache is None:
+            return
+        try:
+            self.pillar_cache.check_roots()
+        except Exception as exc:
+            log.error(
+                'Exception \'{0}\' caught while checking the pillar_roots'
+                .format(exc),
+                exc_info_on_loglevel=logging.DEBUG
+            )
+
     def handle_schedule(self):
         '''
         Evaluate the scheduler
@@ -301,6 +338,14 @@ class Maintenance(SignalHandlingMultiprocessingProcess):
                 'Exception {0} occurred in scheduled job'.format(exc)
             )
 
+    def handle_connected_registry(self):
+        '''
+        Reconcile the connected registry with the connections to the publish
+        port
+        '''
+        if self.registry and self.opts.get('minion_data_cache', False):
+            self.registry.sync(self.ckminions.scan_connected_ids())
+
     def handle_presence(self, old_present):
         '''
         Fire presence events if enabled
@@ -488,6 +533,17 @@ class Master(SMaster):
 
             log.info('Creating master process manager')
             self.process_manager = salt.utils.process.ProcessManager()
+
+            if self.opts.get('connected_registry', False):
+                if salt.utils.cache.HAS_FCNTL:
+                    # Start with an empty registry, the minions are registered
+                    # again as they reconnect
+                    log.info('Creating the connected minions registry')
+                    salt.utils.cache.ConnectedRegistry(self.opts, create=True)
+                else:
+                    log.error('The connected registry is not available on '
+                              'this platform, not creating it')
+
             pub_channels = []
             log.info('Creating master publisher process')
             for transport, opts in iter_transport_opts(self.opts):
@@ -536,6 +592,18 @@ class Master(SMaster):
                 log.debug('Sleeping for two seconds to let concache rest')
                 time.sleep(2)
 
+            if self.opts.get('minion_data_cache_index', False):
+                if not HAS_ZMQ:
+                    log.error('The minion data cache index requires ZeroMQ, '
+                              'not starting it')
+                elif not self.opts.get('minion_data_cache', False):
+                    log.warning('minion_data_cache_index is set but '
+                                'minion_data_cache is disabled, not starting '
+                                'the minion data cache index')
+                else:
+                    log.info('Creating master minion data cache process')
+                    self.process_manager.add_process(MinionDataCache, args=(self.opts,))
+
             log.info('Creating master request server process')
             kwargs = {}
             if salt.utils.is_windows():
@@ -671,6 +739,10 @@ class ReqServer(object):
                 if tcp_only:
                     log.warning("TCP transport is currently supporting the only 1 worker on Windows.")
                     self.opts['worker_threads'] = 1
+            elif self.opts.get('preload_modules'):
+                # Load the modules once here, the workers are forked from
+                # this process and share them instead of each loading them
+                kwargs['mminion'] = self.__warm_mminion()
 
             for ind in range(int(self.opts['worker_threads'])):
                 self.process_manager.add_process(MWorker,
@@ -681,6 +753,24 @@ class ReqServer(object):
                                                     ),
                                                 kwargs=kwargs
                                                 )
+
+            # Start the workers dedicated to the minion authentication, for
+            # the transports which can hand them the auth requests
+            auth_channels = []
+            for chan in req_channels:
+                auth_chan = chan.auth_channel()
+                if auth_chan is not None:
+                    auth_channels.append(auth_chan)
+            if auth_channels:
+                for ind in range(int(self.opts['auth_workers'])):
+                    self.process_manager.add_process(MWorker,
+                                                    args=(self.opts,
+                                                        self.master_key,
+                                                        self.key,
+                                                        auth_channels,
+                                                        ),
+                                                    kwargs=kwargs
+                                                    )
         try:
             self.process_manager.run()
         except (KeyboardInterrupt, SystemExit) as exc:
@@ -693,6 +783,20 @@ class ReqServer(object):
             self.process_manager.kill_children()
             salt.log.setup.shutdown_multiprocessing_logging()
 
+    def __warm_mminion(self):
+        '''
+        Create the master minion shared by the workers, with the modules in
+        ``preload_modules`` and the master job cache returner loaded
+        '''
+        mminion = salt.minion.MasterMinion(
+            self.opts,
+            states=False,
+            rend=False)
+        mminion.functions.preload(self.opts['preload_modules'])
+        mminion.returners.preload(
+            [self.opts['master_job_cache'].split('.')[0]])
+        return mminion
+
     def run(self):
         '''
         Start up the ReqServer
@@ -730,6 +834,7 @@ class MWorker(SignalHandlingMultiprocessingProcess):
                  mkey,
                  key,
                  req_channels,
+                 mminion=None,
                  **kwargs):
         '''
         Create a salt master worker process
@@ -737,6 +842,9 @@ class MWorker(SignalHandlingMultiprocessingProcess):
         :param dict opts: The salt options
         :param dict mkey: The user running the salt master and the AES key
         :param dict key: The user running the salt master and the RSA key
+        :param MasterMinion mminion: A master minion with its modules already
+                                     loaded, shared with the other workers
+                                     forked from the same process
 
         :rtype: MWorker
         :return: Master worker
@@ -744,6 +852,7 @@ class MWorker(SignalHandlingMultiprocessingProcess):
         SignalHandlingMultiprocessingProcess.__init__(self, **kwargs)
         self.opts = opts
         self.req_channels = req_channels
+        self.mminion = mminion
 
         self.mkey = mkey
         self.key = key
@@ -759,6 +868,7 @@ class MWorker(SignalHandlingMultiprocessingProcess):
         SignalHandlingMultiprocessingProcess.__init__(self, log_queue=state['log_queue'])
         self.opts = state['opts']
         self.req_channels = state['req_channels']
+        self.mminion = None
         self.mkey = state['mkey']
         self.key = state['key']
         self.k_mtime = state['k_mtime']
@@ -850,8 +960,9 @@ class MWorker(SignalHandlingMultiprocessingProcess):
         self.clear_funcs = ClearFuncs(
             self.opts,
             self.key,
+            mminion=self.mminion,
             )
-        self.aes_funcs = AESFuncs(self.opts)
+        self.aes_funcs = AESFuncs(self.opts, mminion=self.mminion)
         salt.utils.reinit_crypto()
         self.__bind()
 
@@ -863,11 +974,13 @@ class AESFuncs(object):
     '''
     # The AES Functions:
     #
-    def __init__(self, opts):
+    def __init__(self, opts, mminion=None):
         '''
         Create a new AESFuncs
 
         :param dict opts: The salt options
+        :param MasterMinion mminion: The master minion to use, instead of
+                                     creating a new one
 
         :rtype: AESFuncs
         :returns: Instance for handling AES operations
@@ -876,15 +989,27 @@ class AESFuncs(object):
         self.event = salt.utils.event.get_master_event(self.opts, self.opts['sock_dir'], listen=False)
         self.serial = salt.payload.Serial(opts)
         self.ckminions = salt.utils.minions.CkMinions(opts)
+        self.cache = salt.cache.Cache(opts)
+        self.minion_keys = salt.crypt.MinionKeyCache(opts)
+        if self.opts.get('pillar_cache', False):
+            self.pillar_cache = salt.pillar.PillarCache(opts)
+        else:
+            self.pillar_cache = None
         # Make a client
         self.local = salt.client.get_local_client(self.opts['conf_file'])
         # Create the master minion to access the external job cache
-        self.mminion = salt.minion.MasterMinion(
-            self.opts,
-            states=False,
-            rend=False)
+        if mminion is None:
+            mminion = salt.minion.MasterMinion(
+                self.opts,
+                states=False,
+                rend=False)
+        self.mminion = mminion
         self.__setup_fileserver()
-        self.masterapi = salt.daemons.masterapi.RemoteFuncs(opts)
+        self.masterapi = salt.daemons.masterapi.RemoteFuncs(opts, mminion=mminion)
+        if self.opts.get('minion_data_cache_index', False) and HAS_ZMQ:
+            self.data_cache_cli = salt.utils.cache.MinionDataCacheCli(self.opts)
+        else:
+            self.data_cache_cli = None
 
     def __setup_fileserver(self):
         '''
@@ -893,6 +1018,7 @@ class AESFuncs(object):
         self.fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = self.fs_.serve_file
         self._file_hash = self.fs_.file_hash
+        self._file_manifest = self.fs_.file_manifest
         self._file_list = self.fs_.file_list
         self._file_list_emptydirs = self.fs_.file_list_emptydirs
         self._dir_list = self.fs_.dir_list
@@ -912,26 +1038,12 @@ class AESFuncs(object):
         '''
         if not salt.utils.verify.valid_id(self.opts, id_):
             return False
-        pub_path = os.path.join(self.opts['pki_dir'], 'minions', id_)
-        with salt.utils.fopen(pub_path, 'r') as fp_:
-            minion_pub = fp_.read()
-        tmp_pub = salt.utils.mkstemp()
-        with salt.utils.fopen(tmp_pub, 'w+') as fp_:
-            fp_.write(minion_pub)
-
-        pub = None
-        try:
-            with salt.utils.fopen(tmp_pub) as fp_:
-                pub = RSA.importKey(fp_.read())
-        except (ValueError, IndexError, TypeError) as err:
-            log.error('Unable to load temporary public key "{0}": {1}'
-                      .format(tmp_pub, err))
         try:
-            os.remove(tmp_pub)
-            if salt.crypt.public_decrypt(pub, token) == 'salt':
+            if self.minion_keys.verify_token(id_, token):
                 return True
-        except ValueError as err:
-            log.error('Unable to decrypt token: {0}'.format(err))
+        except (ValueError, IndexError, TypeError) as err:
+            log.error('Unable to verify the token of {0}: {1}'
+                      .format(id_, err))
 
         log.error('Salt minion claiming to be {0} has attempted to'
                   'communicate with the master and could not be verified'
@@ -1221,32 +1333,46 @@ class AESFuncs(object):
             return False
         load['grains']['id'] = load['id']
 
-        pillar_dirs = {}
-        pillar = salt.pillar.Pillar(
-            self.opts,
-            load['grains'],
-            load['id'],
-            load.get('saltenv', load.get('env')),
-            ext=load.get('ext'),
-            pillar=load.get('pillar_override', {}),
-            pillarenv=load.get('pillarenv'))
-        data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
-        self.fs_.update_opts()
+        saltenv = load.get('saltenv', load.get('env'))
+        # The pillar overrides are specific to a single call, the pillar
+        # compiled with them is not cached
+        use_cache = self.pillar_cache is not None and not load.get('pillar_override')
+        data = None
+        if use_cache:
+            if load.get('refresh'):
+                self.pillar_cache.clear(load['id'])
+            else:
+                data = self.pillar_cache.fetch(load['id'],
+                                               load['grains'],
+                                               saltenv,
+                                               load.get('pillarenv'),
+                                               load.get('ext'))
+        if data is None:
+            pillar_dirs = {}
+            pillar = salt.pillar.Pillar(
+                self.opts,
+                load['grains'],
+                load['id'],
+                saltenv,
+                ext=load.get('ext'),
+                pillar=load.get('pillar_override', {}),
+                pillarenv=load.get('pillarenv'))
+            data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
+            self.fs_.update_opts()
+            # Pillar which failed to render is compiled again next time
+            if use_cache and '_errors' not in data:
+                self.pillar_cache.store(load['id'],
+                                        load['grains'],
+                                        data,
+                                        saltenv,
+                                        load.get('pillarenv'),
+                                        load.get('ext'))
         if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
-            if not os.path.isdir(cdir):
-                os.makedirs(cdir)
-            datap = os.path.join(cdir, 'data.p')
-            tmpfh, tmpfname = tempfile.mkstemp(dir=cdir)
-            os.close(tmpfh)
-            with salt.utils.fopen(tmpfname, 'w+b') as fp_:
-                fp_.write(
-                    self.serial.dumps(
-                        {'grains': load['grains'],
-                         'pillar': data})
-                    )
-            # On Windows, os.rename will fail if the destination file exists.
-            salt.utils.atomicfile.atomic_rename(tmpfname, datap)
+            self.cache.store('minions/{0}'.format(load['id']),
+                             'data',
+                             {'grains': load['grains'], 'pillar': data})
+            if self.data_cache_cli is not None:
+                self.data_cache_cli.put_cache(load['id'], load['grains'], data)
         return data
 
     def _minion_event(self, load):
@@ -1514,7 +1640,7 @@ class ClearFuncs(object):
     # the clear:
     # publish (The publish from the LocalClient)
     # _auth
-    def __init__(self, opts, key):
+    def __init__(self, opts, key, mminion=None):
         self.opts = opts
         self.key = key
         # Create the event manager
@@ -1523,17 +1649,21 @@ class ClearFuncs(object):
         self.local = salt.client.get_local_client(self.opts['conf_file'])
         # Make an minion checker object
         self.ckminions = salt.utils.minions.CkMinions(opts)
+        # Make a connected registry client, to tell which minions are missing
+        self.registry = salt.utils.cache.get_connected_registry(opts)
         # Make an Auth object
         self.loadauth = salt.auth.LoadAuth(opts)
         # Stand up the master Minion to access returner data
-        self.mminion = salt.minion.MasterMinion(
-            self.opts,
-            states=False,
-            rend=False)
+        if mminion is None:
+            mminion = salt.minion.MasterMinion(
+                self.opts,
+                states=False,
+                rend=False)
+        self.mminion = mminion
         # Make a wheel object
         self.wheel_ = salt.wheel.Wheel(opts)
         # Make a masterapi object
-        self.masterapi = salt.daemons.masterapi.LocalFuncs(opts, key)
+        self.masterapi = salt.daemons.masterapi.LocalFuncs(opts, key, mminion=mminion)
 
     def process_token(self, tok, fun, auth_type):
         '''
@@ -2119,14 +2249,21 @@ class ClearFuncs(object):
         payload = self._prep_pub(minions, jid, clear_load, extra)
 
         # Send it!
-        self._send_pub(payload)
+        self._send_pub(payload, minions=minions)
 
+        load = {
+            'jid': clear_load['jid'],
+            'minions': minions
+        }
+        if self.registry:
+            connected = self.registry.connected()
+            if connected is not None:
+                # The targeted minions which will not see the publication
+                load['missing'] = [minion for minion in minions
+                                   if minion not in connected]
         return {
             'enc': 'clear',
-            'load': {
-                'jid': clear_load['jid'],
-                'minions': minions
-            }
+            'load': load
         }
 
     def _prep_jid(self, clear_load, extra):
@@ -2154,13 +2291,13 @@ class ClearFuncs(object):
             return {'error': msg}
         return jid
 
-    def _send_pub(self, load):
+    def _send_pub(self, load, minions=None):
         '''
         Take a load and send it across the network to connected minions
         '''
         for transport, opts in iter_transport_opts(self.opts):
             chan = salt.transport.server.PubServerChannel.factory(opts)
-            chan.publish(load)
+            chan.publish(load, minions=minions)
 
     def _prep_pub(self, minions, jid, clear_load, extra):
         '''
@@ -975,6 +975,9 @@ class Minion(MinionBase):
         else:
             functions = salt.loader.minion_mods(self.opts, utils=self.utils, notify=notify, proxy=proxy)
         returners = salt.loader.returners(self.opts, functions)
+        # Load the commonly used modules now, so that the jobs forked from
+        # this process do not each have to load them again
+        functions.preload(self.opts.get('preload_modules'))
         errors = {}
         if '_errors' in functions:
             errors = functions['_errors']
@@ -1512,6 +1515,7 @@ class Minion(MinionBase):
                 self.opts['id'],
                 self.opts['environment'],
                 pillarenv=self.opts.get('pillarenv'),
+                refresh=True,
             ).compile_pillar()
         except SaltClientError:
             # Do not exit if a pillar refresh fails.
@@ -14,6 +14,7 @@ import salt.runner
 import salt.state
 import salt.utils
 import salt.utils.schema as S
+from salt.exceptions import CommandExecutionError
 from salt.utils.doc import strip_rst as _strip_rst
 from salt.ext.six.moves import zip
 
@@ -425,6 +426,49 @@ def reload_modules():
     return True
 
 
+def loader_stats(sort='total', limit=None):
+    '''
+    .. versionadded:: Boron
+
+    Return the time in seconds spent importing each execution module file and
+    running its ``__virtual__`` function, slowest first, for the files loaded
+    so far. Run ``sys.doc`` beforehand to load all of the execution modules.
+
+    sort
+        Sort by ``import``, ``virtual`` or ``total`` time
+
+    limit
+        Only return this many files
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' sys.loader_stats
+        salt '*' sys.loader_stats sort=virtual limit=10
+    '''
+    if sort not in ('import', 'virtual', 'total'):
+        raise CommandExecutionError(
+            'Invalid sort \'{0}\', must be one of import, virtual or '
+            'total'.format(sort)
+        )
+    ret = []
+    for name, stats in six.iteritems(getattr(__salt__, 'load_stats', {})):
+        entry = {'file': name,
+                 'module': stats.get('module', name),
+                 'import': round(stats['import'], 4),
+                 'virtual': round(stats['virtual'], 4),
+                 'total': round(stats['import'] + stats['virtual'], 4),
+                 'loaded': stats['loaded']}
+        if stats.get('error'):
+            entry['error'] = stats['error']
+        ret.append(entry)
+    ret.sort(key=lambda x: x[sort], reverse=True)
+    if limit is not None:
+        ret = ret[:int(limit)]
+    return ret
+
+
 def argspec(module=''):
     '''
     Return the argument specification of functions in Salt execution
@@ -6,16 +6,24 @@ Render the pillar data
 # Import python libs
 from __future__ import absolute_import
 import copy
+import errno
 import os
 import collections
+import hashlib
+import json
 import logging
+import pprint
+import time
 
 # Import salt libs
+import salt.cache
 import salt.loader
 import salt.fileclient
+import salt.fileserver
 import salt.minion
 import salt.crypt
 import salt.transport
+import salt.utils
 import salt.utils.url
 from salt.exceptions import SaltClientError
 from salt.template import compile_template
@@ -54,9 +62,11 @@ def get_pillar(opts, grains, id_, saltenv=None, ext=None, env=None, funcs=None,
 
 # TODO: migrate everyone to this one!
 def get_async_pillar(opts, grains, id_, saltenv=None, ext=None, env=None, funcs=None,
-               pillar=None, pillarenv=None):
+               pillar=None, pillarenv=None, refresh=False):
     '''
-    Return the correct pillar driver based on the file_client option
+    Return the correct pillar driver based on the file_client option. With
+    refresh set, the master compiles the pillar again instead of returning the
+    one it cached.
     '''
     if env is not None:
         salt.utils.warn_until(
@@ -70,8 +80,11 @@ def get_async_pillar(opts, grains, id_, saltenv=None, ext=None, env=None, funcs=
         'remote': AsyncRemotePillar,
         'local': AsyncPillar,
     }.get(opts['file_client'], AsyncPillar)
+    kwargs = {}
+    if ptype is AsyncRemotePillar:
+        kwargs['refresh'] = refresh
     return ptype(opts, grains, id_, saltenv, ext, functions=funcs,
-                 pillar=pillar, pillarenv=pillarenv)
+                 pillar=pillar, pillarenv=pillarenv, **kwargs)
 
 
 class AsyncRemotePillar(object):
@@ -79,12 +92,13 @@ class AsyncRemotePillar(object):
     Get the pillar from the master
     '''
     def __init__(self, opts, grains, id_, saltenv, ext=None, functions=None,
-                 pillar=None, pillarenv=None):
+                 pillar=None, pillarenv=None, refresh=False):
         self.opts = opts
         self.opts['environment'] = saltenv
         self.ext = ext
         self.grains = grains
         self.id_ = id_
+        self.refresh = refresh
         self.channel = salt.transport.client.AsyncReqChannel.factory(opts)
         self.opts['pillarenv'] = pillarenv
         self.pillar_override = {}
@@ -108,6 +122,8 @@ class AsyncRemotePillar(object):
                 'cmd': '_pillar'}
         if self.ext:
             load['ext'] = self.ext
+        if self.refresh:
+            load['refresh'] = True
         try:
             ret_pillar = yield self.channel.crypted_transfer_decode_dictentry(
                 load,
@@ -172,6 +188,129 @@ class RemotePillar(object):
         return ret_pillar
 
 
+class PillarCache(object):
+    '''
+    Cache of the pillar compiled by the master for the minions
+
+    The pillar of a minion is cached for each of its saltenv, pillarenv and
+    ext pillar combinations, along with a hash of the grains it was compiled
+    with. It is compiled again when the grains of the minion change, when it
+    is older than ``pillar_cache_ttl`` or after it was cleared. The cache is
+    stored with the ``salt.cache`` driver of the master, encrypted with a key
+    kept in the pki_dir if ``pillar_cache_encrypt`` is set.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.cache = salt.cache.Cache(opts)
+        self.ttl = opts.get('pillar_cache_ttl', 3600)
+        self._crypticle = None
+
+    @staticmethod
+    def _hash(data):
+        '''
+        Return a hash of the data which does not depend on the order of the
+        dict keys
+        '''
+        try:
+            dumped = json.dumps(data, sort_keys=True, default=repr)
+        except (TypeError, ValueError):
+            # Strings which are not valid unicode
+            dumped = pprint.pformat(data)
+        return hashlib.sha1(dumped).hexdigest()
+
+    @property
+    def crypticle(self):
+        '''
+        The Crypticle encrypting the cache, its key is created the first time
+        it is needed
+        '''
+        if self._crypticle is None:
+            key_path = os.path.join(self.opts['pki_dir'], 'pillar_cache.key')
+            if not os.path.isfile(key_path):
+                # The key is written before it is linked in place, so that
+                # the master processes all use the key linked first
+                tmp_path = salt.utils.mkstemp(dir=self.opts['pki_dir'])
+                try:
+                    with salt.utils.fopen(tmp_path, 'w') as fp_:
+                        fp_.write(salt.crypt.Crypticle.generate_key_string())
+                    os.link(tmp_path, key_path)
+                except OSError as exc:
+                    if exc.errno != errno.EEXIST:
+                        raise
+                finally:
+                    os.remove(tmp_path)
+            with salt.utils.fopen(key_path) as fp_:
+                self._crypticle = salt.crypt.Crypticle(self.opts, fp_.read())
+        return self._crypticle
+
+    def _entry(self, saltenv, pillarenv, ext):
+        '''
+        Return the name of the cache entry for the given environments
+        '''
+        return self._hash([saltenv, pillarenv, ext])
+
+    def fetch(self, minion_id, grains, saltenv=None, pillarenv=None, ext=None):
+        '''
+        Return the cached pillar of the minion, or None if it has to be
+        compiled
+        '''
+        data = self.cache.fetch('pillar/{0}'.format(minion_id),
+                                self._entry(saltenv, pillarenv, ext))
+        if not isinstance(data, dict):
+            return None
+        if data.get('time', 0) + self.ttl < time.time():
+            return None
+        if data.get('grains') != self._hash(grains):
+            return None
+        if 'enc' in data:
+            try:
+                return self.crypticle.loads(data['enc'])
+            except Exception as exc:
+                log.debug('Unable to decrypt the cached pillar of {0}: '
+                          '{1}'.format(minion_id, exc))
+                return None
+        return data.get('pillar')
+
+    def store(self, minion_id, grains, pillar, saltenv=None, pillarenv=None,
+              ext=None):
+        '''
+        Cache the pillar compiled for the minion
+        '''
+        data = {'time': time.time(),
+                'grains': self._hash(grains)}
+        if self.opts.get('pillar_cache_encrypt', False):
+            data['enc'] = self.crypticle.dumps(pillar)
+        else:
+            data['pillar'] = pillar
+        self.cache.store('pillar/{0}'.format(minion_id),
+                         self._entry(saltenv, pillarenv, ext),
+                         data)
+
+    def clear(self, minion_id=None):
+        '''
+        Clear the cached pillar of a minion, or of all of the minions
+        '''
+        if minion_id is None:
+            self.cache.flush('pillar')
+        else:
+            self.cache.flush('pillar/{0}'.format(minion_id))
+
+    def check_roots(self):
+        '''
+        Clear the cached pillar of all of the minions if the files in the
+        pillar_roots changed since the last check. Return True if the cache
+        was cleared.
+        '''
+        mtime_map = salt.fileserver.generate_mtime_map(self.opts['pillar_roots'])
+        roots_hash = self._hash(mtime_map)
+        if self.cache.fetch('pillar_cache', 'roots') == roots_hash:
+            return False
+        log.debug('The pillar_roots changed, clearing the pillar cache')
+        self.clear()
+        self.cache.store('pillar_cache', 'roots', roots_hash)
+        return True
+
+
 class Pillar(object):
     '''
     Read over the pillar top files and render the pillar data
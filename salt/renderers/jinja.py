@@ -307,11 +307,16 @@ def _split_module_dicts():
 
 
 def render(template_file, saltenv='base', sls='', argline='',
-                          context=None, tmplpath=None, **kws):
+                          context=None, tmplpath=None, jinja_cache=None,
+                          **kws):
     '''
     Render the template_file, passing the functions and grains into the
     Jinja rendering system.
 
+    jinja_cache
+        A dict keeping the compiled template by its path, for the callers
+        rendering the same files again
+
     :rtype: string
     '''
     from_str = argline == '-s'
@@ -330,6 +335,7 @@ def render(template_file, saltenv='base', sls='', argline='',
                                           sls=sls,
                                           context=context,
                                           tmplpath=tmplpath,
+                                          jinja_cache=jinja_cache,
                                           **kws)
     if not tmp_data.get('result', False):
         raise SaltRenderError(
@@ -10,22 +10,41 @@ import errno
 import logging
 import os
 import shutil
+import struct
+import tempfile
+import threading
 import time
 import hashlib
-import bisect
+import contextlib
+import multiprocessing.util
 
 # Import salt libs
 import salt.payload
 import salt.utils
+import salt.utils.atomicfile
 import salt.utils.jid
 import salt.exceptions
 
 # Import 3rd-party libs
 import salt.ext.six as six
 
+try:
+    import fcntl
+except ImportError:
+    # fcntl is not available on windows
+    pass
+
 
 log = logging.getLogger(__name__)
 
+# The returns waiting to be written when job_cache_batch_returns is enabled,
+# mapping the jids to the returns of their minions
+_RETURN_BUFFER = {}
+_RETURN_BUFFER_LOCK = threading.Lock()
+_RETURN_BUFFER_TIMER = []
+# The processes which registered the flush of their buffer on exit
+_RETURN_BUFFER_FLUSH_PIDS = set()
+
 # load is the published job
 LOAD_P = '.load.p'
 # the list of minions that the job is targeted to (best effort match on the master side)
@@ -36,6 +55,17 @@ RETURN_P = 'return.p'
 OUT_P = 'out.p'
 # endtime is the end time for a job, not stored as msgpack
 ENDTIME = 'endtime'
+# returns is the directory holding the batches of buffered returns
+RETURNS_DIR = '.returns'
+# index is the directory holding the append-only job index segments
+INDEX_DIR = '.index'
+# segment for the jobs whose jid does not start with a timestamp
+INDEX_UNSORTED = 'unsorted'
+# lock file shared by the writers appending to the index segments and taken
+# exclusively while a segment is rewritten
+INDEX_LOCK = 'lock'
+# the keys of the load which are kept in the job index
+INDEX_LOAD_KEYS = ('fun', 'arg', 'tgt', 'tgt_type', 'user', 'metadata')
 
 
 def _job_dir():
@@ -79,6 +109,235 @@ def _walk_through(job_dir):
             yield jid, job, t_path, final
 
 
+def _index_dir():
+    '''
+    Return the directory holding the job index segments
+    '''
+    return os.path.join(_job_dir(), INDEX_DIR)
+
+
+def _index_segment(jid):
+    '''
+    Return the name of the index segment a jid belongs to. Jids generated by
+    salt start with a timestamp, they are bucketed by the hour so listing and
+    expiring jobs only needs to look at the segments of the requested range.
+    '''
+    jid = str(jid)
+    if len(jid) >= 10 and jid[:10].isdigit():
+        return jid[:10]
+    return INDEX_UNSORTED
+
+
+def _index_pack(serial, record):
+    '''
+    Serialize an index record, prefixed with its length
+    '''
+    data = serial.dumps(record)
+    return struct.pack('>I', len(data)) + data
+
+
+@contextlib.contextmanager
+def _index_lock(exclusive=False):
+    '''
+    Lock the job index. Appending records takes a shared lock, rewriting a
+    segment takes an exclusive lock so that no record appended while the
+    segment is read is lost when the new segment replaces it.
+    '''
+    if not salt.utils.is_fcntl_available(check_sunos=True):
+        yield
+        return
+    fd_ = os.open(os.path.join(_index_dir(), INDEX_LOCK),
+                  os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd_, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd_)
+
+
+def _index_append(jid, **record):
+    '''
+    Append a record for the given jid to the job index. Nothing is written
+    while the index does not exist, the jobs are picked up when it is built.
+    '''
+    index_dir = _index_dir()
+    if not os.path.isdir(index_dir):
+        return
+    record['jid'] = jid
+    serial = salt.payload.Serial(__opts__)
+    path = os.path.join(index_dir, '{0}.idx'.format(_index_segment(jid)))
+    try:
+        with _index_lock():
+            # A single write to a file opened with O_APPEND keeps the records
+            # of concurrent writers from interleaving
+            fd_ = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd_, _index_pack(serial, record))
+            finally:
+                os.close(fd_)
+    except (IOError, OSError) as exc:
+        log.warning('Could not update the job index: {0}'.format(exc))
+
+
+def _index_job(load):
+    '''
+    Return the part of a load which is kept in the job index
+    '''
+    job = dict((key, load[key]) for key in INDEX_LOAD_KEYS if key in load)
+    if 'metadata' not in job and isinstance(load.get('kwargs'), dict):
+        if 'metadata' in load['kwargs']:
+            job['metadata'] = load['kwargs']['metadata']
+    return job
+
+
+def _index_segments():
+    '''
+    Return the names of the index segments, oldest first. The segment of the
+    jobs without a timestamp comes first, the age of its jobs is unknown.
+    '''
+    index_dir = _index_dir()
+    if not os.path.isdir(index_dir):
+        _index_rebuild()
+    try:
+        names = os.listdir(index_dir)
+    except OSError:
+        return []
+    segments = sorted(name[:-4] for name in names if name.endswith('.idx'))
+    if INDEX_UNSORTED in segments:
+        segments.remove(INDEX_UNSORTED)
+        segments.insert(0, INDEX_UNSORTED)
+    return segments
+
+
+def _index_read(segment):
+    '''
+    Read an index segment and merge its records, returns a dict mapping the
+    jids to their entries
+    '''
+    path = os.path.join(_index_dir(), '{0}.idx'.format(segment))
+    serial = salt.payload.Serial(__opts__)
+    try:
+        with salt.utils.fopen(path, 'rb') as fp_:
+            data = fp_.read()
+    except (IOError, OSError):
+        return {}
+    entries = {}
+    pos = 0
+    while pos + 4 <= len(data):
+        size = struct.unpack('>I', data[pos:pos + 4])[0]
+        if pos + 4 + size > len(data):
+            # A partially written record at the end of the segment
+            break
+        try:
+            record = serial.loads(data[pos + 4:pos + 4 + size])
+        except Exception as exc:
+            log.warning('Skipping a corrupted job index record: {0}'.format(exc))
+            record = {}
+        pos += 4 + size
+        if not isinstance(record, dict) or 'jid' not in record:
+            continue
+        entry = entries.setdefault(
+            record['jid'],
+            {'job': None, 'minions': 0, 'returned': set(), 'endtime': None})
+        if 'job' in record:
+            entry['job'] = record['job']
+            entry['minions'] = record.get('minions', 0)
+        if 'ret' in record:
+            entry['returned'].add(record['ret'])
+        if 'rets' in record:
+            entry['returned'].update(record['rets'])
+        if 'endtime' in record:
+            entry['endtime'] = record['endtime']
+    return entries
+
+
+def _index_write(index_dir, segment, records):
+    '''
+    Write a complete index segment
+    '''
+    serial = salt.payload.Serial(__opts__)
+    path = os.path.join(index_dir, '{0}.idx'.format(segment))
+    with salt.utils.atomicfile.atomic_open(path, 'wb') as fp_:
+        for record in records:
+            fp_.write(_index_pack(serial, record))
+
+
+def _index_records(jid, entry):
+    '''
+    Turn an index entry back into the records describing it
+    '''
+    records = [{'jid': jid}]
+    if entry['job'] is not None:
+        records.append({'jid': jid, 'job': entry['job'], 'minions': entry['minions']})
+    for minion in sorted(entry['returned']):
+        records.append({'jid': jid, 'ret': minion})
+    if entry['endtime']:
+        records.append({'jid': jid, 'endtime': entry['endtime']})
+    return records
+
+
+def _index_rebuild():
+    '''
+    Build the job index by walking the job cache, this is needed once when
+    upgrading an existing job cache or if the index was removed
+    '''
+    job_dir = _job_dir()
+    try:
+        if not os.path.isdir(job_dir):
+            os.makedirs(job_dir)
+        tmp_dir = tempfile.mkdtemp(prefix=INDEX_DIR + '-', dir=job_dir)
+    except OSError as exc:
+        log.warning('Could not create the job index: {0}'.format(exc))
+        return
+    log.info('Building the job index in {0}'.format(job_dir))
+    serial = salt.payload.Serial(__opts__)
+    segments = {}
+    for top in os.listdir(job_dir):
+        t_path = os.path.join(job_dir, top)
+        if top.startswith('.') or not os.path.isdir(t_path):
+            continue
+        for final in os.listdir(t_path):
+            f_path = os.path.join(t_path, final)
+            entry = {'job': None, 'minions': 0, 'returned': set(), 'endtime': None}
+            jid = None
+            try:
+                load_path = os.path.join(f_path, LOAD_P)
+                if os.path.isfile(load_path):
+                    with salt.utils.fopen(load_path, 'rb') as fp_:
+                        load = serial.load(fp_)
+                    jid = load.get('jid')
+                    entry['job'] = _index_job(load)
+                    minions_path = os.path.join(f_path, MINIONS_P)
+                    if os.path.isfile(minions_path):
+                        with salt.utils.fopen(minions_path, 'rb') as fp_:
+                            entry['minions'] = len(serial.load(fp_) or [])
+                jid_path = os.path.join(f_path, 'jid')
+                if jid is None and os.path.isfile(jid_path):
+                    with salt.utils.fopen(jid_path, 'rb') as fp_:
+                        jid = salt.utils.to_str(fp_.read().strip())
+                if not jid:
+                    continue
+                for minion in os.listdir(f_path):
+                    if os.path.isfile(os.path.join(f_path, minion, RETURN_P)):
+                        entry['returned'].add(minion)
+                entry['returned'].update(_load_batches(f_path))
+                entry['endtime'] = get_endtime(jid) or None
+            except (IOError, OSError) as exc:
+                log.warning('Skipping {0} while building the job index: {1}'.format(f_path, exc))
+                continue
+            segments.setdefault(_index_segment(jid), {})[jid] = entry
+    for segment, entries in six.iteritems(segments):
+        records = []
+        for jid in sorted(entries):
+            records.extend(_index_records(jid, entries[jid]))
+        _index_write(tmp_dir, segment, records)
+    try:
+        os.rename(tmp_dir, _index_dir())
+    except OSError:
+        # Another process built the index in the meantime
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 #TODO: add to returner docs-- this is a new one
 def prep_jid(nocache=False, passed_jid=None, recurse_count=0):
     '''
@@ -107,6 +366,8 @@ def prep_jid(nocache=False, passed_jid=None, recurse_count=0):
         time.sleep(0.1)
         if passed_jid is None:
             return prep_jid(nocache=nocache, recurse_count=recurse_count+1)
+    else:
+        _index_append(jid)
 
     try:
         with salt.utils.fopen(os.path.join(jid_dir_, 'jid'), 'wb+') as fn_:
@@ -162,6 +423,15 @@ def returner(load):
             return False
         raise
 
+    if __opts__.get('job_cache_batch_returns'):
+        # The minion directory is created right away to detect duplicate
+        # returns, the return data is written with the next batch
+        ret = {'return': load['return']}
+        if 'out' in load:
+            ret['out'] = load['out']
+        _buffer_return(load['jid'], load['id'], ret)
+        return
+
     serial.dump(
         load['return'],
         # Use atomic open here to avoid the file being read before it's
@@ -181,6 +451,102 @@ def returner(load):
             )
         )
 
+    _index_append(load['jid'], ret=load['id'])
+
+
+def _register_flush():
+    '''
+    Flush the buffer when the process exits. The workers are multiprocessing
+    children which stop through SystemExit and end with os._exit, so atexit
+    handlers never run in them, but the multiprocessing finalizers do. A
+    forked child drops the finalizers of its parent, they are registered
+    once per process.
+    '''
+    pid = os.getpid()
+    if pid in _RETURN_BUFFER_FLUSH_PIDS:
+        return
+    _RETURN_BUFFER_FLUSH_PIDS.add(pid)
+    multiprocessing.util.Finalize(None, flush_returns, exitpriority=10)
+
+
+def _buffer_return(jid, minion_id, ret):
+    '''
+    Add a return to the buffer and flush it when it is full, or make sure it
+    is flushed within job_cache_batch_interval seconds
+    '''
+    _register_flush()
+    with _RETURN_BUFFER_LOCK:
+        _RETURN_BUFFER.setdefault(jid, {})[minion_id] = ret
+        pending = sum(len(rets) for rets in six.itervalues(_RETURN_BUFFER))
+        if pending < __opts__.get('job_cache_batch_size', 500):
+            if not _RETURN_BUFFER_TIMER:
+                timer = threading.Timer(
+                    __opts__.get('job_cache_batch_interval', 1.0),
+                    flush_returns)
+                timer.daemon = True
+                timer.start()
+                _RETURN_BUFFER_TIMER.append(timer)
+            return
+    flush_returns()
+
+
+def flush_returns():
+    '''
+    Write the buffered returns, one file per job
+    '''
+    with _RETURN_BUFFER_LOCK:
+        pending = dict(_RETURN_BUFFER)
+        _RETURN_BUFFER.clear()
+        while _RETURN_BUFFER_TIMER:
+            timer = _RETURN_BUFFER_TIMER.pop()
+            if timer is not threading.current_thread():
+                timer.cancel()
+    if not pending:
+        return
+    serial = salt.payload.Serial(__opts__)
+    for jid, rets in six.iteritems(pending):
+        returns_dir = os.path.join(_jid_dir(jid), RETURNS_DIR)
+        try:
+            if not os.path.isdir(returns_dir):
+                os.makedirs(returns_dir)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                log.error(
+                    'Could not write {0} returns for job {1}: {2}'.format(
+                        len(rets), jid, exc))
+                continue
+        batch = '{0}.{1}.p'.format(salt.utils.jid.gen_jid(), os.getpid())
+        try:
+            with salt.utils.atomicfile.atomic_open(
+                    os.path.join(returns_dir, batch), 'w+b') as fp_:
+                serial.dump(rets, fp_)
+        except (IOError, OSError) as exc:
+            log.error(
+                'Could not write {0} returns for job {1}: {2}'.format(
+                    len(rets), jid, exc))
+            continue
+        _index_append(jid, rets=sorted(rets))
+
+
+def _load_batches(jid_dir):
+    '''
+    Return the returns found in the batch files of a job
+    '''
+    serial = salt.payload.Serial(__opts__)
+    returns_dir = os.path.join(jid_dir, RETURNS_DIR)
+    ret = {}
+    if not os.path.isdir(returns_dir):
+        return ret
+    for fn_ in sorted(os.listdir(returns_dir)):
+        if not fn_.endswith('.p'):
+            continue
+        try:
+            with salt.utils.fopen(os.path.join(returns_dir, fn_), 'rb') as fp_:
+                ret.update(serial.load(fp_))
+        except (IOError, OSError):
+            continue
+    return ret
+
 
 def save_load(jid, clear_load, minions=None):
     '''
@@ -232,6 +598,8 @@ def save_load(jid, clear_load, minions=None):
             log.warning('Could not write job cache file for minions: {0}'.format(minions))
             log.debug('Job cache write failure: {0}'.format(exc))
 
+    _index_append(jid, job=_index_job(clear_load), minions=len(minions or []))
+
 
 def get_load(jid):
     '''
@@ -263,9 +631,15 @@ def get_jid(jid):
     # Check to see if the jid is real, if not return the empty dict
     if not os.path.isdir(jid_dir):
         return ret
+    if jid in _RETURN_BUFFER:
+        flush_returns()
+    batches = _load_batches(jid_dir)
     for fn_ in os.listdir(jid_dir):
         if fn_.startswith('.'):
             continue
+        if fn_ in batches:
+            ret[fn_] = batches[fn_]
+            continue
         if fn_ not in ret:
             retp = os.path.join(jid_dir, fn_, RETURN_P)
             outp = os.path.join(jid_dir, fn_, OUT_P)
@@ -290,13 +664,14 @@ def get_jids():
     Return a dict mapping all job ids to job information
     '''
     ret = {}
-    for jid, job, _, _ in _walk_through(_job_dir()):
-        ret[jid] = salt.utils.jid.format_jid_instance(jid, job)
+    for segment in _index_segments():
+        for jid, entry in six.iteritems(_index_read(segment)):
+            if entry['job'] is None:
+                continue
+            ret[jid] = salt.utils.jid.format_jid_instance(jid, entry['job'])
 
-        if __opts__.get('job_cache_store_endtime'):
-            endtime = get_endtime(jid)
-            if endtime:
-                ret[jid]['EndTime'] = endtime
+            if __opts__.get('job_cache_store_endtime') and entry['endtime']:
+                ret[jid]['EndTime'] = entry['endtime']
 
     return ret
 
@@ -307,20 +682,23 @@ def get_jids_filter(count, filter_find_job=True):
     :param int count: show not more than the count of most recent jobs
     :param bool filter_find_jobs: filter out 'saltutil.find_job' jobs
     '''
-    keys = []
     ret = []
-    for jid, job, _, _ in _walk_through(_job_dir()):
-        job = salt.utils.jid.format_jid_instance_ext(jid, job)
-        if filter_find_job and job['Function'] == 'saltutil.find_job':
-            continue
-        i = bisect.bisect(keys, jid)
-        if len(keys) == count and i == 0:
-            continue
-        keys.insert(i, jid)
-        ret.insert(i, job)
-        if len(keys) > count:
-            del keys[0]
-            del ret[0]
+    # Walk the segments from the most recent one and stop as soon as enough
+    # jobs were collected
+    for segment in reversed(_index_segments()):
+        if len(ret) >= count:
+            break
+        entries = _index_read(segment)
+        for jid in sorted(entries, reverse=True):
+            job = entries[jid]['job']
+            if job is None:
+                continue
+            if filter_find_job and job.get('fun') == 'saltutil.find_job':
+                continue
+            ret.append(salt.utils.jid.format_jid_instance_ext(jid, job))
+            if len(ret) >= count:
+                break
+    ret.reverse()
     return ret
 
 
@@ -335,19 +713,54 @@ def clean_old_jobs():
         if not os.path.exists(jid_root):
             return
 
+        # No jid file means corrupted cache entry, scrub it. Those are not
+        # in the index, the directories are checked for the jid file without
+        # reading any job.
         for top in os.listdir(jid_root):
             t_path = os.path.join(jid_root, top)
+            if top.startswith('.') or not os.path.isdir(t_path):
+                continue
             for final in os.listdir(t_path):
                 f_path = os.path.join(t_path, final)
-                jid_file = os.path.join(f_path, 'jid')
-                if not os.path.isfile(jid_file):
-                    # No jid file means corrupted cache entry, scrub it
-                    shutil.rmtree(f_path)
-                else:
-                    jid_ctime = os.stat(jid_file).st_ctime
-                    hours_difference = (cur - jid_ctime) / 3600.0
-                    if hours_difference > __opts__['keep_jobs']:
-                        shutil.rmtree(f_path)
+                if not os.path.isfile(os.path.join(f_path, 'jid')):
+                    shutil.rmtree(f_path, ignore_errors=True)
+
+        cutoff = time.strftime(
+            '%Y%m%d%H%M%S',
+            time.localtime(cur - __opts__['keep_jobs'] * 3600))
+        for segment in _index_segments():
+            if segment != INDEX_UNSORTED and segment > cutoff[:10]:
+                # The segments are ordered, all the remaining ones are recent
+                break
+            with _index_lock(exclusive=True):
+                entries = _index_read(segment)
+                keep = {}
+                for jid, entry in six.iteritems(entries):
+                    jid_dir_ = _jid_dir(jid)
+                    if segment == INDEX_UNSORTED:
+                        jid_file = os.path.join(jid_dir_, 'jid')
+                        try:
+                            expired = (cur - os.stat(jid_file).st_ctime) / 3600.0 > __opts__['keep_jobs']
+                        except OSError:
+                            # The directory was scrubbed above
+                            expired = True
+                    else:
+                        expired = str(jid)[:14] < cutoff
+                    if expired:
+                        shutil.rmtree(jid_dir_, ignore_errors=True)
+                    else:
+                        keep[jid] = entry
+                path = os.path.join(_index_dir(), '{0}.idx'.format(segment))
+                if not keep:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                elif len(keep) < len(entries):
+                    records = []
+                    for jid in sorted(keep):
+                        records.extend(_index_records(jid, keep[jid]))
+                    _index_write(_index_dir(), segment, records)
 
 
 def update_endtime(jid, time):
@@ -364,6 +777,8 @@ def update_endtime(jid, time):
             etfile.write(time)
     except IOError as exc:
         log.warning('Could not write job invocation cache file: {0}'.format(exc))
+        return
+    _index_append(jid, endtime=time)
 
 
 def get_endtime(jid):
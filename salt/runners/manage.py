@@ -21,6 +21,7 @@ from salt.ext.six.moves.urllib.request import urlopen as _urlopen  # pylint: dis
 import salt.key
 import salt.client
 import salt.utils
+import salt.utils.cache
 import salt.utils.minions
 import salt.wheel
 import salt.version
@@ -34,6 +35,9 @@ def status(output=True):
     '''
     Print the status of all known salt minions
 
+    When the :conf_master:`connected_registry` is enabled the connected
+    minions are looked up in it instead of being pinged.
+
     CLI Example:
 
     .. code-block:: bash
@@ -41,12 +45,17 @@ def status(output=True):
         salt-run manage.status
     '''
     ret = {}
-    client = salt.client.get_local_client(__opts__['conf_file'])
-    try:
-        minions = client.cmd('*', 'test.ping', timeout=__opts__['timeout'])
-    except SaltClientError as client_error:
-        print(client_error)
-        return ret
+    minions = None
+    registry = salt.utils.cache.get_connected_registry(__opts__)
+    if registry:
+        minions = registry.connected()
+    if minions is None:
+        client = salt.client.get_local_client(__opts__['conf_file'])
+        try:
+            minions = client.cmd('*', 'test.ping', timeout=__opts__['timeout'])
+        except SaltClientError as client_error:
+            print(client_error)
+            return ret
 
     key = salt.key.Key(__opts__)
     keys = key.list_keys()
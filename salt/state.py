@@ -23,6 +23,8 @@ import logging
 import datetime
 import traceback
 import re
+import select
+import multiprocessing
 
 # Import salt libs
 import salt.utils
@@ -30,7 +32,9 @@ import salt.loader
 import salt.minion
 import salt.pillar
 import salt.fileclient
+import salt.payload
 import salt.utils.event
+import salt.utils.process
 import salt.utils.url
 import salt.syspaths as syspaths
 from salt.utils import immutabletypes
@@ -110,6 +114,14 @@ STATE_INTERNAL_KEYWORDS = STATE_REQUISITE_KEYWORDS.union(STATE_REQUISITE_IN_KEYW
 
 VALID_PILLAR_ENC = ('gpg',)
 
+# The state modules whose states call_chunks_parallel calls from the process
+# running the states, one at a time. They take a system wide lock, and the
+# __context__ of their execution modules has to see the changes they make.
+STATE_WORKERS_SERIAL = frozenset([
+    'pkg',
+    'pkgrepo',
+    ])
+
 
 def _odict_hashable(self):
     return id(self)
@@ -155,6 +167,28 @@ def trim_req(req):
     return req
 
 
+def _find_req_chunks(req, chunks):
+    '''
+    Return the chunks matched by a trimmed requisite
+    '''
+    found = []
+    req_key = next(iter(req))
+    req_val = req[req_key]
+    if req_val is None:
+        return found
+    for chunk in chunks:
+        if req_key == 'sls':
+            # Allow requisite tracking of entire sls files
+            if fnmatch.fnmatch(chunk['__sls__'], req_val):
+                found.append(chunk)
+            continue
+        if (fnmatch.fnmatch(chunk['name'], req_val) or
+            fnmatch.fnmatch(chunk['__id__'], req_val)):
+            if req_key == 'id' or chunk['state'] == req_key:
+                found.append(chunk)
+    return found
+
+
 def state_args(id_, state, high):
     '''
     Return a set of the arguments passed to the named state
@@ -646,6 +680,10 @@ class State(object):
         self.active = set()
         self.mod_init = set()
         self.pre = {}
+        # The (id, state) of the chunks whose order was not declared
+        self.implicit_order = set()
+        # Set in the worker processes of call_chunks_parallel
+        self.in_worker = False
         self.__run_num = 0
         self.jid = jid
         self.instance_id = str(id(self))
@@ -869,6 +907,9 @@ class State(object):
         possible module type, e.g. a python, pyx, or .so. Always refresh if the
         function is recurse, since that can lay down anything.
         '''
+        if self.in_worker:
+            # The parent process refreshes once it gets the return
+            return
         _reload_modules = False
         if data.get('reload_grains', False):
             log.debug('Refreshing grains...')
@@ -1189,6 +1230,7 @@ class State(object):
                     cap = chunk_order + 100
         for chunk in chunks:
             if 'order' not in chunk:
+                self.implicit_order.add((chunk['__id__'], chunk['state']))
                 chunk['order'] = cap
                 continue
 
@@ -1738,6 +1780,9 @@ class State(object):
         '''
         Iterate over a list of chunks and call them, checking for requires.
         '''
+        workers = self.opts.get('state_workers', 1)
+        if workers > 1 and not salt.utils.is_windows():
+            return self.call_chunks_parallel(chunks, workers)
         running = {}
         for low in chunks:
             if '__FAILHARD__' in running:
@@ -1751,6 +1796,165 @@ class State(object):
             self.active = set()
         return running
 
+    def call_chunks_parallel(self, chunks, workers):
+        '''
+        Call the chunks from up to ``workers`` processes forked from this one.
+        A chunk starts once the chunks it requires, watches or has onfail or
+        onchanges on are done, once the chunks with a declared order before it
+        are done, and, if its own order was declared, once the chunks with a
+        lower order are done. The chunks using prereq or aggregation, the
+        chunks of the state modules in STATE_WORKERS_SERIAL, and the chunks
+        whose requisites are not met or not found, are called from this
+        process with call_chunk while no worker runs.
+        '''
+        running = {}
+        deps = self._chunk_deps(chunks)
+        agg_opt = self.functions['config.option']('state_aggregate')
+        serial = salt.payload.Serial(self.opts)
+        pending = list(chunks)
+        procs = {}
+        failhard = False
+        while True:
+            started = False
+            for low in list(pending):
+                if failhard:
+                    break
+                tag = _gen_tag(low)
+                if tag in running:
+                    pending.remove(low)
+                    continue
+                if deps[tag].difference(running):
+                    continue
+                if len(procs) >= workers:
+                    break
+                status = None
+                if ('prereq' not in low and 'prerequired' not in low
+                        and low.get('aggregate', agg_opt) is not True
+                        and low['state'] not in STATE_WORKERS_SERIAL):
+                    self._mod_init(low)
+                    status, reqs = self.check_requisite(low, running, chunks)
+                if status in ('met', 'change'):
+                    pending.remove(low)
+                    procs[tag] = self._start_chunk_worker(
+                        low, status, reqs, chunks, running) + (low,)
+                    started = True
+                    continue
+                if status is None or status == 'unmet':
+                    if procs:
+                        # Wait for the workers to be done with their chunks
+                        break
+                pending.remove(low)
+                running = self.call_chunk(low, running, chunks)
+                self.active = set()
+                started = True
+                if running.pop('__FAILHARD__', False) or \
+                        self.check_failhard(low, running):
+                    failhard = True
+            if not procs:
+                if failhard or not pending:
+                    break
+                if not started:
+                    # The remaining chunks wait for each other, call the
+                    # first one as call_chunks would
+                    low = pending.pop(0)
+                    running = self.call_chunk(low, running, chunks)
+                    self.active = set()
+                    if running.pop('__FAILHARD__', False) or \
+                            self.check_failhard(low, running):
+                        break
+                continue
+            fds = dict((procs[tag][1].fileno(), tag) for tag in procs)
+            try:
+                ready = select.select(list(fds), [], [])[0]
+            except select.error:
+                # Interrupted by a signal
+                continue
+            for fd_ in ready:
+                tag = fds[fd_]
+                proc, conn, low = procs.pop(tag)
+                try:
+                    ret = serial.loads(conn.recv_bytes())
+                except EOFError:
+                    ret = {'name': low['name'],
+                           'result': False,
+                           'changes': {},
+                           'comment': 'The process calling this state '
+                                      'exited unexpectedly'}
+                conn.close()
+                proc.join()
+                ret['__run_num__'] = self.__run_num
+                self.__run_num += 1
+                running[tag] = ret
+                self.check_refresh(low, ret)
+                self.event(ret, len(chunks), fire_event=low.get('fire_event'))
+                if self.check_failhard(low, running):
+                    failhard = True
+        return running
+
+    def _chunk_deps(self, chunks):
+        '''
+        Return the tags of the chunks each chunk has to wait for in
+        call_chunks_parallel, by the tag of the chunk
+        '''
+        ret = {}
+        last_ordered = None
+        for ind, low in enumerate(chunks):
+            tag = _gen_tag(low)
+            deps = set()
+            for r_state in ('require', 'watch', 'onfail', 'onchanges'):
+                for req in low.get(r_state) or []:
+                    if isinstance(req, six.string_types):
+                        req = {'id': req}
+                    for chunk in _find_req_chunks(trim_req(req), chunks):
+                        deps.add(_gen_tag(chunk))
+            if last_ordered is not None:
+                deps.add(last_ordered)
+            if 'order' in low and \
+                    (low['__id__'], low['state']) not in self.implicit_order:
+                order = int(low['order'])
+                for chunk in chunks[:ind]:
+                    if int(chunk.get('order', 0)) < order:
+                        deps.add(_gen_tag(chunk))
+                last_ordered = tag
+            deps.discard(tag)
+            ret[tag] = deps
+        return ret
+
+    def _start_chunk_worker(self, low, status, reqs, chunks, running):
+        '''
+        Fork a process calling the chunk, return the process and the end of
+        the pipe its return is read from
+        '''
+        rconn, wconn = multiprocessing.Pipe(duplex=False)
+        proc = salt.utils.process.MultiprocessingProcess(
+            target=self._call_chunk_worker,
+            args=(low, status, reqs, chunks, running, wconn))
+        proc.start()
+        wconn.close()
+        return proc, rconn
+
+    def _call_chunk_worker(self, low, status, reqs, chunks, running, conn):
+        '''
+        Call a chunk in a worker process of call_chunks_parallel and send the
+        return to the parent process
+        '''
+        self.in_worker = True
+        if status == 'change':
+            ret = self._call_watch(low, reqs, chunks, running)
+        else:
+            ret = self.call(low, chunks, running)
+        serial = salt.payload.Serial(self.opts)
+        try:
+            data = serial.dumps(ret)
+        except Exception as exc:
+            data = serial.dumps({'name': low['name'],
+                                 'result': False,
+                                 'changes': {},
+                                 'comment': 'Unable to serialize the return '
+                                            'of this state: {0}'.format(exc)})
+        conn.send_bytes(data)
+        conn.close()
+
     def check_failhard(self, low, running):
         '''
         Check if the low data chunk should send a failhard signal
@@ -1801,26 +2005,10 @@ class State(object):
                 for req in low[r_state]:
                     if isinstance(req, six.string_types):
                         req = {'id': req}
-                    req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                found = True
-                                reqs[r_state].append(chunk)
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if req_key == 'id' or chunk['state'] == req_key:
-                                found = True
-                                reqs[r_state].append(chunk)
+                    found = _find_req_chunks(trim_req(req), chunks)
                     if not found:
                         return 'unmet', ()
+                    reqs[r_state].extend(found)
         fun_stats = set()
         for r_state, chunks in six.iteritems(reqs):
             if r_state == 'prereq':
@@ -2066,14 +2254,7 @@ class State(object):
                 }
             self.__run_num += 1
         elif status == 'change' and not low.get('__prereq__'):
-            ret = self.call(low, chunks, running)
-            if not ret['changes'] and not ret.get('skip_watch', False):
-                low = low.copy()
-                low['sfun'] = low['fun']
-                low['fun'] = 'mod_watch'
-                low['__reqs__'] = reqs
-                ret = self.call(low, chunks, running)
-            running[tag] = ret
+            running[tag] = self._call_watch(low, reqs, chunks, running)
         elif status == 'pre':
             pre_ret = {'changes': {},
                        'result': True,
@@ -2106,6 +2287,20 @@ class State(object):
             self.event(running[tag], len(chunks), fire_event=low.get('fire_event'))
         return running
 
+    def _call_watch(self, low, reqs, chunks, running):
+        '''
+        Call a chunk whose watched requisites made changes, and its mod_watch
+        function if the call itself made none
+        '''
+        ret = self.call(low, chunks, running)
+        if not ret['changes'] and not ret.get('skip_watch', False):
+            low = low.copy()
+            low['sfun'] = low['fun']
+            low['fun'] = 'mod_watch'
+            low['__reqs__'] = reqs
+            ret = self.call(low, chunks, running)
+        return ret
+
     def call_listen(self, chunks, running):
         '''
         Find all of the listen routines and call the associated mod_watch runs
@@ -2910,6 +3105,9 @@ class BaseHighState(object):
                                 {'order': self.iorder}
                                 )
                         self.iorder += 1
+                        self.state.implicit_order.add(
+                                (name, s_dec.split('.')[0])
+                                )
         return state
 
     def _handle_state_decls(self, state, sls, saltenv, errors):
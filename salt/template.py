@@ -13,6 +13,7 @@ import logging
 
 # Import salt libs
 import salt.utils
+import salt.utils.args
 from salt.utils.odict import OrderedDict
 from salt._compat import string_io
 from salt.ext.six import string_types
@@ -33,10 +34,14 @@ def compile_template(template,
                      saltenv='base',
                      sls='',
                      input_data='',
+                     jinja_cache=None,
                      **kwargs):
     '''
     Take the path to a template and return the high data structure
     derived from the template.
+
+    The jinja_cache dict is passed to the renderers accepting it, to keep
+    the compiled templates of the files rendered again.
     '''
 
     # if any error occurs, we return an empty dictionary
@@ -91,6 +96,9 @@ def compile_template(template,
         render_kwargs.update(kwargs)
         if argline:
             render_kwargs['argline'] = argline
+        if jinja_cache is not None and 'jinja_cache' in \
+                salt.utils.args.get_function_argspec(render).args:
+            render_kwargs['jinja_cache'] = jinja_cache
         start = time.time()
         ret = render(input_data, saltenv, sls, **render_kwargs)
         log.profile(
@@ -18,3 +18,20 @@ def frame_msg(body, header=None, raw_body=False):
     framed_msg['head'] = header
     framed_msg['body'] = body
     return msgpack.dumps(framed_msg)
+
+
+# The size tornado breaks the data written to an IOStream into
+WRITE_CHUNK_SIZE = 128 * 1024
+
+
+def chunk_frame(framed_msg, chunk_size=WRITE_CHUNK_SIZE):
+    '''
+    Split a framed message into the chunks an IOStream buffers it as.
+
+    Writing these chunks to several streams makes all of them buffer the same
+    objects instead of slicing a copy of the message for each stream.
+    '''
+    if len(framed_msg) <= chunk_size:
+        return [framed_msg]
+    return [framed_msg[idx:idx + chunk_size]
+            for idx in range(0, len(framed_msg), chunk_size)]
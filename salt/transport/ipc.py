@@ -5,6 +5,8 @@ IPC transport classes
 
 # Import Python libs
 from __future__ import absolute_import
+import collections
+import fnmatch
 import logging
 import socket
 import msgpack
@@ -25,6 +27,29 @@ import salt.transport.frame
 
 log = logging.getLogger(__name__)
 
+# The ways a subscriber can match the tags it asks an IPCMessagePublisher for
+SUBSCRIPTION_MATCH_TYPES = ('startswith', 'fnmatch')
+
+# What an IPCMessagePublisher does when a subscriber's queue is full
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'disconnect')
+
+# How often, in seconds, an IPCMessagePublisher reports the overflows
+OVERFLOW_REPORT_INTERVAL = 1
+
+
+def match_subscription(tag, filters):
+    '''
+    Return True if the tag matches one of a subscriber's filters, a list of
+    ``[match_type, search_tag]`` pairs
+    '''
+    for match_type, search_tag in filters:
+        if match_type == 'fnmatch':
+            if fnmatch.fnmatch(tag, search_tag):
+                return True
+        elif tag.startswith(search_tag):
+            return True
+    return False
+
 
 # 'tornado.concurrent.Future' doesn't support
 # remove_done_callback() which we would have called
@@ -310,6 +335,7 @@ class IPCClient(object):
             try:
                 log.trace('IPCClient: Connecting to socket: {0}'.format(self.socket_path))
                 yield self.stream.connect(sock_addr)
+                self._handle_connect()
                 self._connecting_future.set_result(True)
                 break
             except Exception as e:
@@ -325,6 +351,12 @@ class IPCClient(object):
 
                 yield tornado.gen.sleep(1)
 
+    def _handle_connect(self):
+        '''
+        Override this to write anything the server needs first on a new
+        connection
+        '''
+
     def __del__(self):
         self.close()
 
@@ -430,8 +462,19 @@ class IPCMessagePublisher(object):
     '''
     A Tornado IPC Publisher similar to Tornado's TCPServer class
     but using either UNIX domain sockets or TCP sockets
+
+    A subscriber may send the publisher a list of tag filters, in which case
+    only the messages published with a matching tag are written to it. The
+    publisher counts the messages delivered to and dropped for each
+    subscriber, see stats().
+
+    The messages waiting to be written to a subscriber are queued, and once
+    the queue holds max_queue_size bytes the overflow_policy is applied to
+    it. The overflows are passed to the overflow_handler at most once every
+    OVERFLOW_REPORT_INTERVAL seconds.
     '''
-    def __init__(self, socket_path, io_loop=None):
+    def __init__(self, socket_path, io_loop=None, max_queue_size=0,
+                 overflow_policy='drop_oldest', overflow_handler=None):
         '''
         Create a new Tornado IPC server
         :param str/int socket_path: Path on the filesystem for the
@@ -443,6 +486,11 @@ class IPCMessagePublisher(object):
                                     which case it is used as the port
                                     for a tcp localhost connection.
         :param IOLoop io_loop: A Tornado ioloop to handle scheduling
+        :param int max_queue_size: The size in bytes of the messages queued
+                                   for a subscriber, 0 for no limit
+        :param str overflow_policy: One of OVERFLOW_POLICIES
+        :param func overflow_handler: A function passed a list of the
+                                      overflowed subscribers
         '''
         self.socket_path = socket_path
         self._started = False
@@ -452,6 +500,21 @@ class IPCMessagePublisher(object):
         self.io_loop = io_loop or IOLoop.current()
         self._closing = False
         self.streams = set()
+        self.subscriptions = {}
+        self._subscriber_id = 0
+
+        self.max_queue_size = max_queue_size
+        if overflow_policy not in OVERFLOW_POLICIES:
+            log.error(
+                'Invalid IPC overflow policy \'{0}\', using \'drop_oldest\''.format(
+                    overflow_policy))
+            overflow_policy = 'drop_oldest'
+        self.overflow_policy = overflow_policy
+        self.overflow_handler = overflow_handler
+        self.queues = {}
+        self._writing = set()
+        self._overflows = {}
+        self._overflow_timeout = None
 
     def start(self):
         '''
@@ -479,29 +542,173 @@ class IPCMessagePublisher(object):
         self._started = True
 
     @tornado.gen.coroutine
-    def _write(self, stream, pack):
+    def _write(self, stream):
+        '''
+        Write the queued messages to the stream, until its queue is empty
+        '''
+        queue = self.queues.get(stream)
+        sub = self.subscriptions.get(stream)
+        if queue is None or stream in self._writing:
+            return
+        self._writing.add(stream)
         try:
-            yield stream.write(pack)
+            while queue:
+                # Hand everything queued to the stream at once, and only
+                # queue again while that is being written
+                while queue:
+                    pack = queue.popleft()
+                    sub['queued'] -= len(pack)
+                    sub['delivered'] += 1
+                    future = stream.write(pack)
+                yield future
         except tornado.iostream.StreamClosedError:
             log.trace('Client disconnected from IPC {0}'.format(self.socket_path))
-            self.streams.discard(stream)
+            self._remove_stream(stream)
         except Exception as exc:
             log.error('Exception occurred while handling stream: {0}'.format(exc))
             if not stream.closed():
                 stream.close()
-            self.streams.discard(stream)
+            self._remove_stream(stream)
+        finally:
+            self._writing.discard(stream)
+
+    def _queue(self, stream, pack):
+        '''
+        Queue a message for the stream, applying the overflow policy if its
+        queue is full. A message is always queued if the queue is empty.
+        '''
+        queue = self.queues[stream]
+        sub = self.subscriptions[stream]
+        size = len(pack)
+        if self.max_queue_size and queue \
+                and sub['queued'] + size > self.max_queue_size:
+            if self.overflow_policy == 'disconnect':
+                self._overflow(sub, len(queue) + 1, disconnected=True)
+                stream.close()
+                self._remove_stream(stream)
+                return
+            if self.overflow_policy == 'drop_newest':
+                self._overflow(sub, 1)
+                return
+            dropped = 0
+            while queue and sub['queued'] + size > self.max_queue_size:
+                sub['queued'] -= len(queue.popleft())
+                dropped += 1
+            self._overflow(sub, dropped)
+        queue.append(pack)
+        sub['queued'] += size
+        if stream not in self._writing:
+            self.io_loop.spawn_callback(self._write, stream)
+
+    def _overflow(self, sub, count, disconnected=False):
+        '''
+        Count the messages lost by a subscriber, to report them shortly
+        '''
+        sub['overflowed'] += count
+        report = self._overflows.setdefault(
+            sub['id'], {'id': sub['id'], 'overflowed': 0, 'disconnected': False})
+        report['overflowed'] += count
+        report['disconnected'] = report['disconnected'] or disconnected
+        if self._overflow_timeout is None:
+            self._overflow_timeout = self.io_loop.call_later(
+                OVERFLOW_REPORT_INTERVAL, self._report_overflows)
+
+    def _report_overflows(self):
+        self._overflow_timeout = None
+        overflows = sorted(self._overflows.values(), key=lambda x: x['id'])
+        self._overflows = {}
+        for report in overflows:
+            log.warning(
+                'IPC subscriber {0} on {1} fell behind, {2} messages were '
+                'lost{3}'.format(
+                    report['id'], self.socket_path, report['overflowed'],
+                    ' and it was disconnected' if report['disconnected'] else ''))
+        if self.overflow_handler is not None:
+            try:
+                self.overflow_handler(overflows)
+            except Exception as exc:
+                log.error('Exception occurred while reporting IPC overflows: {0}'.format(exc))
 
-    def publish(self, msg):
+    @tornado.gen.coroutine
+    def _read_subscriptions(self, stream):
+        '''
+        Read the tag filters a subscriber sends, until it disconnects
+        '''
+        unpacker = msgpack.Unpacker()
+        while not stream.closed():
+            try:
+                wire_bytes = yield stream.read_bytes(4096, partial=True)
+                unpacker.feed(wire_bytes)
+                for framed_msg in unpacker:
+                    body = framed_msg['body']
+                    if isinstance(body, dict) and 'subscribe' in body:
+                        self.subscribe(stream, body['subscribe'])
+            except tornado.iostream.StreamClosedError:
+                log.trace('Client disconnected from IPC {0}'.format(self.socket_path))
+                break
+            except Exception as exc:
+                log.error('Exception occurred while reading subscriptions: {0}'.format(exc))
+                if not stream.closed():
+                    stream.close()
+                break
+        self._remove_stream(stream)
+
+    def _remove_stream(self, stream):
+        self.streams.discard(stream)
+        self.queues.pop(stream, None)
+        sub = self.subscriptions.pop(stream, None)
+        if sub is not None:
+            log.debug(
+                'IPC subscriber {0} on {1} disconnected, {2} messages '
+                'delivered, {3} dropped and {4} overflowed'.format(
+                    sub['id'], self.socket_path, sub['delivered'],
+                    sub['dropped'], sub['overflowed']))
+
+    def subscribe(self, stream, filters):
+        '''
+        Only publish the messages whose tag matches one of the filters to the
+        stream. Pass None to publish everything to it again.
+        '''
+        sub = self.subscriptions.get(stream)
+        if sub is None:
+            return
+        if filters is not None:
+            filters = [(match_type, search_tag)
+                       for match_type, search_tag in filters
+                       if match_type in SUBSCRIPTION_MATCH_TYPES]
+        log.debug('IPC subscriber {0} on {1} subscribed to {2}'.format(
+            sub['id'], self.socket_path, filters))
+        sub['filters'] = filters
+
+    def stats(self):
+        '''
+        Return the filters and the counts of delivered, dropped and
+        overflowed messages of each connected subscriber, and the size of the
+        messages queued for it
+        '''
+        return [dict(sub) for sub in self.subscriptions.values()]
+
+    def publish(self, msg, tag=None):
         '''
         Send message to all connected sockets
+
+        If a tag is passed the message is only sent to the subscribers which
+        have no filters or a filter matching it.
         '''
         if not len(self.streams):
             return
 
-        pack = salt.transport.frame.frame_msg(msg, raw_body=True)
-
-        for stream in self.streams:
-            self.io_loop.spawn_callback(self._write, stream, pack)
+        pack = None
+        # The disconnect overflow policy removes streams
+        for stream in list(self.streams):
+            sub = self.subscriptions[stream]
+            if tag is not None and sub['filters'] is not None \
+                    and not match_subscription(tag, sub['filters']):
+                sub['dropped'] += 1
+                continue
+            if pack is None:
+                pack = salt.transport.frame.frame_msg(msg, raw_body=True)
+            self._queue(stream, pack)
 
     def handle_connection(self, connection, address):
         log.trace('IPCServer: Handling connection to address: {0}'.format(address))
@@ -510,7 +717,16 @@ class IPCMessagePublisher(object):
                 connection,
                 io_loop=self.io_loop,
             )
+            self._subscriber_id += 1
+            self.subscriptions[stream] = {'id': self._subscriber_id,
+                                          'filters': None,
+                                          'delivered': 0,
+                                          'dropped': 0,
+                                          'overflowed': 0,
+                                          'queued': 0}
+            self.queues[stream] = collections.deque()
             self.streams.add(stream)
+            self.io_loop.spawn_callback(self._read_subscriptions, stream)
         except Exception as exc:
             log.error('IPC streaming error: {0}'.format(exc))
 
@@ -526,6 +742,11 @@ class IPCMessagePublisher(object):
         for stream in self.streams:
             stream.close()
         self.streams.clear()
+        self.subscriptions.clear()
+        self.queues.clear()
+        if self._overflow_timeout is not None:
+            self.io_loop.remove_timeout(self._overflow_timeout)
+            self._overflow_timeout = None
         if hasattr(self.sock, 'close'):
             self.sock.close()
 
@@ -573,6 +794,30 @@ class IPCMessageSubscriber(IPCClient):
         self._read_stream_future = None
         self._sync_ioloop_running = False
         self.saved_data = []
+        self.filters = None
+
+    def subscribe(self, filters):
+        '''
+        Ask the publisher to only send the messages whose tag matches one of
+        the filters, a list of ``[match_type, search_tag]`` pairs. Pass None
+        to receive every message again.
+
+        The filters are sent again whenever the subscriber reconnects.
+        '''
+        self.filters = filters
+        if self.connected():
+            self._send_filters()
+
+    def _send_filters(self):
+        pack = salt.transport.frame.frame_msg({'subscribe': self.filters},
+                                              raw_body=True)
+        future = self.stream.write(pack)
+        # Losing the connection is handled by the reads
+        future.add_done_callback(lambda future: future.exception())
+
+    def _handle_connect(self):
+        if self.filters is not None:
+            self._send_filters()
 
     @tornado.gen.coroutine
     def _read_sync(self, timeout):
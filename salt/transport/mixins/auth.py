@@ -9,23 +9,61 @@ import os
 import hashlib
 import shutil
 import binascii
+import time
 
 # Import Salt Libs
 import salt.crypt
 import salt.payload
 import salt.master
 import salt.utils.event
+import salt.utils.cache
 from salt.utils.cache import CacheCli
 
 # Import Third Party Libs
 import tornado.gen
 from Crypto.Cipher import PKCS1_OAEP
-from Crypto.PublicKey import RSA
 
 
 log = logging.getLogger(__name__)
 
 
+class TokenBucket(object):
+    '''
+    A token bucket shared by the processes forked after it was created, which
+    lets requests through at a given rate
+
+    The requests turned away are counted in a backlog, drained at the same
+    rate, which tells them how long to wait so that they come back at the
+    rate the bucket lets them through.
+    '''
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        # tokens, time of the last update and backlog
+        self.state = multiprocessing.Array(
+            ctypes.c_double, [self.burst, time.time(), 0.0])
+
+    def acquire(self):
+        '''
+        Take a token. Return 0 if there was one, or else the number of
+        seconds to wait before coming back.
+        '''
+        with self.state.get_lock():
+            tokens, stamp, backlog = self.state[:]
+            now = time.time()
+            refill = max(now - stamp, 0) * self.rate
+            tokens = min(self.burst, tokens + refill)
+            backlog = max(backlog - refill, 0.0)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                backlog += 1
+                wait = backlog / self.rate
+            self.state[:] = [tokens, now, backlog]
+        return wait
+
+
 # TODO: rename
 class AESPubClientMixin(object):
     def _verify_master_signature(self, payload):
@@ -55,6 +93,8 @@ class AESReqServerMixin(object):
     '''
     Mixin to house all of the master-side auth crypto
     '''
+    # Limits the rate of the authentication requests across the workers
+    auth_bucket = None
 
     def pre_fork(self, _):
         '''
@@ -64,6 +104,9 @@ class AESReqServerMixin(object):
                                                             salt.crypt.Crypticle.generate_key_string()),
                                               'reload': salt.crypt.Crypticle.generate_key_string,
                                               }
+        if self.opts.get('auth_rate_limit'):
+            self.auth_bucket = TokenBucket(self.opts['auth_rate_limit'],
+                                           self.opts.get('auth_rate_burst'))
 
     def post_fork(self, _, __):
         self.serial = salt.payload.Serial(self.opts)
@@ -82,25 +125,34 @@ class AESReqServerMixin(object):
             # Make an minion checker object
             self.ckminions = salt.utils.minions.CkMinions(self.opts)
 
+        # The TCP publisher registers the minions itself, the ZeroMQ
+        # publisher can not tell which minions are connected
+        if self.opts.get('transport', 'zeromq') == 'zeromq':
+            self.registry = salt.utils.cache.get_connected_registry(self.opts)
+        else:
+            self.registry = None
+
         self.master_key = salt.crypt.MasterKeys(self.opts)
+        self.minion_keys = salt.crypt.MinionKeyCache(self.opts)
+        # The signature of the shared AES key is the same for all of the
+        # minions, keep the last one instead of signing it for each of them
+        self._aes_sig = (None, None)
 
     def _encrypt_private(self, ret, dictkey, target):
         '''
         The server equivalent of ReqChannel.crypted_transfer_decode_dictentry
         '''
         # encrypt with a specific AES key
-        pubfn = os.path.join(self.opts['pki_dir'],
-                             'minions',
-                             target)
         key = salt.crypt.Crypticle.generate_key_string()
         pcrypt = salt.crypt.Crypticle(
             self.opts,
             key)
         try:
-            with salt.utils.fopen(pubfn) as f:
-                pub = RSA.importKey(f.read())
+            pub = self.minion_keys.get(target)
         except (ValueError, IndexError, TypeError):
             return self.crypticle.dumps({})
+        if pub is None:
+            return self.crypticle.dumps({})
 
         pret = {}
         cipher = PKCS1_OAEP.new(pub)
@@ -153,6 +205,18 @@ class AESReqServerMixin(object):
                 )
             return {'enc': 'clear',
                     'load': {'ret': False}}
+
+        # Turn the minion away if the master is already authenticating as
+        # many minions as it is allowed to, and tell it when to try again
+        if self.auth_bucket is not None:
+            retry_after = self.auth_bucket.acquire()
+            if retry_after:
+                log.debug(
+                    'Authentication request from {0} postponed for {1:.1f} '
+                    'seconds'.format(load['id'], retry_after))
+                return {'enc': 'clear',
+                        'load': {'ret': 'busy',
+                                 'retry_after': retry_after}}
         log.info('Authentication request from {id}'.format(**load))
 
         # 0 is default which should be 'unlimited'
@@ -389,15 +453,21 @@ class AESReqServerMixin(object):
         if self.cache_cli:
             self.cache_cli.put_cache([load['id']])
 
+        if self.registry:
+            self.registry.connect(load['id'])
+
         # The key payload may sometimes be corrupt when using auto-accept
         # and an empty request comes in
         try:
-            with salt.utils.fopen(pubfn) as f:
-                pub = RSA.importKey(f.read())
+            pub = self.minion_keys.get(load['id'])
         except (ValueError, IndexError, TypeError) as err:
             log.error('Corrupt public key "{0}": {1}'.format(pubfn, err))
             return {'enc': 'clear',
                     'load': {'ret': False}}
+        if pub is None:
+            log.error('Public key "{0}" is missing'.format(pubfn))
+            return {'enc': 'clear',
+                    'load': {'ret': False}}
 
         cipher = PKCS1_OAEP.new(pub)
         ret = {'enc': 'pub',
@@ -447,8 +517,13 @@ class AESReqServerMixin(object):
             aes = salt.master.SMaster.secrets['aes']['secret'].value
             ret['aes'] = cipher.encrypt(salt.master.SMaster.secrets['aes']['secret'].value)
         # Be aggressive about the signature
-        digest = hashlib.sha256(aes).hexdigest()
-        ret['sig'] = salt.crypt.private_encrypt(self.master_key.key, digest)
+        if self._aes_sig[0] == aes:
+            ret['sig'] = self._aes_sig[1]
+        else:
+            digest = hashlib.sha256(aes).hexdigest()
+            ret['sig'] = salt.crypt.private_encrypt(self.master_key.key, digest)
+            if aes == salt.master.SMaster.secrets['aes']['secret'].value:
+                self._aes_sig = (aes, ret['sig'])
         eload = {'result': True,
                  'act': 'accept',
                  'id': load['id'],
@@ -59,6 +59,14 @@ class ReqServerChannel(object):
         '''
         pass
 
+    def auth_channel(self):
+        '''
+        Return a channel for the workers dedicated to the minion
+        authentication requests, or None if the transport can not hand these
+        requests to separate workers
+        '''
+        return None
+
 
 class PubServerChannel(object):
     '''
@@ -100,9 +108,14 @@ class PubServerChannel(object):
         '''
         pass
 
-    def publish(self, load):
+    def publish(self, load, minions=None):
         '''
         Publish "load" to minions
+
+        :param dict load: A load to be sent across the wire to minions
+        :param list minions: The minions the master resolved the target to,
+                             publishers may use it to only send the load to
+                             those minions
         '''
         raise NotImplementedError()
 
@@ -8,6 +8,7 @@ Wire protocol: "len(payload) msgpack({'head': SOMEHEADER, 'body': SOMEBODY})"
 
 # Import Python Libs
 from __future__ import absolute_import
+import binascii
 import logging
 import msgpack
 import socket
@@ -20,6 +21,7 @@ import urlparse  # TODO: remove
 # Import Salt Libs
 import salt.crypt
 import salt.utils
+import salt.utils.cache
 import salt.utils.verify
 import salt.utils.event
 import salt.utils.async
@@ -45,6 +47,10 @@ from Crypto.Cipher import PKCS1_OAEP
 
 log = logging.getLogger(__name__)
 
+# The target types matched against the minion ids only, publications with these
+# target types are only sent to the targeted minions
+TARGETED_TGT_TYPES = ('list', 'glob', 'pcre')
+
 
 def _set_tcp_keepalive(sock, opts):
     '''
@@ -279,7 +285,8 @@ class AsyncTCPPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.tran
                 self.opts,
                 self.opts['master_ip'],
                 int(self.auth.creds['publish_port']),
-                io_loop=self.io_loop)
+                io_loop=self.io_loop,
+                connect_callback=self._handshake)
             yield self.message_client.connect()  # wait for the client to be connected
             self.connected = True
         # TODO: better exception handling...
@@ -288,6 +295,27 @@ class AsyncTCPPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.tran
         except:
             raise SaltClientError('Unable to sign_in to master')  # TODO: better error message
 
+    @tornado.gen.coroutine
+    def _handshake(self):
+        '''
+        Tell the publisher which minion is on this end of the connection, by
+        signing the challenge it sends with the minion key
+        '''
+        try:
+            ret = yield self.message_client.send({'cmd': 'hello'}, timeout=60)
+            if not isinstance(ret, dict) or 'nonce' not in ret:
+                return
+            sig = salt.crypt.sign_message(
+                os.path.join(self.opts['pki_dir'], 'minion.pem'), ret['nonce'])
+            ret = yield self.message_client.send(
+                {'cmd': 'verify', 'id': self.opts['id'], 'sig': sig},
+                timeout=60)
+            if not isinstance(ret, dict) or not ret.get('ret'):
+                log.warning('The master publisher could not verify this minion')
+        except Exception as exc:
+            # Older masters do not answer the handshake
+            log.debug('Publisher handshake failed: {0}'.format(exc))
+
     def on_recv(self, callback):
         '''
         Register an on_recv callback
@@ -486,9 +514,12 @@ class SaltMessageClient(object):
     '''
     Low-level message sending client
     '''
-    def __init__(self, opts, host, port, io_loop=None, resolver=None):
+    def __init__(self, opts, host, port, io_loop=None, resolver=None,
+                 connect_callback=None):
         self.host = host
         self.port = port
+        # called every time the connection is (re)established
+        self.connect_callback = connect_callback
 
         self.io_loop = io_loop or tornado.ioloop.IOLoop.current()
 
@@ -560,6 +591,8 @@ class SaltMessageClient(object):
             try:
                 self._stream = yield self._tcp_client.connect(self.host, self.port)
                 self._connecting_future.set_result(True)
+                if self.connect_callback is not None:
+                    self.io_loop.spawn_callback(self.connect_callback)
                 break
             except Exception as e:
                 yield tornado.gen.sleep(1)  # TODO: backoff
@@ -693,38 +726,167 @@ class SaltMessageClient(object):
         return future
 
 
+class Subscriber(object):
+    '''
+    Client object for use with the TCP publisher server
+    '''
+    def __init__(self, stream, address):
+        self.stream = stream
+        self.address = address
+        self._closing = False
+        self._read_until_future = None
+        # the minion id, once the minion proved who it is
+        self.id_ = None
+        # the challenge sent to the minion during the handshake
+        self.nonce = None
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        if not self.stream.closed():
+            self.stream.close()
+            if self._read_until_future is not None:
+                # This will prevent this message from showing up:
+                # '[ERROR   ] Future exception was never retrieved:
+                # StreamClosedError'
+                # This happens because the logic is always waiting to read
+                # the next message and the associated read future is marked
+                # 'StreamClosedError' when the stream is closed.
+                self._read_until_future.exc_info()
+
+
 class PubServer(tornado.tcpserver.TCPServer, object):
     '''
     TCP publisher
+
+    The minions identify themselves after connecting, by signing a challenge
+    sent by the publisher with their key. This is how the publisher knows
+    which minions are connected, and lets it send the publications targeted
+    to some minions only to them.
     '''
-    def __init__(self, *args, **kwargs):
-        super(PubServer, self).__init__(*args, **kwargs)
-        self.clients = []
+    def __init__(self, opts, io_loop=None):
+        super(PubServer, self).__init__(io_loop=io_loop)
+        self.opts = opts
+        self.clients = set()
+        # minion id -> set of subscribers
+        self.present = {}
+        # the subscribers which did not identify themselves, older minions
+        # never do and get all of the publications
+        self.unidentified = set()
+        self.registry = salt.utils.cache.get_connected_registry(self.opts)
 
     def handle_stream(self, stream, address):
         log.trace('Subscriber at {0} connected'.format(address))
-        self.clients.append((stream, address))
+        client = Subscriber(stream, address)
+        self.clients.add(client)
+        self.unidentified.add(client)
+        self.io_loop.spawn_callback(self._stream_read, client)
+
+    def _remove_client(self, client):
+        '''
+        Forget about a subscriber which has disconnected
+        '''
+        client.close()
+        self.clients.discard(client)
+        self.unidentified.discard(client)
+        if client.id_ is not None and client.id_ in self.present:
+            self.present[client.id_].discard(client)
+            if not self.present[client.id_]:
+                del self.present[client.id_]
+                if self.registry:
+                    self.registry.disconnect(client.id_)
+
+    @tornado.gen.coroutine
+    def _stream_read(self, client):
+        '''
+        Read the handshake messages sent by a subscriber, and notice right
+        away when it disconnects
+        '''
+        unpacker = msgpack.Unpacker()
+        while not client._closing:
+            try:
+                client._read_until_future = client.stream.read_bytes(4096, partial=True)
+                wire_bytes = yield client._read_until_future
+                unpacker.feed(wire_bytes)
+                for framed_msg in unpacker:
+                    header = framed_msg['head']
+                    body = self._handle_handshake(client, framed_msg['body'])
+                    client.stream.write(
+                        salt.transport.frame.frame_msg(body, header={'mid': header.get('mid')}))
+            except tornado.iostream.StreamClosedError:
+                log.trace('Subscriber at {0} has disconnected from publisher'.format(client.address))
+                self._remove_client(client)
+                break
+            except Exception as exc:
+                log.error('Exception parsing message from subscriber at {0}: {1}'.format(client.address, exc))
+                self._remove_client(client)
+                break
+
+    def _handle_handshake(self, client, load):
+        '''
+        Handle a step of the handshake of a subscriber and return the reply
+        '''
+        if not isinstance(load, dict):
+            return {'ret': False}
+        if load.get('cmd') == 'hello':
+            client.nonce = binascii.hexlify(os.urandom(16))
+            return {'nonce': client.nonce}
+        if load.get('cmd') == 'verify' and client.nonce is not None:
+            id_ = load.get('id')
+            nonce, client.nonce = client.nonce, None
+            if not salt.utils.verify.valid_id(self.opts, id_):
+                return {'ret': False}
+            pub_path = os.path.join(self.opts['pki_dir'], 'minions', id_)
+            try:
+                verified = salt.crypt.verify_signature(pub_path, nonce, load.get('sig', ''))
+            except Exception as exc:
+                log.debug('Unable to verify the subscriber at {0}: {1}'.format(client.address, exc))
+                verified = False
+            if not verified:
+                log.warning(
+                    'Subscriber at {0} claiming to be {1} could not be '
+                    'verified'.format(client.address, id_))
+                return {'ret': False}
+            client.id_ = id_
+            self.unidentified.discard(client)
+            self.present.setdefault(id_, set()).add(client)
+            if self.registry:
+                self.registry.connect(id_)
+            log.trace('Subscriber at {0} is {1}'.format(client.address, id_))
+            return {'ret': True}
+        return {'ret': False}
 
     # TODO: ACK the publish through IPC
     @tornado.gen.coroutine
-    def publish_payload(self, payload, _):
-        log.debug('TCP PubServer sending payload: {0}'.format(payload))
-        payload = salt.transport.frame.frame_msg(payload['payload'])
+    def publish_payload(self, package, _):
+        log.debug('TCP PubServer sending a {0} byte payload'.format(len(package['frame'])))
+        # The frame was built once by the master worker, every subscriber
+        # stream buffers the same chunks of it
+        chunks = salt.transport.frame.chunk_frame(package['frame'])
+
+        if 'topic_lst' in package:
+            clients = set(self.unidentified)
+            for topic in package['topic_lst']:
+                if topic in self.present:
+                    clients.update(self.present[topic])
+                else:
+                    log.trace('Publish target {0} not connected'.format(topic))
+        else:
+            clients = self.clients
 
         to_remove = []
-        for item in self.clients:
-            client, address = item
+        for client in clients:
             try:
                 # Write the packed str
-                f = client.write(payload)
+                for chunk in chunks:
+                    f = client.stream.write(chunk)
                 self.io_loop.add_future(f, lambda f: True)
             except tornado.iostream.StreamClosedError:
-                to_remove.append(item)
-        for item in to_remove:
-            client, address = item
-            log.debug('Subscriber at {0} has disconnected from publisher'.format(address))
-            client.close()
-            self.clients.remove(item)
+                to_remove.append(client)
+        for client in to_remove:
+            log.debug('Subscriber at {0} has disconnected from publisher'.format(client.address))
+            self._remove_client(client)
         log.trace('TCP PubServer finished publishing payload')
 
 
@@ -759,7 +921,7 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
             self.io_loop = tornado.ioloop.IOLoop.current()
 
         # Spin up the publisher
-        pub_server = PubServer(io_loop=self.io_loop)
+        pub_server = PubServer(self.opts, io_loop=self.io_loop)
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         _set_tcp_keepalive(sock, self.opts)
@@ -809,9 +971,12 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
 
         process_manager.add_process(self._publish_daemon, kwargs=kwargs)
 
-    def publish(self, load):
+    def publish(self, load, minions=None):
         '''
         Publish "load" to minions
+
+        :param dict load: A load to be sent across the wire to minions
+        :param list minions: The minions the master resolved the target to
         '''
         payload = {'enc': 'aes'}
 
@@ -834,10 +999,17 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         )
         pub_sock.connect()
 
-        int_payload = {'payload': self.serial.dumps(payload)}
-
-        # add some targeting stuff for lists only (for now)
-        if load['tgt_type'] == 'list':
-            int_payload['topic_lst'] = load['tgt']
+        # Frame the payload here, the publisher sends the frame as is to all
+        # of the subscribers
+        int_payload = {'frame': salt.transport.frame.frame_msg(payload)}
+
+        # Only send the load to the targeted minions if they are known for
+        # sure. The targets resolved from grains or pillar depend on the data
+        # cache, and syndics need to see all of the publications.
+        if load['tgt_type'] in TARGETED_TGT_TYPES and not self.opts.get('order_masters'):
+            if minions is not None:
+                int_payload['topic_lst'] = list(minions)
+            elif load['tgt_type'] == 'list':
+                int_payload['topic_lst'] = load['tgt']
         # Send it over IPC!
         pub_sock.send(int_payload)
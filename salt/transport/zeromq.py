@@ -48,6 +48,12 @@ from Crypto.Cipher import PKCS1_OAEP
 
 log = logging.getLogger(__name__)
 
+# The command name of the authentication requests, as packed in their payload
+AUTH_CMD = '\xa5_auth'
+# Authentication requests are only a few KB, larger payloads are not unpacked
+# to find out if they are one
+AUTH_PAYLOAD_MAX = 64 * 1024
+
 
 class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
     '''
@@ -429,9 +435,88 @@ class AsyncZeroMQPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.t
 
 class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.transport.server.ReqServerChannel):
 
-    def __init__(self, opts):
+    def __init__(self, opts, auth=False):
         salt.transport.server.ReqServerChannel.__init__(self, opts)
         self._closing = False
+        # True for the channel of the workers dedicated to authentication
+        self.auth = auth
+
+    def _workers_uri(self, auth=False):
+        '''
+        Return the uri the workers, or the auth workers, connect to
+        '''
+        if self.opts.get('ipc_mode', '') == 'tcp':
+            if auth:
+                return 'tcp://127.0.0.1:{0}'.format(
+                    self.opts.get('tcp_master_auth_workers', 4516)
+                    )
+            return 'tcp://127.0.0.1:{0}'.format(
+                self.opts.get('tcp_master_workers', 4515)
+                )
+        if auth:
+            return 'ipc://{0}'.format(
+                os.path.join(self.opts['sock_dir'], 'auth_workers.ipc')
+                )
+        return 'ipc://{0}'.format(
+            os.path.join(self.opts['sock_dir'], 'workers.ipc')
+            )
+
+    def auth_channel(self):
+        '''
+        Return a channel for the workers dedicated to the minion
+        authentication requests, if there are any
+        '''
+        if not self.opts.get('auth_workers'):
+            return None
+        chan = self.__class__(self.opts, auth=True)
+        chan.auth_bucket = self.auth_bucket
+        return chan
+
+    def _is_auth(self, frame):
+        '''
+        Tell if the payload frame of a request from a minion is an
+        authentication request. Only the small payloads which contain the
+        command name are unpacked.
+        '''
+        if len(frame) > AUTH_PAYLOAD_MAX:
+            return False
+        payload = frame.bytes
+        if AUTH_CMD not in payload:
+            return False
+        try:
+            payload = self.serial.loads(payload)
+            return payload['enc'] == 'clear' and payload['load']['cmd'] == '_auth'
+        except Exception:
+            return False
+
+    def _auth_device(self):
+        '''
+        Route the authentication requests to the auth workers and the other
+        requests to the workers. A request routed to the wrong workers is
+        still handled, all of them serve every command.
+        '''
+        self.serial = salt.payload.Serial(self.opts)
+        poller = zmq.Poller()
+        poller.register(self.clients, zmq.POLLIN)
+        poller.register(self.workers, zmq.POLLIN)
+        poller.register(self.auth_workers, zmq.POLLIN)
+        while True:
+            try:
+                socks = dict(poller.poll())
+                if socks.get(self.clients) == zmq.POLLIN:
+                    frames = self.clients.recv_multipart(copy=False)
+                    if self._is_auth(frames[-1]):
+                        self.auth_workers.send_multipart(frames, copy=False)
+                    else:
+                        self.workers.send_multipart(frames, copy=False)
+                for workers in (self.workers, self.auth_workers):
+                    if socks.get(workers) == zmq.POLLIN:
+                        self.clients.send_multipart(
+                            workers.recv_multipart(copy=False), copy=False)
+            except zmq.ZMQError as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                raise exc
 
     def zmq_device(self):
         '''
@@ -453,21 +538,18 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.
             t.start()
 
         self.workers = self.context.socket(zmq.DEALER)
-
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            self.w_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_workers', 4515)
-                )
-        else:
-            self.w_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'workers.ipc')
-                )
+        self.w_uri = self._workers_uri()
 
         log.info('Setting up the master communication server')
         self.clients.bind(self.uri)
 
         self.workers.bind(self.w_uri)
 
+        if self.opts.get('auth_workers'):
+            self.auth_workers = self.context.socket(zmq.DEALER)
+            self.auth_workers.bind(self._workers_uri(auth=True))
+            self._auth_device()
+
         while True:
             try:
                 zmq.device(zmq.QUEUE, self.clients, self.workers)
@@ -513,14 +595,7 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.
 
         self.context = zmq.Context(1)
         self._socket = self.context.socket(zmq.REP)
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            self.w_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_workers', 4515)
-                )
-        else:
-            self.w_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'workers.ipc')
-                )
+        self.w_uri = self._workers_uri(auth=self.auth)
         log.info('Worker binding to socket {0}'.format(self.w_uri))
         self._socket.connect(self.w_uri)
 
@@ -650,25 +725,27 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
                 # Catch and handle EINTR from when this process is sent
                 # SIGUSR1 gracefully so we don't choke and die horribly
                 try:
-                    package = pull_sock.recv()
-                    unpacked_package = salt.payload.unpackage(package)
-                    payload = unpacked_package['payload']
+                    # The payload was serialized by the master worker, only
+                    # the topics are unpacked and the payload frame is passed
+                    # on without copying it
+                    topics, payload = pull_sock.recv_multipart(copy=False)
+                    topic_lst = salt.payload.unpackage(topics.bytes)
                     if self.opts['zmq_filtering']:
                         # if you have a specific topic list, use that
-                        if 'topic_lst' in unpacked_package:
-                            for topic in unpacked_package['topic_lst']:
+                        if topic_lst is not None:
+                            for topic in topic_lst:
                                 # zmq filters are substring match, hash the topic
                                 # to avoid collisions
                                 htopic = hashlib.sha1(topic).hexdigest()
                                 pub_sock.send(htopic, flags=zmq.SNDMORE)
-                                pub_sock.send(payload)
+                                pub_sock.send(payload, copy=False)
                                 # otherwise its a broadcast
                         else:
                             # TODO: constants file for "broadcast"
                             pub_sock.send('broadcast', flags=zmq.SNDMORE)
-                            pub_sock.send(payload)
+                            pub_sock.send(payload, copy=False)
                     else:
-                        pub_sock.send(payload)
+                        pub_sock.send(payload, copy=False)
                 except zmq.ZMQError as exc:
                     if exc.errno == errno.EINTR:
                         continue
@@ -695,11 +772,12 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
         '''
         process_manager.add_process(self._publish_daemon)
 
-    def publish(self, load):
+    def publish(self, load, minions=None):  # pylint: disable=unused-argument
         '''
         Publish "load" to minions
 
         :param dict load: A load to be sent across the wire to minions
+        :param list minions: Not used, ZeroMQ only filters list targets
         '''
         payload = {'enc': 'aes'}
 
@@ -721,13 +799,15 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
                 os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
                 )
         pub_sock.connect(pull_uri)
-        int_payload = {'payload': self.serial.dumps(payload)}
-
         # add some targeting stuff for lists only (for now)
+        topic_lst = None
         if load['tgt_type'] == 'list':
-            int_payload['topic_lst'] = load['tgt']
+            topic_lst = load['tgt']
 
-        pub_sock.send(self.serial.dumps(int_payload))
+        # The topics and the payload travel in frames of their own so the
+        # publisher can pass the payload on as is
+        pub_sock.send_multipart([self.serial.dumps(topic_lst),
+                                 self.serial.dumps(payload)])
 
 
 # TODO: unit tests!
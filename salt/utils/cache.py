@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
 # Import Python libs
 from __future__ import absolute_import, print_function
+import logging
+import mmap
 import os
 import re
+import struct
 import time
 
 # Import salt libs
 import salt.config
 import salt.payload
+import salt.utils
 import salt.utils.dictupdate
 
 # Import third party libs
@@ -17,6 +21,13 @@ try:
     HAS_ZMQ = True
 except ImportError:
     HAS_ZMQ = False
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+log = logging.getLogger(__name__)
 
 
 class CacheDict(dict):
@@ -101,6 +112,305 @@ class CacheCli(object):
         return min_list
 
 
+class MinionDataCacheCli(object):
+    '''
+    Connection client for the MinionDataCache. Used to push freshly compiled
+    minion data to the cache and to resolve grain and pillar targets against
+    its index.
+    '''
+
+    def __init__(self, opts, timeout=5):
+        '''
+        Sets up the zmq-connection to the MinionDataCache
+        '''
+        self.opts = opts
+        self.timeout = timeout
+        self.serial = salt.payload.Serial(self.opts.get('serial', ''))
+        self.cache_sock = os.path.join(self.opts['sock_dir'], 'mdata_cache.ipc')
+        self.cache_upd_sock = os.path.join(
+            self.opts['sock_dir'], 'mdata_upd.ipc')
+
+        self.context = zmq.Context()
+        self.creq_out = None
+
+        # the socket for sending updates to the cache
+        self.cupd_out = self.context.socket(zmq.PUB)
+        self.cupd_out.setsockopt(zmq.LINGER, 1)
+        self.cupd_out.connect('ipc://' + self.cache_upd_sock)
+
+    def _connect(self):
+        '''
+        Connect the socket used to query the cache
+        '''
+        self.creq_out = self.context.socket(zmq.REQ)
+        self.creq_out.setsockopt(zmq.LINGER, 100)
+        self.creq_out.connect('ipc://' + self.cache_sock)
+
+    def put_cache(self, minion_id, grains, pillar):
+        '''
+        Publish the grains and pillar of a minion to the MinionDataCache
+        '''
+        self.cupd_out.send(self.serial.dumps(
+            {'id': minion_id, 'grains': grains, 'pillar': pillar}))
+
+    def match(self, search_type, expr, delimiter, greedy,
+              regex_match=False, exact_match=False):
+        '''
+        Ask the MinionDataCache which cached minions match the expression.
+        With ``greedy`` the ids of the cached minions which do *not* match
+        are returned, so the caller can remove them from the accepted
+        minions. Returns None if the cache did not answer in time.
+        '''
+        if self.creq_out is None:
+            self._connect()
+        self.creq_out.send(self.serial.dumps(
+            {'cmd': 'match',
+             'search_type': search_type,
+             'expr': expr,
+             'delimiter': delimiter,
+             'greedy': greedy,
+             'regex_match': regex_match,
+             'exact_match': exact_match}))
+        if not self.creq_out.poll(self.timeout * 1000):
+            # A REQ socket can't send again before it received a reply,
+            # start over with a fresh one on the next request
+            self.creq_out.close()
+            self.creq_out = None
+            return None
+        return self.serial.loads(self.creq_out.recv())
+
+
+class ConnectedRegistry(object):
+    '''
+    Registry of the minions connected to the master, kept in a memory mapped
+    file in the sock_dir. It is written by the master processes which see the
+    minions connect and disconnect and can be read by any process on the
+    master without a round trip to another process.
+
+    The file holds a header, one state byte per slot and the minion ids of the
+    slots. A slot is assigned to a minion id the first time it connects and is
+    never reused, so the mapping of the slots to the minion ids only ever grows
+    and each process only has to read the ids of the newly assigned slots.
+    '''
+    MAGIC = b'SALTCON1'
+    # magic, number of slots, size of an id entry, used slots, overflow flag
+    HEADER = struct.Struct('>8sIIII')
+    ID_SIZE = 256
+    ID_LEN = struct.Struct('>H')
+
+    def __init__(self, opts, create=False):
+        self.opts = opts
+        self.path = os.path.join(self.opts['sock_dir'], 'connected.map')
+        self._fd = None
+        self._mmap = None
+        self._ino = None
+        self._slots = 0
+        self._ids = []
+        self._index = {}
+        if create:
+            self._create(self.opts.get('connected_registry_size', 65536))
+
+    def _create(self, slots):
+        '''
+        Create an empty registry, replacing a previous one
+        '''
+        size = self.HEADER.size + slots + slots * self.ID_SIZE
+        tmp_path = '{0}.tmp'.format(self.path)
+        fd_ = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            # The file is sparse, only the slots in use take up space
+            os.ftruncate(fd_, size)
+            os.write(fd_, self.HEADER.pack(self.MAGIC, slots, self.ID_SIZE, 0, 0))
+        finally:
+            os.close(fd_)
+        os.rename(tmp_path, self.path)
+
+    def close(self):
+        '''
+        Unmap the registry
+        '''
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._ino = None
+        self._ids = []
+        self._index = {}
+
+    def _open(self):
+        '''
+        Map the registry, or map it again if it was recreated by a restart of
+        the master. Returns False if the registry is not available.
+        '''
+        try:
+            ino = os.stat(self.path).st_ino
+        except OSError:
+            self.close()
+            return False
+        if self._mmap is not None and ino == self._ino:
+            return True
+        self.close()
+        try:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR)
+                access = mmap.ACCESS_WRITE
+            except OSError:
+                # Readers without write access to the registry
+                self._fd = os.open(self.path, os.O_RDONLY)
+                access = mmap.ACCESS_READ
+            self._mmap = mmap.mmap(self._fd, 0, access=access)
+        except (OSError, IOError, ValueError) as exc:
+            log.debug('Unable to map the connected registry: {0}'.format(exc))
+            self.close()
+            return False
+        magic, slots, id_size, _, _ = self.HEADER.unpack(
+            self._mmap[:self.HEADER.size])
+        if magic != self.MAGIC or id_size != self.ID_SIZE:
+            log.error('Invalid connected registry {0}'.format(self.path))
+            self.close()
+            return False
+        self._ino = ino
+        self._slots = slots
+        return True
+
+    def _header(self):
+        '''
+        Return the used slots and the overflow flag
+        '''
+        return self.HEADER.unpack(self._mmap[:self.HEADER.size])[3:]
+
+    def _refresh(self):
+        '''
+        Read the ids of the slots assigned since the last call
+        '''
+        used = self._header()[0]
+        base = self.HEADER.size + self._slots
+        for slot in range(len(self._ids), used):
+            offset = base + slot * self.ID_SIZE
+            length = self.ID_LEN.unpack(
+                self._mmap[offset:offset + self.ID_LEN.size])[0]
+            start = offset + self.ID_LEN.size
+            minion_id = salt.utils.to_str(self._mmap[start:start + length], 'utf-8')
+            self._ids.append(minion_id)
+            self._index[minion_id] = slot
+
+    def _slot(self, minion_id, assign=False):
+        '''
+        Return the slot of a minion id, optionally assigning a new one
+        '''
+        if not self._open():
+            return None
+        if minion_id not in self._index:
+            self._refresh()
+        if minion_id in self._index or not assign:
+            return self._index.get(minion_id)
+        encoded = salt.utils.to_bytes(minion_id, 'utf-8')
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self._refresh()
+            if minion_id in self._index:
+                return self._index[minion_id]
+            used, overflow = self._header()
+            if used >= self._slots or len(encoded) > self.ID_SIZE - self.ID_LEN.size:
+                if not overflow:
+                    log.warning(
+                        'The connected registry can not track {0}, it will '
+                        'not be used until the master is restarted. Raise '
+                        'connected_registry_size if the registry is '
+                        'full.'.format(minion_id))
+                    self._mmap[:self.HEADER.size] = self.HEADER.pack(
+                        self.MAGIC, self._slots, self.ID_SIZE, used, 1)
+                return None
+            offset = self.HEADER.size + self._slots + used * self.ID_SIZE
+            self._mmap[offset:offset + self.ID_LEN.size + len(encoded)] = \
+                self.ID_LEN.pack(len(encoded)) + encoded
+            # Publish the slot only once the id is written
+            self._mmap[:self.HEADER.size] = self.HEADER.pack(
+                self.MAGIC, self._slots, self.ID_SIZE, used + 1, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._refresh()
+        return self._index.get(minion_id)
+
+    def _set(self, slot, state):
+        '''
+        Set the state byte of a slot
+        '''
+        offset = self.HEADER.size + slot
+        self._mmap[offset:offset + 1] = b'\x01' if state else b'\x00'
+
+    def connect(self, minion_id):
+        '''
+        Mark a minion as connected
+        '''
+        slot = self._slot(minion_id, assign=True)
+        if slot is not None:
+            self._set(slot, True)
+
+    def disconnect(self, minion_id):
+        '''
+        Mark a minion as disconnected
+        '''
+        slot = self._slot(minion_id)
+        if slot is not None:
+            self._set(slot, False)
+
+    def sync(self, minion_ids):
+        '''
+        Mark exactly the given minions as connected
+        '''
+        minion_ids = set(minion_ids)
+        for minion_id in minion_ids:
+            self.connect(minion_id)
+        if not self._open():
+            return
+        self._refresh()
+        for slot, minion_id in enumerate(self._ids):
+            if minion_id not in minion_ids:
+                self._set(slot, False)
+
+    def connected(self):
+        '''
+        Return the set of connected minion ids, or None if the registry is
+        not available
+        '''
+        if not self._open():
+            return None
+        self._refresh()
+        used, overflow = self._header()
+        if overflow:
+            return None
+        states = bytearray(
+            self._mmap[self.HEADER.size:self.HEADER.size + len(self._ids)])
+        return set(
+            self._ids[slot] for slot, state in enumerate(states) if state)
+
+    def filter(self, minion_ids):
+        '''
+        Return the given minion ids which are connected, or None if the
+        registry is not available
+        '''
+        connected = self.connected()
+        if connected is None:
+            return None
+        return [minion_id for minion_id in minion_ids if minion_id in connected]
+
+
+def get_connected_registry(opts):
+    '''
+    Return a ConnectedRegistry if it is enabled in the configuration and can
+    be used on this platform, else None
+    '''
+    if not opts.get('connected_registry', False):
+        return None
+    if not HAS_FCNTL:
+        log.warning('The connected registry is not available on this platform')
+        return None
+    return ConnectedRegistry(opts)
+
+
 class CacheRegex(object):
     '''
     Create a regular expression object cache for the most frequently
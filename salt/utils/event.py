@@ -149,6 +149,42 @@ def get_master_event(opts, sock_dir, listen=True, io_loop=None):
         )
 
 
+def _package_tag(package):
+    '''
+    Return the tag of a raw event, to filter it by
+    '''
+    try:
+        return salt.utils.to_str(
+            package.partition(salt.utils.to_bytes(TAGEND))[0])
+    except (AttributeError, TypeError, UnicodeDecodeError):
+        # Not a raw event, publish it to every listener
+        return None
+
+
+def _ipc_publisher(opts, uri, io_loop):
+    '''
+    Return the IPCMessagePublisher to publish events with, which fires a
+    salt/event/overflow event when listeners fall behind
+    '''
+    tag = tagify('overflow', 'event')
+
+    def handle_overflow(subscribers):
+        data = {'policy': opts['event_subscriber_overflow'],
+                'queue_size': opts['event_subscriber_queue_size'],
+                'subscribers': subscribers,
+                '_stamp': datetime.datetime.utcnow().isoformat()}
+        publisher.publish(SaltEvent.pack(tag, data), tag=tag)
+
+    publisher = salt.transport.ipc.IPCMessagePublisher(
+        uri,
+        io_loop=io_loop,
+        max_queue_size=opts['event_subscriber_queue_size'],
+        overflow_policy=opts['event_subscriber_overflow'],
+        overflow_handler=handle_overflow,
+    )
+    return publisher
+
+
 def tagify(suffix='', prefix='', base=SALT):
     '''
     convenience function to build a namespaced event tag string
@@ -214,6 +250,7 @@ class SaltEvent(object):
         self.puburi, self.pulluri = self.__load_uri(sock_dir, node)
         self.pending_tags = []
         self.pending_events = []
+        self.tag_filters = None
         self.__load_cache_regex()
         if listen and not self.cpub:
             # Only connect to the publisher at initialization time if
@@ -308,6 +345,34 @@ class SaltEvent(object):
             if any(pmatch_func(evt['tag'], ptag) for ptag, pmatch_func in self.pending_tags):
                 self.pending_events.append(evt)
 
+    def set_tag_filter(self, tags, match_type=None):
+        '''
+        Ask the event publisher to only send this listener the events whose
+        tag matches one of the passed tags, instead of every event on the bus.
+        Pass None to receive every event again.
+
+        Unlike subscribe(), this filters the events before they are sent, so
+        get_event() will never see the other events. The filter applies to
+        every SaltEvent listening with the same io_loop.
+
+        match_type
+            Either 'startswith' (tag prefixes) or 'fnmatch' (tag globs).
+            Default is opts['event_match_type']
+        '''
+        if tags is None:
+            self.tag_filters = None
+        else:
+            if match_type is None:
+                match_type = self.opts['event_match_type']
+            if match_type not in salt.transport.ipc.SUBSCRIPTION_MATCH_TYPES:
+                raise ValueError(
+                    'The event publisher can not match tags with '
+                    '\'{0}\''.format(match_type)
+                )
+            self.tag_filters = [[match_type, tag] for tag in tags]
+        if self.subscriber is not None:
+            self.subscriber.subscribe(self.tag_filters)
+
     def connect_pub(self, timeout=None):
         '''
         Establish the publish connection
@@ -322,6 +387,8 @@ class SaltEvent(object):
                     self.puburi,
                     io_loop=self.io_loop
                 )
+                    if self.tag_filters is not None:
+                        self.subscriber.subscribe(self.tag_filters)
                 try:
                     self.io_loop.run_sync(
                         lambda: self.subscriber.connect(timeout=timeout))
@@ -334,6 +401,8 @@ class SaltEvent(object):
                 self.puburi,
                 io_loop=self.io_loop
             )
+                if self.tag_filters is not None:
+                    self.subscriber.subscribe(self.tag_filters)
 
             # For the async case, the connect will be defered to when
             # set_event_handler() is invoked.
@@ -372,6 +441,14 @@ class SaltEvent(object):
             self.cpush = True
         return self.cpush
 
+    @classmethod
+    def pack(cls, tag, data, serial=None):
+        if serial is None:
+            serial = salt.payload.Serial({'serial': 'msgpack'})
+
+        event = '{0}{1}{2}'.format(tag, TAGEND, serial.dumps(data))
+        return salt.utils.to_bytes(event, 'utf-8')
+
     @classmethod
     def unpack(cls, raw, serial=None):
         if serial is None:
@@ -864,10 +941,7 @@ class AsyncEventPublisher(object):
                         # Let's stop at this stage
                         raise
 
-        self.publisher = salt.transport.ipc.IPCMessagePublisher(
-            epub_uri,
-            io_loop=self.io_loop
-        )
+        self.publisher = _ipc_publisher(self.opts, epub_uri, self.io_loop)
 
         self.puller = salt.transport.ipc.IPCMessageServer(
             epull_uri,
@@ -888,7 +962,7 @@ class AsyncEventPublisher(object):
         Get something from epull, publish it out epub, and return the package (or None)
         '''
         try:
-            self.publisher.publish(package)
+            self.publisher.publish(package, tag=_package_tag(package))
             self.io_loop.spawn_callback(self.publish_handler, package)
             return package
         # Add an extra fallback in case a forked process leeks through
@@ -952,10 +1026,7 @@ class EventPublisher(salt.utils.process.SignalHandlingMultiprocessingProcess):
                     'master_event_pull.ipc'
                 )
 
-            self.publisher = salt.transport.ipc.IPCMessagePublisher(
-                epub_uri,
-                io_loop=self.io_loop
-            )
+            self.publisher = _ipc_publisher(self.opts, epub_uri, self.io_loop)
 
             self.puller = salt.transport.ipc.IPCMessageServer(
                 epull_uri,
@@ -996,7 +1067,7 @@ class EventPublisher(salt.utils.process.SignalHandlingMultiprocessingProcess):
         Get something from epull, publish it out epub, and return the package (or None)
         '''
         try:
-            self.publisher.publish(package)
+            self.publisher.publish(package, tag=_package_tag(package))
             return package
         # Add an extra fallback in case a forked process leeks through
         except Exception:
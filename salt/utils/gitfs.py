@@ -15,6 +15,8 @@ import shlex
 import shutil
 import stat
 import subprocess
+import threading
+import time
 from datetime import datetime
 
 VALID_PROVIDERS = ('gitpython', 'pygit2', 'dulwich')
@@ -54,9 +56,11 @@ _INVALID_REPO = (
 
 # Import salt libs
 import salt.utils
+import salt.utils.atomicfile
 import salt.utils.itertools
 import salt.utils.url
 import salt.fileserver
+import salt.payload
 from salt.exceptions import FileserverConfigError
 from salt.utils.event import tagify
 
@@ -101,6 +105,17 @@ LIBGIT2_MINVER = '0.20.0'
 # instead of using distutils.version.LooseVersion
 DULWICH_MINVER = (0, 9, 4)
 
+# The file indexes written by GitFS.update, parsed once per change of the file
+_FILE_INDEXES = {}
+
+# The remotes whose fetch finished after fetch_remotes stopped waiting for it,
+# and updated the local copy
+_LATE_FETCHES = set()
+# The remotes being fetched, a fetch which timed out stays in there until it
+# is done
+_RUNNING_FETCHES = set()
+_LATE_FETCHES_LOCK = threading.Lock()
+
 
 def failhard(role):
     '''
@@ -444,6 +459,43 @@ class GitProvider(object):
         '''
         raise NotImplementedError()
 
+    def file_index(self, tgt_env, hash_type, known=None):
+        '''
+        Return a dict mapping each file in the target environment to the ID,
+        size and hash of its blob, and a dict of the symlinks. Symlinks are
+        mapped to None in the first dict, as they are served with the
+        contents of the file they point to. The blobs found in known, a dict
+        mapping blob IDs to their size and hash, are not read again.
+        '''
+        files = {}
+        symlinks = {}
+        if known is None:
+            known = {}
+        try:
+            hash_func = getattr(hashlib, hash_type)
+        except (AttributeError, TypeError):
+            raise ValueError('Invalid hash type: {0}'.format(hash_type))
+        if self.root:
+            relpath = lambda path: os.path.relpath(path, self.root)
+        else:
+            relpath = lambda path: path
+        add_mountpoint = lambda path: os.path.join(self.mountpoint, path)
+        for repo_path, mode, blob_hexsha, read in self.walk_blobs(tgt_env):
+            file_path = add_mountpoint(relpath(repo_path))
+            if stat.S_ISLNK(mode):
+                files[file_path] = None
+                symlinks[file_path] = read()
+            elif blob_hexsha in known:
+                files[file_path] = {'blob': blob_hexsha,
+                                    'size': known[blob_hexsha]['size'],
+                                    'hsum': known[blob_hexsha]['hsum']}
+            else:
+                data = read()
+                files[file_path] = {'blob': blob_hexsha,
+                                    'size': len(data),
+                                    'hsum': hash_func(data).hexdigest()}
+        return files, symlinks
+
     def file_list(self, tgt_env):
         '''
         This function must be overridden in a sub-class
@@ -462,6 +514,12 @@ class GitProvider(object):
         '''
         raise NotImplementedError()
 
+    def get_tree_id(self, tgt_env):
+        '''
+        This function must be overridden in a sub-class
+        '''
+        raise NotImplementedError()
+
     def get_url(self):
         '''
         Examine self.id and assign self.url (and self.branch, for git_pillar)
@@ -485,6 +543,12 @@ class GitProvider(object):
         self.credentials = None
         return True
 
+    def walk_blobs(self, tgt_env):
+        '''
+        This function must be overridden in a sub-class
+        '''
+        raise NotImplementedError()
+
     def write_file(self, blob, dest):
         '''
         This function must be overridden in a sub-class
@@ -743,6 +807,35 @@ class GitPython(GitProvider):
         except gitdb.exc.ODBError:
             return None
 
+    def get_tree_id(self, tgt_env):
+        '''
+        Return the SHA of the tree of the branch/tag/SHA, or None if it is not
+        found
+        '''
+        tree = self.get_tree(tgt_env)
+        return tree.hexsha if tree else None
+
+    def walk_blobs(self, tgt_env):
+        '''
+        Yield the repo path, mode and SHA of each blob under the root of the
+        target environment, along with a function returning its contents
+        '''
+        tree = self.get_tree(tgt_env)
+        if not tree:
+            return
+        if self.root:
+            try:
+                tree = tree / self.root
+            except KeyError:
+                return
+        for file_blob in tree.traverse():
+            if not isinstance(file_blob, git.Blob):
+                continue
+            yield (file_blob.path,
+                   file_blob.mode,
+                   file_blob.hexsha,
+                   lambda blob=file_blob: blob.data_stream.read())
+
     def write_file(self, blob, dest):
         '''
         Using the blob object, write the file to the destination path
@@ -1170,6 +1263,14 @@ class Pygit2(GitProvider):
             return commit.tree
         return None
 
+    def get_tree_id(self, tgt_env):
+        '''
+        Return the SHA of the tree of the branch/tag/SHA, or None if it is not
+        found
+        '''
+        tree = self.get_tree(tgt_env)
+        return tree.hex if tree else None
+
     def verify_auth(self):
         '''
         Check the username and password/keypair info for validity. If valid,
@@ -1275,6 +1376,45 @@ class Pygit2(GitProvider):
             )
             failhard(self.role)
 
+    def walk_blobs(self, tgt_env):
+        '''
+        Yield the repo path, mode and SHA of each blob under the root of the
+        target environment, along with a function returning its contents
+        '''
+        def _traverse(tree, prefix):
+            '''
+            Traverse through a pygit2 Tree object recursively, yielding the
+            blobs
+            '''
+            for entry in iter(tree):
+                if entry.oid not in self.repo:
+                    # Entry is a submodule, skip it
+                    continue
+                obj = self.repo[entry.oid]
+                repo_path = os.path.join(prefix, entry.name)
+                if isinstance(obj, pygit2.Blob):
+                    yield (repo_path,
+                           tree[entry.name].filemode,
+                           obj.hex,
+                           lambda blob=obj: blob.data)
+                elif isinstance(obj, pygit2.Tree):
+                    for item in _traverse(obj, repo_path):
+                        yield item
+
+        tree = self.get_tree(tgt_env)
+        if not tree:
+            return
+        if self.root:
+            try:
+                oid = tree[self.root].oid
+                tree = self.repo[oid]
+            except KeyError:
+                return
+            if not isinstance(tree, pygit2.Tree):
+                return
+        for item in _traverse(tree, self.root):
+            yield item
+
     def write_file(self, blob, dest):
         '''
         Using the blob object, write the file to the destination path
@@ -1568,6 +1708,14 @@ class Dulwich(GitProvider):  # pylint: disable=abstract-method
             pass
         return None
 
+    def get_tree_id(self, tgt_env):
+        '''
+        Return the SHA of the tree of the branch/tag/SHA, or None if it is not
+        found
+        '''
+        tree = self.get_tree(tgt_env)
+        return tree.id if tree else None
+
     def init_remote(self):
         '''
         Initialize/attach to a remote using dulwich. Return a boolean which
@@ -1610,6 +1758,43 @@ class Dulwich(GitProvider):  # pylint: disable=abstract-method
         # No way to interact with remotes, so just assume success
         return new
 
+    def walk_blobs(self, tgt_env):
+        '''
+        Yield the repo path, mode and SHA of each blob under the root of the
+        target environment, along with a function returning its contents
+        '''
+        def _read(sha):
+            '''
+            Return a function reading the contents of a blob
+            '''
+            return lambda: self.repo.get_object(sha).as_raw_string()
+
+        def _traverse(tree, prefix):
+            '''
+            Traverse through a dulwich Tree object recursively, yielding the
+            blobs
+            '''
+            for item in six.iteritems(tree):
+                repo_path = os.path.join(prefix, item.path)
+                if dulwich.objects.S_ISGITLINK(item.mode):
+                    # Entry is a submodule, skip it
+                    continue
+                if stat.S_ISDIR(item.mode):
+                    obj = self.repo.get_object(item.sha)
+                    if isinstance(obj, dulwich.objects.Tree):
+                        for blob in _traverse(obj, repo_path):
+                            yield blob
+                    continue
+                # The blob is only read if its contents are needed
+                yield repo_path, item.mode, item.sha, _read(item.sha)
+
+        tree = self.get_tree(tgt_env)
+        tree = self.walk_tree(tree, self.root)
+        if not isinstance(tree, dulwich.objects.Tree):
+            return
+        for blob in _traverse(tree, self.root):
+            yield blob
+
     def walk_tree(self, tree, path):
         '''
         Dulwich does not provide a means of directly accessing subdirectories.
@@ -1653,6 +1838,8 @@ class GitBase(object):
         self.env_cache = os.path.join(self.cache_root, 'envs.p')
         self.hash_cachedir = os.path.join(
             self.cache_root, 'hash')
+        self.index_cachedir = os.path.join(
+            self.cache_root, 'index')
         self.file_list_cachedir = os.path.join(
             self.opts['cachedir'], 'file_lists', self.role)
 
@@ -1821,25 +2008,135 @@ class GitBase(object):
         '''
         Fetch all remotes and return a boolean to let the calling function know
         whether or not any remotes were updated in the process of fetching
-        '''
-        changed = False
-        for repo in self.remotes:
-            try:
-                if repo.fetch():
-                    # We can't just use the return value from repo.fetch()
-                    # because the data could still have changed if old remotes
-                    # were cleared above. Additionally, we're running this in a
-                    # loop and later remotes without changes would override
-                    # this value and make it incorrect.
+
+        The remotes are fetched by a pool of ``<role>_fetch_workers`` threads.
+        The fetch of a remote which takes longer than ``<role>_fetch_timeout``
+        seconds is left running, it keeps the update lock of the remote until
+        it is done, the remote is skipped by the calls made in the meantime,
+        and its changes are reported by the next call.
+        '''
+        workers = max(self.opts.get('{0}_fetch_workers'.format(self.role), 4), 1)
+        timeout = self.opts.get('{0}_fetch_timeout'.format(self.role), 300)
+        remotes = []
+        with _LATE_FETCHES_LOCK:
+            for repo in self.remotes:
+                key = (self.role, repo.id)
+                if key in _RUNNING_FETCHES:
+                    log.warning(
+                        'Fetch of {0} remote \'{1}\' is still running, '
+                        'skipping'.format(self.role, repo.id)
+                    )
+                    continue
+                _RUNNING_FETCHES.add(key)
+                remotes.append(repo)
+        stats = {}
+        cond = threading.Condition()
+
+        def _fetch():
+            '''
+            Fetch the remotes left until there are none
+            '''
+            while True:
+                with cond:
+                    if not remotes:
+                        return
+                    repo = remotes.pop(0)
+                    stats[repo.id] = {'start': time.time()}
+                result = 'unchanged'
+                try:
+                    if repo.fetch():
+                        result = 'changed'
+                except Exception as exc:
+                    result = 'error'
+                    log.error(
+                        'Exception \'{0}\' caught while fetching {1} remote '
+                        '\'{2}\''.format(exc, self.role, repo.id),
+                        exc_info_on_loglevel=logging.DEBUG
+                    )
+                finally:
+                    # No other fetch of this remote runs in this process, the
+                    # lock is either ours or a stale one
+                    repo.clear_lock()
+                with cond:
+                    stat_ = stats[repo.id]
+                    stat_['duration'] = time.time() - stat_['start']
+                    with _LATE_FETCHES_LOCK:
+                        _RUNNING_FETCHES.discard((self.role, repo.id))
+                        if stat_.get('result') == 'timeout' \
+                                and result == 'changed':
+                            _LATE_FETCHES.add((self.role, repo.id))
+                    if stat_.get('result') == 'timeout':
+                        # Nobody waits for this fetch anymore
+                        log.warning(
+                            'Fetch of {0} remote \'{1}\' finished after {2:.1f} '
+                            'seconds'.format(self.role,
+                                             repo.id,
+                                             stat_['duration'])
+                        )
+                        return
+                    stat_['result'] = result
+                    cond.notify_all()
+
+        def _start_worker():
+            thread = threading.Thread(target=_fetch,
+                                      name='{0}_fetch'.format(self.role))
+            thread.daemon = True
+            thread.start()
+
+        with cond:
+            for _ in range(min(workers, len(remotes))):
+                _start_worker()
+            while True:
+                running = [x for x in six.itervalues(stats)
+                           if 'result' not in x]
+                if not remotes and not running:
+                    break
+                now = time.time()
+                if timeout > 0:
+                    for repo_id, stat_ in six.iteritems(stats):
+                        if 'result' in stat_ \
+                                or now - stat_['start'] < timeout:
+                            continue
+                        stat_['result'] = 'timeout'
+                        stat_['duration'] = now - stat_['start']
+                        log.error(
+                            'Fetch of {0} remote \'{1}\' did not finish '
+                            'within {2} seconds, the remote will be skipped '
+                            'until it does'.format(self.role,
+                                                   repo_id,
+                                                   timeout)
+                        )
+                        # The worker stays busy with it, replace it
+                        if remotes:
+                            _start_worker()
+                    wait = min([timeout - (now - x['start'])
+                                for x in running] or [timeout])
+                    cond.wait(max(wait, 0.1))
+                else:
+                    cond.wait()
+
+        changed = any(x['result'] == 'changed' for x in six.itervalues(stats))
+        with _LATE_FETCHES_LOCK:
+            for repo in self.remotes:
+                if (self.role, repo.id) in _LATE_FETCHES:
+                    _LATE_FETCHES.discard((self.role, repo.id))
                     changed = True
-            except Exception as exc:
-                log.error(
-                    'Exception \'{0}\' caught while fetching {1} remote '
-                    '\'{2}\''.format(exc, self.role, repo.id),
-                    exc_info_on_loglevel=logging.DEBUG
-                )
-            finally:
-                repo.clear_lock()
+
+        if self.opts.get('fileserver_events', False) and stats:
+            event = salt.utils.event.get_event(
+                    'master',
+                    self.opts['sock_dir'],
+                    self.opts['transport'],
+                    opts=self.opts,
+                    listen=False)
+            event.fire_event(
+                {'backend': self.role,
+                 'remotes': dict(
+                     (repo_id, {'result': x['result'],
+                                'duration': round(x['duration'], 3)})
+                     for repo_id, x in six.iteritems(stats))},
+                tagify([self.role, 'fetch'], prefix='fileserver')
+            )
         return changed
 
     def lock(self, remote=None):
@@ -1887,6 +2184,8 @@ class GitBase(object):
                 fp_.write(serial.dumps(new_envs))
                 log.trace('Wrote env cache data to {0}'.format(self.env_cache))
 
+        self.write_file_index()
+
         # if there is a change, fire an event
         if self.opts.get('fileserver_events', False):
             event = salt.utils.event.get_event(
@@ -2165,6 +2464,124 @@ class GitFS(GitBase):
             ret.update(repo.envs())
         return sorted(ret)
 
+    def file_index(self, saltenv):
+        '''
+        Return the file index of the saltenv written by the last update, or
+        None if there is no index of it for the configured remotes
+        '''
+        index_path = self._file_index_path(saltenv)
+        try:
+            st_ = os.stat(index_path)
+        except OSError:
+            return None
+        stamp = (st_.st_ino, st_.st_size, st_.st_mtime)
+        if index_path in _FILE_INDEXES \
+                and _FILE_INDEXES[index_path][0] == stamp:
+            index = _FILE_INDEXES[index_path][1]
+        else:
+            try:
+                with salt.utils.fopen(index_path, 'rb') as fp_:
+                    index = salt.payload.Serial(self.opts).load(fp_)
+            except Exception:
+                return None
+            _FILE_INDEXES[index_path] = (stamp, index)
+        if index.get('hash_type') != self.opts['hash_type']:
+            return None
+        remotes = [[repo.id, repo.root, repo.mountpoint]
+                   for repo in self.remotes]
+        if [x[:3] for x in index.get('key', [])] != remotes:
+            # The remotes changed since the index was written
+            return None
+        return index
+
+    def _file_index_path(self, saltenv):
+        '''
+        Return the path of the file index of the saltenv
+        '''
+        return os.path.join(
+            self.index_cachedir,
+            '{0}.p'.format(saltenv.replace(os.path.sep, '_|-'))
+        )
+
+    def write_file_index(self):
+        '''
+        Write the file index of each environment, mapping the paths of the
+        files to the ID, size and hash of their blobs, along with the file,
+        dir and symlink lists. An index is only written again when the tree of
+        the environment changed in one of the remotes.
+        '''
+        if not os.path.isdir(self.index_cachedir):
+            try:
+                os.makedirs(self.index_cachedir)
+            except os.error:
+                log.error(
+                    'Unable to make cachedir {0}'.format(self.index_cachedir)
+                )
+                return
+        serial = salt.payload.Serial(self.opts)
+        hash_type = self.opts['hash_type']
+        current = set()
+        for saltenv in self.envs():
+            index_path = self._file_index_path(saltenv)
+            try:
+                key = [[repo.id, repo.root, repo.mountpoint,
+                        repo.get_tree_id(saltenv)]
+                       for repo in self.remotes]
+                try:
+                    with salt.utils.fopen(index_path, 'rb') as fp_:
+                        old_index = serial.load(fp_)
+                except (IOError, OSError):
+                    old_index = {}
+                if old_index.get('key') == key \
+                        and old_index.get('hash_type') == hash_type:
+                    current.add(os.path.basename(index_path))
+                    continue
+                # The size and hash of the blobs which did not change are
+                # taken from the previous index
+                known = {}
+                if old_index.get('hash_type') == hash_type:
+                    for blob in six.itervalues(old_index.get('blobs', {})):
+                        if blob:
+                            known[blob['blob']] = blob
+                index = {'key': key,
+                         'hash_type': hash_type,
+                         'blobs': {},
+                         'symlinks': {},
+                         'dirs': set()}
+                for repo in self.remotes:
+                    repo_files, repo_symlinks = \
+                        repo.file_index(saltenv, hash_type, known)
+                    # find_file serves a path from the first remote which has
+                    # it
+                    for file_path, blob in six.iteritems(repo_files):
+                        index['blobs'].setdefault(file_path, blob)
+                    index['symlinks'].update(repo_symlinks)
+                    index['dirs'].update(repo.dir_list(saltenv))
+                index['files'] = sorted(index['blobs'])
+                index['dirs'] = sorted(index['dirs'])
+                with salt.utils.atomicfile.atomic_open(index_path, 'wb') \
+                        as fp_:
+                    fp_.write(serial.dumps(index))
+            except Exception as exc:
+                log.error(
+                    'Exception \'{0}\' caught while writing the {1} file '
+                    'index of environment \'{2}\''.format(exc,
+                                                          self.role,
+                                                          saltenv),
+                    exc_info_on_loglevel=logging.DEBUG
+                )
+                continue
+            current.add(os.path.basename(index_path))
+            log.trace('Wrote file index to {0}'.format(index_path))
+        # Remove the indexes of the environments which are gone, or could not
+        # be indexed, so that their files are looked up in the remotes
+        for filename in os.listdir(self.index_cachedir):
+            if filename not in current:
+                try:
+                    os.remove(os.path.join(self.index_cachedir, filename))
+                except OSError:
+                    pass
+
     def find_file(self, path, tgt_env='base', **kwargs):  # pylint: disable=W0613
         '''
         Find the first file to match the path and ref, read the file out of git
@@ -2202,6 +2619,18 @@ class GitFS(GitBase):
                 os.remove(hashdir)
                 os.makedirs(hashdir)
 
+        index = self.file_index(tgt_env)
+        if index is not None and index['blobs'].get(path):
+            # The blob of the cached file is still the one in the index, there
+            # is no need to look the file up in the remotes
+            salt.fileserver.wait_lock(lk_fn, dest)
+            if os.path.isfile(blobshadest) and os.path.isfile(dest):
+                with salt.utils.fopen(blobshadest, 'r') as fp_:
+                    if fp_.read() == index['blobs'][path]['blob']:
+                        fnd['rel'] = path
+                        fnd['path'] = dest
+                        return fnd
+
         for repo in self.remotes:
             if repo.mountpoint \
                     and not path.startswith(repo.mountpoint + os.path.sep):
@@ -2298,6 +2727,10 @@ class GitFS(GitBase):
         ret = {'hash_type': self.opts['hash_type']}
         relpath = fnd['rel']
         path = fnd['path']
+        index = self.file_index(load['saltenv'])
+        if index is not None and index['blobs'].get(relpath):
+            ret['hsum'] = index['blobs'][relpath]['hsum']
+            return ret
         hashdest = os.path.join(self.hash_cachedir,
                                 load['saltenv'],
                                 '{0}.hash.{1}'.format(relpath,
@@ -2336,6 +2769,10 @@ class GitFS(GitBase):
                     )
                 )
                 return []
+        if load['saltenv'] in self.envs():
+            index = self.file_index(load['saltenv'])
+            if index is not None:
+                return index.get(form, {} if form == 'symlinks' else [])
         list_cache = os.path.join(
             self.file_list_cachedir,
             '{0}.p'.format(load['saltenv'].replace(os.path.sep, '_|-'))
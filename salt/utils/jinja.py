@@ -23,6 +23,7 @@ import yaml
 # Import salt libs
 import salt
 import salt.utils
+import salt.utils.atomicfile
 import salt.utils.url
 import salt.fileclient
 from salt.utils.odict import OrderedDict
@@ -30,6 +31,7 @@ from salt.utils.odict import OrderedDict
 log = logging.getLogger(__name__)
 
 __all__ = [
+    'SaltBytecodeCache',
     'SaltCacheLoader',
     'SerializerExtension'
 ]
@@ -144,6 +146,37 @@ class SaltCacheLoader(BaseLoader):
         raise TemplateNotFound(template)
 
 
+class SaltBytecodeCache(jinja2.FileSystemBytecodeCache):
+    '''
+    A jinja bytecode cache kept in a directory of the salt cachedir.
+    The compiled templates are shared by the processes of the daemon, so
+    they are written atomically, and a cache file which can not be read
+    or written only means compiling the template again.
+    '''
+    def load_bytecode(self, bucket):
+        try:
+            super(SaltBytecodeCache, self).load_bytecode(bucket)
+        except Exception as exc:
+            log.debug(
+                'Unable to load the jinja bytecode cache file {0}: {1}'.format(
+                    self._get_cache_filename(bucket), exc
+                )
+            )
+            bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        try:
+            with salt.utils.atomicfile.atomic_open(
+                    self._get_cache_filename(bucket), 'wb') as ifile:
+                bucket.write_bytecode(ifile)
+        except (IOError, OSError) as exc:
+            log.debug(
+                'Unable to write the jinja bytecode cache file {0}: {1}'.format(
+                    self._get_cache_filename(bucket), exc
+                )
+            )
+
+
 class PrintableDict(OrderedDict):
     '''
     Ensures that dict str() and repr() are YAML friendly.
@@ -12,18 +12,18 @@ from __future__ import absolute_import
 import os
 import logging
 import signal
-import tempfile
+import time
 from threading import Thread, Event
 
 # Import salt libs
+import salt.cache
 import salt.log
 import salt.client
 import salt.pillar
 import salt.utils
-import salt.utils.atomicfile
 import salt.utils.minions
 import salt.payload
-from salt.exceptions import SaltException
+from salt.exceptions import SaltException, SaltCacheError
 import salt.config
 from salt.utils.cache import CacheCli as cache_cli
 from salt.utils.process import MultiprocessingProcess
@@ -94,6 +94,7 @@ class MasterPillarUtil(object):
         else:
             self.opts = opts
         self.serial = salt.payload.Serial(self.opts)
+        self.cache = salt.cache.Cache(self.opts)
         self.tgt = tgt
         self.expr_form = expr_form
         self.saltenv = saltenv
@@ -118,18 +119,14 @@ class MasterPillarUtil(object):
             log.debug('Skipping cached mine data minion_data_cache'
                       'and enfore_mine_cache are both disabled.')
             return mine_data
-        mdir = os.path.join(self.opts['cachedir'], 'minions')
         try:
             for minion_id in minion_ids:
                 if not salt.utils.verify.valid_id(self.opts, minion_id):
                     continue
-                path = os.path.join(mdir, minion_id, 'mine.p')
-                if os.path.isfile(path):
-                    with salt.utils.fopen(path, 'rb') as fp_:
-                        mdata = self.serial.loads(fp_.read())
-                        if isinstance(mdata, dict):
-                            mine_data[minion_id] = mdata
-        except (OSError, IOError):
+                mdata = self.cache.fetch('minions/{0}'.format(minion_id), 'mine')
+                if isinstance(mdata, dict):
+                    mine_data[minion_id] = mdata
+        except SaltCacheError:
             return mine_data
         return mine_data
 
@@ -142,20 +139,18 @@ class MasterPillarUtil(object):
             log.debug('Skipping cached data because minion_data_cache is not '
                       'enabled.')
             return grains, pillars
-        mdir = os.path.join(self.opts['cachedir'], 'minions')
         try:
             for minion_id in minion_ids:
                 if not salt.utils.verify.valid_id(self.opts, minion_id):
                     continue
-                path = os.path.join(mdir, minion_id, 'data.p')
-                if os.path.isfile(path):
-                    with salt.utils.fopen(path, 'rb') as fp_:
-                        mdata = self.serial.loads(fp_.read())
-                        if mdata.get('grains', False):
-                            grains[minion_id] = mdata['grains']
-                        if mdata.get('pillar', False):
-                            pillars[minion_id] = mdata['pillar']
-        except (OSError, IOError):
+                mdata = self.cache.fetch('minions/{0}'.format(minion_id), 'data')
+                if not isinstance(mdata, dict):
+                    continue
+                if mdata.get('grains', False):
+                    grains[minion_id] = mdata['grains']
+                if mdata.get('pillar', False):
+                    pillars[minion_id] = mdata['pillar']
+        except SaltCacheError:
             return grains, pillars
         return grains, pillars
 
@@ -349,6 +344,11 @@ class MasterPillarUtil(object):
             return False
 
         minion_ids = self._tgt_to_list()
+        if clear_pillar and self.opts.get('pillar_cache', False):
+            # The pillar compiled for the minions goes too
+            pillar_cache = salt.pillar.PillarCache(self.opts)
+            for minion_id in minion_ids:
+                pillar_cache.clear(minion_id)
         log.debug('Clearing cached {0} data for: {1}'.format(
             ', '.join(clear_what),
             minion_ids))
@@ -360,54 +360,37 @@ class MasterPillarUtil(object):
         else:
             # Unless both clear_pillar and clear_grains are True, we need
             # to read in the pillar/grains data since they are both stored
-            # in the same file, 'data.p'
+            # under the same key, 'data'
             grains, pillars = self._get_cached_minion_data(*minion_ids)
         try:
             for minion_id in minion_ids:
                 if not salt.utils.verify.valid_id(self.opts, minion_id):
                     continue
-                cdir = os.path.join(self.opts['cachedir'], 'minions', minion_id)
-                if not os.path.isdir(cdir):
-                    # Cache dir for this minion does not exist. Nothing to do.
+                bank = 'minions/{0}'.format(minion_id)
+                if not self.cache.contains(bank):
+                    # Cache bank for this minion does not exist. Nothing to do.
                     continue
-                data_file = os.path.join(cdir, 'data.p')
-                mine_file = os.path.join(cdir, 'mine.p')
                 minion_pillar = pillars.pop(minion_id, False)
                 minion_grains = grains.pop(minion_id, False)
                 if ((clear_pillar and clear_grains) or
                     (clear_pillar and not minion_grains) or
                     (clear_grains and not minion_pillar)):
-                    # Not saving pillar or grains, so just delete the cache file
-                    os.remove(os.path.join(data_file))
+                    # Not saving pillar or grains, so just delete the cache key
+                    self.cache.flush(bank, 'data')
                 elif clear_pillar and minion_grains:
-                    tmpfh, tmpfname = tempfile.mkstemp(dir=cdir)
-                    os.close(tmpfh)
-                    with salt.utils.fopen(tmpfname, 'w+b') as fp_:
-                        fp_.write(self.serial.dumps({'grains': minion_grains}))
-                    salt.utils.atomicfile.atomic_rename(tmpfname, data_file)
+                    self.cache.store(bank, 'data', {'grains': minion_grains})
                 elif clear_grains and minion_pillar:
-                    tmpfh, tmpfname = tempfile.mkstemp(dir=cdir)
-                    os.close(tmpfh)
-                    with salt.utils.fopen(tmpfname, 'w+b') as fp_:
-                        fp_.write(self.serial.dumps({'pillar': minion_pillar}))
-                    salt.utils.atomicfile.atomic_rename(tmpfname, data_file)
+                    self.cache.store(bank, 'data', {'pillar': minion_pillar})
                 if clear_mine:
-                    # Delete the whole mine file
-                    os.remove(os.path.join(mine_file))
+                    # Delete the whole mine data
+                    self.cache.flush(bank, 'mine')
                 elif clear_mine_func is not None:
-                    # Delete a specific function from the mine file
-                    with salt.utils.fopen(mine_file, 'rb') as fp_:
-                        mine_data = self.serial.loads(fp_.read())
+                    # Delete a specific function from the mine data
+                    mine_data = self.cache.fetch(bank, 'mine')
                     if isinstance(mine_data, dict):
                         if mine_data.pop(clear_mine_func, False):
-                            tmpfh, tmpfname = tempfile.mkstemp(dir=cdir)
-                            os.close(tmpfh)
-                            with salt.utils.fopen(tmpfname, 'w+b') as fp_:
-                                fp_.write(self.serial.dumps(mine_data))
-                            salt.utils.atomicfile.atomic_rename(
-                                tmpfname,
-                                mine_file)
-        except (OSError, IOError):
+                            self.cache.store(bank, 'mine', mine_data)
+        except SaltCacheError:
             return True
         return True
 
@@ -688,6 +671,209 @@ class ConnectedCache(MultiprocessingProcess):
         log.debug('ConCache Shutting down')
 
 
+class MinionDataCache(MultiprocessingProcess):
+    '''
+    Keeps the cached grains and pillar data of all minions resident in
+    memory and answers grain and pillar target lookups from the MWorkers
+    using an inverted index, instead of every lookup loading the data.p
+    file of each minion.
+
+    The MWorkers push freshly compiled minion data to the cache, the
+    minion data cache directory is rescanned on an interval to pick up
+    changes made by other processes, like removed keys or cleared caches.
+    '''
+
+    def __init__(self, opts, log_queue=None):
+        '''
+        Set up the index of the minion data
+        '''
+        super(MinionDataCache, self).__init__(log_queue=log_queue)
+        log.debug('MinionDataCache initializing...')
+        self.opts = opts
+        self.serial = salt.payload.Serial(self.opts.get('serial', ''))
+        self.cache = salt.cache.Cache(self.opts)
+        self.interval = self.opts.get('minion_data_cache_index_interval', 60)
+        self.index = salt.utils.minions.MinionDataIndex()
+        # update times of the loaded data, to only reload changed minions
+        self.mtimes = {}
+
+        self.cache_sock = os.path.join(self.opts['sock_dir'], 'mdata_cache.ipc')
+        self.update_sock = os.path.join(self.opts['sock_dir'], 'mdata_upd.ipc')
+        self.cleanup()
+        self.running = True
+
+    # __setstate__ and __getstate__ are only used on Windows.
+    # We do this so that __init__ will be invoked on Windows in the child
+    # process so that a register_after_fork() equivalent will work on Windows.
+    def __setstate__(self, state):
+        self._is_child = True
+        self.__init__(state['opts'], log_queue=state['log_queue'])
+
+    def __getstate__(self):
+        return {'opts': self.opts,
+                'log_queue': self.log_queue}
+
+    def signal_handler(self, sig, frame):
+        '''
+        handle signals and shutdown
+        '''
+        self.stop()
+
+    def cleanup(self):
+        '''
+        remove sockets on shutdown
+        '''
+        log.debug('MinionDataCache cleaning up')
+        for sock in (self.cache_sock, self.update_sock):
+            if os.path.exists(sock):
+                os.remove(sock)
+
+    def secure(self):
+        '''
+        secure the sockets for root-only access
+        '''
+        log.debug('MinionDataCache securing sockets')
+        for sock in (self.cache_sock, self.update_sock):
+            if os.path.exists(sock):
+                os.chmod(sock, 0o600)
+
+    def stop(self):
+        '''
+        shutdown cache process
+        '''
+        self.cleanup()
+        self.running = False
+
+    def refresh(self):
+        '''
+        Sync the index with the minion data cache, only the data of the
+        minions which changed since the last refresh is loaded
+        '''
+        try:
+            minions = self.cache.list('minions')
+        except SaltCacheError as exc:
+            log.error('MinionDataCache failed to list minions: {0}'.format(exc))
+            return
+        found = set()
+        changed = {}
+        for id_ in minions:
+            mtime = self.cache.updated('minions/{0}'.format(id_), 'data')
+            if mtime is None:
+                continue
+            found.add(id_)
+            if self.mtimes.get(id_) != mtime or id_ not in self.index:
+                changed['minions/{0}'.format(id_)] = (id_, mtime)
+        try:
+            mdata = self.cache.fetch_many(changed, 'data')
+        except SaltCacheError as exc:
+            log.error('MinionDataCache failed to load minion data: {0}'.format(exc))
+            mdata = {}
+        for bank, data in six.iteritems(mdata):
+            id_, mtime = changed[bank]
+            self.index.update(id_, data)
+            self.mtimes[id_] = mtime
+        for id_ in self.index.ids().difference(found):
+            self.index.remove(id_)
+            self.mtimes.pop(id_, None)
+        log.debug('MinionDataCache {0} minions in cache'.format(len(self.index)))
+
+    def update(self, data):
+        '''
+        Apply an update pushed by an MWorker
+        '''
+        if not isinstance(data, dict) or 'id' not in data:
+            log.error('MinionDataCache got malformed update')
+            return
+        id_ = data.pop('id')
+        self.index.update(id_, data)
+        try:
+            self.mtimes[id_] = self.cache.updated('minions/{0}'.format(id_), 'data')
+        except SaltCacheError:
+            # Reload the data on the next refresh
+            self.mtimes.pop(id_, None)
+
+    def handle_request(self, msg):
+        '''
+        Answer a request from a MinionDataCacheCli
+        '''
+        if not isinstance(msg, dict) or msg.get('cmd') != 'match':
+            return None
+        try:
+            matched = self.index.match(msg['search_type'],
+                                       msg['expr'],
+                                       delimiter=msg['delimiter'],
+                                       regex_match=msg['regex_match'],
+                                       exact_match=msg['exact_match'])
+        except Exception as exc:
+            log.error('MinionDataCache failed to match {0}: {1}'.format(msg, exc))
+            return None
+        if msg['greedy']:
+            return list(self.index.ids().difference(matched))
+        return list(matched)
+
+    def run(self):
+        '''
+        Main loop of the MinionDataCache, applies updates and answers
+        requests from the MWorkers
+        '''
+        salt.utils.appendproctitle('MinionDataCache')
+        # Load the whole cache before accepting requests, clients fall back
+        # to reading the data from disk until the cache answers
+        self.refresh()
+        last = time.time()
+
+        context = zmq.Context()
+        # the socket for incoming cache requests
+        creq_in = context.socket(zmq.REP)
+        creq_in.setsockopt(zmq.LINGER, 100)
+        creq_in.bind('ipc://' + self.cache_sock)
+
+        # the socket for incoming cache-updates from workers
+        cupd_in = context.socket(zmq.SUB)
+        cupd_in.setsockopt(zmq.SUBSCRIBE, b'')
+        cupd_in.setsockopt(zmq.LINGER, 100)
+        cupd_in.bind('ipc://' + self.update_sock)
+
+        poller = zmq.Poller()
+        poller.register(creq_in, zmq.POLLIN)
+        poller.register(cupd_in, zmq.POLLIN)
+
+        signal.signal(signal.SIGINT, self.signal_handler)
+        self.secure()
+        log.info('MinionDataCache started')
+
+        while self.running:
+            try:
+                socks = dict(poller.poll(1000))
+            except KeyboardInterrupt:
+                self.stop()
+                break
+            except zmq.ZMQError as zmq_err:
+                log.error('MinionDataCache ZeroMQ-Error occurred')
+                log.exception(zmq_err)
+                self.stop()
+                break
+
+            # apply all pending updates before answering requests
+            while socks.get(cupd_in) == zmq.POLLIN:
+                self.update(self.serial.loads(cupd_in.recv()))
+                if not cupd_in.poll(0):
+                    break
+
+            if socks.get(creq_in) == zmq.POLLIN:
+                msg = self.serial.loads(creq_in.recv())
+                creq_in.send(self.serial.dumps(self.handle_request(msg)))
+
+            if time.time() - last >= self.interval:
+                self.refresh()
+                last = time.time()
+
+        creq_in.close()
+        cupd_in.close()
+        context.term()
+        log.debug('MinionDataCache Shutting down')
+
+
 def ping_all_connected_minions(opts):
     client = salt.client.LocalClient()
     ckminions = salt.utils.minions.CkMinions(opts)
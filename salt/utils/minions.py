@@ -12,10 +12,12 @@ import re
 import logging
 
 # Import salt libs
+import salt.cache
 import salt.payload
 import salt.utils
+import salt.utils.cache
 from salt.defaults import DEFAULT_TARGET_DELIM
-from salt.exceptions import CommandExecutionError
+from salt.exceptions import CommandExecutionError, SaltCacheError
 
 # Import 3rd-party libs
 import salt.ext.six as six
@@ -68,30 +70,26 @@ def get_minion_data(minion, opts):
     Return value is a tuple of the minion ID, grains, and pillar
     '''
     if opts.get('minion_data_cache', False):
-        serial = salt.payload.Serial(opts)
-        cdir = os.path.join(opts['cachedir'], 'minions')
-        if not os.path.isdir(cdir):
-            return minion if minion else None, None, None
-        minions = os.listdir(cdir)
+        cache = salt.cache.Cache(opts)
         if minion is None:
             # If no minion specified, take first one with valid grains
-            for id_ in minions:
-                datap = os.path.join(cdir, id_, 'data.p')
+            for id_ in cache.list('minions'):
                 try:
-                    with salt.utils.fopen(datap, 'rb') as fp_:
-                        miniondata = serial.load(fp_)
-                except (IOError, OSError):
+                    miniondata = cache.fetch('minions/{0}'.format(id_), 'data')
+                except SaltCacheError:
+                    continue
+                if miniondata is None:
                     continue
                 grains = miniondata.get('grains')
                 pillar = miniondata.get('pillar')
                 return id_, grains, pillar
         else:
             # Search for specific minion
-            datap = os.path.join(cdir, minion, 'data.p')
             try:
-                with salt.utils.fopen(datap, 'rb') as fp_:
-                    miniondata = serial.load(fp_)
-            except (IOError, OSError):
+                miniondata = cache.fetch('minions/{0}'.format(minion), 'data')
+            except SaltCacheError:
+                miniondata = None
+            if miniondata is None:
                 return minion, None, None
             grains = miniondata.get('grains')
             pillar = miniondata.get('pillar')
@@ -161,6 +159,178 @@ def nodegroup_comp(nodegroup, nodegroups, skip=None, first_call=True):
         return nodegroups[nodegroup]
 
 
+class MinionDataIndex(object):
+    '''
+    Keep the cached grains and pillar data of the minions resident in memory
+    together with an inverted index of the values found in that data.
+
+    For every key path (a tuple of dict keys) the index keeps the distinct
+    values found at that path and the set of minions holding each value, so
+    that a grain or pillar match only has to look at the distinct values of
+    a key instead of at the data of every minion. Paths which hold dicts or
+    lists can be matched by ``salt.utils.subdict_match`` in more ways than by
+    value, the minions holding those are verified against the resident data.
+    '''
+    search_types = ('grains', 'pillar')
+
+    def __init__(self):
+        self.data = {}
+        # {search_type: {path: {value: set(minion_ids)}}}
+        self.values = {}
+        # {search_type: {path: set(minion_ids)}}, paths holding a dict or a
+        # list with nested data, matched by subdict_match's dict matching
+        self.nested = {}
+        # {search_type: {path: set(minion_ids)}}, paths holding a list, which
+        # traverse_dict_and_list can descend into by index or embedded dict
+        self.lists = {}
+        for search_type in self.search_types:
+            self.values[search_type] = {}
+            self.nested[search_type] = {}
+            self.lists[search_type] = {}
+
+    def __contains__(self, minion_id):
+        return minion_id in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def ids(self):
+        '''
+        Return the set of minion ids held in the index
+        '''
+        return set(self.data)
+
+    @staticmethod
+    def _normalize(value):
+        '''
+        Normalize a value the same way subdict_match does before comparing
+        '''
+        try:
+            return str(value).lower()
+        except UnicodeError:
+            return six.text_type(value).lower()
+
+    def _entries(self, data, path=()):
+        '''
+        Walk the data of a minion and yield ``(path, kind, value)`` tuples,
+        where kind is either ``value``, ``nested`` or ``lists``
+        '''
+        if not isinstance(data, dict):
+            return
+        for key, val in six.iteritems(data):
+            if not isinstance(key, six.string_types):
+                # traverse_dict_and_list can only reach string keys
+                continue
+            key_path = path + (key,)
+            if isinstance(val, dict):
+                yield key_path, 'nested', None
+                for entry in self._entries(val, key_path):
+                    yield entry
+            elif isinstance(val, list):
+                yield key_path, 'lists', None
+                for item in val:
+                    if isinstance(item, (dict, list)):
+                        yield key_path, 'nested', None
+                    else:
+                        yield key_path, 'value', self._normalize(item)
+            else:
+                yield key_path, 'value', self._normalize(val)
+
+    def update(self, minion_id, data):
+        '''
+        Add or replace the grains and pillar data of a minion
+        '''
+        self.remove(minion_id)
+        if not isinstance(data, dict):
+            return
+        self.data[minion_id] = data
+        for search_type in self.search_types:
+            values = self.values[search_type]
+            for path, kind, value in self._entries(data.get(search_type)):
+                if kind == 'value':
+                    values.setdefault(path, {}).setdefault(value, set()).add(minion_id)
+                else:
+                    getattr(self, kind)[search_type].setdefault(path, set()).add(minion_id)
+
+    def remove(self, minion_id):
+        '''
+        Drop a minion from the index
+        '''
+        data = self.data.pop(minion_id, None)
+        if data is None:
+            return
+        for search_type in self.search_types:
+            for path, kind, value in self._entries(data.get(search_type)):
+                if kind == 'value':
+                    index = self.values[search_type].get(path, {})
+                    minions = index.get(value)
+                    if minions is None:
+                        continue
+                    minions.discard(minion_id)
+                    if not minions:
+                        del index[value]
+                    if not index:
+                        self.values[search_type].pop(path, None)
+                else:
+                    index = getattr(self, kind)[search_type]
+                    minions = index.get(path)
+                    if minions is None:
+                        continue
+                    minions.discard(minion_id)
+                    if not minions:
+                        del index[path]
+
+    def match(self,
+              search_type,
+              expr,
+              delimiter=DEFAULT_TARGET_DELIM,
+              regex_match=False,
+              exact_match=False):
+        '''
+        Return the set of minion ids whose ``search_type`` data matches
+        ``expr``, with the same semantics as ``salt.utils.subdict_match``
+        '''
+        values = self.values[search_type]
+        definite = set()
+        maybe = set()
+        splits = expr.split(delimiter)
+        for idx in range(1, len(splits)):
+            path = tuple(splits[:idx])
+            pattern = delimiter.join(splits[idx:]).lower()
+            # Minions holding a list on the way to the path can still match
+            # through a list index or an embedded dict
+            for depth in range(1, idx):
+                maybe.update(self.lists[search_type].get(path[:depth], ()))
+            maybe.update(self.nested[search_type].get(path, ()))
+            index = values.get(path)
+            if not index:
+                continue
+            if exact_match:
+                definite.update(index.get(pattern, ()))
+                continue
+            if regex_match:
+                try:
+                    regex = re.compile(pattern)
+                except re.error:
+                    log.error('Invalid regex \'{0}\' in match'.format(pattern))
+                    return set()
+                matched = [val for val in index if regex.match(val)]
+            elif not any(char in pattern for char in '*?['):
+                matched = [pattern] if pattern in index else []
+            else:
+                matched = fnmatch.filter(index, pattern)
+            for val in matched:
+                definite.update(index[val])
+        for minion_id in maybe.difference(definite):
+            if salt.utils.subdict_match(self.data[minion_id].get(search_type),
+                                        expr,
+                                        delimiter=delimiter,
+                                        regex_match=regex_match,
+                                        exact_match=exact_match):
+                definite.add(minion_id)
+        return definite
+
+
 class CkMinions(object):
     '''
     Used to check what minions should respond from a target
@@ -178,6 +348,32 @@ class CkMinions(object):
             self.acc = 'minions'
         else:
             self.acc = 'accepted'
+        self._data_cache_cli = None
+        # None until first used, False if the connected registry is disabled
+        self.registry = None
+        self.cache = salt.cache.Cache(opts)
+
+    def _get_data_cache_cli(self):
+        '''
+        Return the client of the MinionDataCache, connect it on first use
+        '''
+        if self._data_cache_cli is None:
+            self._data_cache_cli = salt.utils.cache.MinionDataCacheCli(self.opts)
+        return self._data_cache_cli
+
+    def _iter_cached_data(self, minion_ids, key='data'):
+        '''
+        Yield ``(minion_id, data)`` for the passed minions, the cached data is
+        read in batches. The data is None for minions which have no data
+        cached under the key.
+        '''
+        minion_ids = list(minion_ids)
+        for idx in range(0, len(minion_ids), 500):
+            batch = minion_ids[idx:idx + 500]
+            cached = self.cache.fetch_many(
+                ['minions/{0}'.format(id_) for id_ in batch], key)
+            for id_ in batch:
+                yield id_, cached.get('minions/{0}'.format(id_))
 
     def _check_glob_minions(self, expr, greedy):  # pylint: disable=unused-argument
         '''
@@ -231,6 +427,22 @@ class CkMinions(object):
         '''
         cache_enabled = self.opts.get('minion_data_cache', False)
 
+        if (cache_enabled and salt.utils.cache.HAS_ZMQ
+                and self.opts.get('minion_data_cache_index', False)):
+            indexed = self._get_data_cache_cli().match(
+                search_type,
+                expr,
+                delimiter,
+                greedy,
+                regex_match=regex_match,
+                exact_match=exact_match)
+            if indexed is not None:
+                if not greedy:
+                    return indexed
+                return list(set(self._all_minions()).difference(indexed))
+            log.warning('The minion data cache did not answer, loading the '
+                        'minion data from disk')
+
         if greedy:
             mlist = []
             for fn_ in salt.utils.isorted(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
@@ -238,31 +450,24 @@ class CkMinions(object):
                     mlist.append(fn_)
             minions = set(mlist)
         elif cache_enabled:
-            minions = os.listdir(os.path.join(self.opts['cachedir'], 'minions'))
+            minions = set(self.cache.list('minions'))
         else:
             return list()
 
         if cache_enabled:
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
-            for id_ in os.listdir(cdir):
-                if not greedy and id_ not in minions:
-                    continue
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
-                    if not greedy and id_ in minions:
-                        minions.remove(id_)
+            cached = self.cache.list('minions') if greedy else list(minions)
+            for id_, mdata in self._iter_cached_data(cached):
+                if mdata is None:
+                    if not greedy:
+                        minions.discard(id_)
                     continue
-                search_results = self.serial.load(
-                    salt.utils.fopen(datap, 'rb')
-                ).get(search_type)
+                search_results = mdata.get(search_type)
                 if not salt.utils.subdict_match(search_results,
                                                 expr,
                                                 delimiter=delimiter,
                                                 regex_match=regex_match,
-                                                exact_match=exact_match) and id_ in minions:
-                    minions.remove(id_)
+                                                exact_match=exact_match):
+                    minions.discard(id_)
         return list(minions)
 
     def _check_grain_minions(self, expr, delimiter, greedy):
@@ -320,27 +525,18 @@ class CkMinions(object):
                     mlist.append(fn_)
             minions = set(mlist)
         elif cache_enabled:
-            minions = os.listdir(os.path.join(self.opts['cachedir'], 'minions'))
+            minions = set(self.cache.list('minions'))
         else:
             return list()
 
         if cache_enabled:
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
-                return list(minions)
-            for id_ in os.listdir(cdir):
-                if not greedy and id_ not in minions:
-                    continue
-                datap = os.path.join(cdir, id_, 'data.p')
-                if not os.path.isfile(datap):
-                    if not greedy and id_ in minions:
-                        minions.remove(id_)
-                    continue
-                try:
-                    with salt.utils.fopen(datap, 'rb') as fp_:
-                        grains = self.serial.load(fp_).get('grains')
-                except (IOError, OSError):
+            cached = self.cache.list('minions') if greedy else list(minions)
+            for id_, mdata in self._iter_cached_data(cached):
+                if mdata is None:
+                    if not greedy:
+                        minions.discard(id_)
                     continue
+                grains = mdata.get('grains')
 
                 match = True
                 tgt = expr
@@ -363,8 +559,8 @@ class CkMinions(object):
                     except:  # pylint: disable=bare-except
                         log.error('Invalid IP/CIDR target {0}"'.format(tgt))
 
-                if not match and id_ in minions:
-                    minions.remove(id_)
+                if not match:
+                    minions.discard(id_)
 
         return list(minions)
 
@@ -393,7 +589,7 @@ class CkMinions(object):
                         mlist.append(fn_)
                 return mlist
             elif cache_enabled:
-                return os.listdir(os.path.join(self.opts['cachedir'], 'minions'))
+                return self.cache.list('minions')
             else:
                 return list()
 
@@ -557,10 +753,26 @@ class CkMinions(object):
         '''
         Return a set of all connected minion ids, optionally within a subset
         '''
+        if not show_ipv4:
+            if self.registry is None:
+                self.registry = salt.utils.cache.get_connected_registry(self.opts) or False
+            if self.registry:
+                connected = self.registry.connected()
+                if connected is not None:
+                    if subset:
+                        connected.intersection_update(subset)
+                    return connected
+        return self.scan_connected_ids(subset=subset, show_ipv4=show_ipv4)
+
+    def scan_connected_ids(self, subset=None, show_ipv4=False):
+        '''
+        Return a set of the minion ids whose cached ipv4 grains match the
+        addresses connected to the publish port, optionally within a subset
+        '''
         minions = set()
         if self.opts.get('minion_data_cache', False):
-            cdir = os.path.join(self.opts['cachedir'], 'minions')
-            if not os.path.isdir(cdir):
+            search = subset or self.cache.list('minions')
+            if not search:
                 return minions
             addrs = salt.utils.network.local_port_tcp(int(self.opts['publish_port']))
             if '127.0.0.1' in addrs or '0.0.0.0' in addrs:
@@ -568,16 +780,10 @@ class CkMinions(object):
                 addrs.discard('127.0.0.1')
                 addrs.discard('0.0.0.0')
                 addrs.update(set(salt.utils.network.ip_addrs()))
-            if subset:
-                search = subset
-            else:
-                search = os.listdir(cdir)
-            for id_ in search:
-                datap = os.path.join(cdir, id_, 'data.p')
+            for id_, mdata in self._iter_cached_data(search):
                 try:
-                    with salt.utils.fopen(datap, 'rb') as fp_:
-                        grains = self.serial.load(fp_).get('grains', {})
-                except (AttributeError, IOError, OSError):
+                    grains = mdata.get('grains', {})
+                except AttributeError:
                     continue
                 for ipv4 in grains.get('ipv4', []):
                     if ipv4 == '127.0.0.1' or ipv4 == '0.0.0.0':
@@ -941,22 +1147,18 @@ def mine_get(tgt, fun, tgt_type='glob', opts=None):
     function to look up and the target type
     '''
     ret = {}
-    serial = salt.payload.Serial(opts)
     checker = salt.utils.minions.CkMinions(opts)
     minions = checker.check_minions(
             tgt,
             tgt_type)
-    for minion in minions:
-        mine = os.path.join(
-                opts['cachedir'],
-                'minions',
-                minion,
-                'mine.p')
-        try:
-            with salt.utils.fopen(mine, 'rb') as fp_:
-                fdata = serial.load(fp_).get(fun)
-                if fdata:
-                    ret[minion] = fdata
-        except Exception:
-            continue
+    try:
+        for minion, mdata in checker._iter_cached_data(minions, 'mine'):
+            try:
+                fdata = mdata.get(fun)
+            except AttributeError:
+                continue
+            if fdata:
+                ret[minion] = fdata
+    except SaltCacheError as exc:
+        log.error('Unable to read the mine data: {0}'.format(exc))
     return ret
@@ -4,8 +4,11 @@ from __future__ import absolute_import
 # Import python libs
 import fnmatch
 import glob
+import os
+import re
 import signal
 import logging
+import threading
 
 import yaml
 
@@ -21,6 +24,69 @@ from salt.ext.six import string_types, iterkeys
 from salt._compat import string_types
 log = logging.getLogger(__name__)
 
+GLOB_CHARS = re.compile(r'[*?[]')
+
+
+class ReactorDispatch(object):
+    '''
+    The reactor map compiled to look up the reactors of an event tag without
+    matching the tag against every glob in the map.
+
+    Tags without glob characters are looked up in a dict, globs which only
+    end in a ``*`` by the prefixes of the tag, and the tag is only matched
+    against each of the remaining globs if it matches all of them combined
+    into one regular expression.
+    '''
+    def __init__(self, react_map):
+        self.tags = []
+        self.exact = {}
+        self.prefixes = {}
+        self.globs = []
+        for index, ropt in enumerate(react_map):
+            if not isinstance(ropt, dict):
+                continue
+            if len(ropt) != 1:
+                continue
+            key = next(iterkeys(ropt))
+            if not isinstance(key, string_types):
+                continue
+            val = ropt[key]
+            if isinstance(val, string_types):
+                val = [val]
+            elif not isinstance(val, list):
+                continue
+            entry = (index, val)
+            self.tags.append(key)
+            if not GLOB_CHARS.search(key):
+                self.exact.setdefault(key, []).append(entry)
+            elif key.endswith('*') and not GLOB_CHARS.search(key[:-1]):
+                self.prefixes.setdefault(key[:-1], []).append(entry)
+            else:
+                self.globs.append((key, entry))
+        self.prefix_lengths = sorted(set(len(prefix) for prefix in self.prefixes))
+        if self.globs:
+            self.globs_regex = re.compile('|'.join(
+                '(?:{0})'.format(fnmatch.translate(key)) for key, _ in self.globs))
+        else:
+            self.globs_regex = None
+
+    def __call__(self, tag):
+        '''
+        Return the reactors for the tag, in the order of the reactor map
+        '''
+        matches = list(self.exact.get(tag, ()))
+        for length in self.prefix_lengths:
+            if length > len(tag):
+                break
+            matches.extend(self.prefixes.get(tag[:length], ()))
+        if self.globs_regex is not None and self.globs_regex.match(tag):
+            matches.extend(entry for key, entry in self.globs
+                           if fnmatch.fnmatch(tag, key))
+        reactors = []
+        for _, val in sorted(matches, key=lambda entry: entry[0]):
+            reactors.extend(val)
+        return reactors
+
 
 class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
     '''
@@ -36,6 +102,12 @@ class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
         local_minion_opts['file_client'] = 'local'
         self.minion = salt.minion.MasterMinion(local_minion_opts)
         salt.state.Compiler.__init__(self, opts, self.minion.rend)
+        self.dispatch = None
+        self.dispatch_mtime = None
+        # The compiled reactor map the tag filter was set from
+        self.filter_dispatch = None
+        # The compiled Jinja of the reactor files
+        self.template_cache = {}
 
     # We need __setstate__ and __getstate__ to avoid pickling errors since
     # 'self.rend' (from salt.state.Compiler) contains a function reference
@@ -77,7 +149,8 @@ class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
                 res = self.render_template(
                     fn_,
                     tag=tag,
-                    data=data)
+                    data=data,
+                    jinja_cache=self.template_cache)
 
                 # for #20841, inject the sls name here since verify_high()
                 # assumes it exists in case there are any errors
@@ -89,44 +162,56 @@ class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
                 log.error('Failed to render "{0}": '.format(fn_), exc_info=True)
         return react
 
+    def read_reactor_map(self):
+        '''
+        Read the reactor map from the file the reactor option names
+        '''
+        try:
+            with salt.utils.fopen(self.opts['reactor']) as fp_:
+                react_map = yaml.safe_load(fp_.read())
+        except (OSError, IOError):
+            log.error(
+                'Failed to read reactor map: "{0}"'.format(
+                    self.opts['reactor']
+                    )
+                )
+            return []
+        except Exception:
+            log.error(
+                'Failed to parse YAML in reactor map: "{0}"'.format(
+                    self.opts['reactor']
+                    )
+                )
+            return []
+        if not isinstance(react_map, list):
+            return []
+        return react_map
+
+    def get_dispatch(self):
+        '''
+        Return the compiled reactor map, compiling it again if the reactor
+        map file changed since
+        '''
+        if isinstance(self.opts['reactor'], string_types):
+            try:
+                mtime = os.path.getmtime(self.opts['reactor'])
+            except OSError:
+                mtime = None
+            if self.dispatch is None or mtime != self.dispatch_mtime:
+                log.debug('Compiling reactor map {0}'.format(self.opts['reactor']))
+                self.dispatch = ReactorDispatch(self.read_reactor_map())
+                self.dispatch_mtime = mtime
+        elif self.dispatch is None:
+            self.dispatch = ReactorDispatch(self.opts['reactor'])
+        return self.dispatch
+
     def list_reactors(self, tag):
         '''
         Take in the tag from an event and return a list of the reactors to
         process
         '''
         log.debug('Gathering reactors for tag {0}'.format(tag))
-        reactors = []
-        if isinstance(self.opts['reactor'], string_types):
-            try:
-                with salt.utils.fopen(self.opts['reactor']) as fp_:
-                    react_map = yaml.safe_load(fp_.read())
-            except (OSError, IOError):
-                log.error(
-                    'Failed to read reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
-            except Exception:
-                log.error(
-                    'Failed to parse YAML in reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
-        else:
-            react_map = self.opts['reactor']
-        for ropt in react_map:
-            if not isinstance(ropt, dict):
-                continue
-            if len(ropt) != 1:
-                continue
-            key = next(iterkeys(ropt))
-            val = ropt[key]
-            if fnmatch.fnmatch(tag, key):
-                if isinstance(val, string_types):
-                    reactors.append(val)
-                elif isinstance(val, list):
-                    reactors.extend(val)
-        return reactors
+        return self.get_dispatch()(tag)
 
     def list_all(self):
         '''
@@ -134,21 +219,7 @@ class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
         '''
         if isinstance(self.minion.opts['reactor'], string_types):
             log.debug('Reading reactors from yaml {0}'.format(self.opts['reactor']))
-            try:
-                with salt.utils.fopen(self.opts['reactor']) as fp_:
-                    react_map = yaml.safe_load(fp_.read())
-            except (OSError, IOError):
-                log.error(
-                    'Failed to read reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
-            except Exception:
-                log.error(
-                    'Failed to parse YAML in reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
+            react_map = self.read_reactor_map()
         else:
             log.debug('Not reading reactors from yaml')
             react_map = self.minion.opts['reactor']
@@ -165,6 +236,7 @@ class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
                 return {'status': False, 'comment': 'Reactor already exists.'}
 
         self.minion.opts['reactor'].append({tag: reaction})
+        self.dispatch = None
         return {'status': True, 'comment': 'Reactor added.'}
 
     def delete_reactor(self, tag):
@@ -176,10 +248,25 @@ class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
             _tag = next(iterkeys(reactor))
             if _tag == tag:
                 self.minion.opts['reactor'].remove(reactor)
+                self.dispatch = None
                 return {'status': True, 'comment': 'Reactor deleted.'}
 
         return {'status': False, 'comment': 'Reactor does not exists.'}
 
+    def set_tag_filter(self):
+        '''
+        Only have the event publisher send the reactor the events it has
+        reactors for, setting the filter again whenever the reactor map was
+        compiled again
+        '''
+        dispatch = self.get_dispatch()
+        if dispatch is self.filter_dispatch:
+            return
+        self.filter_dispatch = dispatch
+        tags = ['*salt/reactors/manage/*']
+        tags.extend(dispatch.tags)
+        self.event.set_tag_filter(tags, 'fnmatch')
+
     def reactions(self, tag, data, reactors):
         '''
         Render a list of reactor files and returns a reaction struct
@@ -226,21 +313,31 @@ class Reactor(salt.utils.process.MultiprocessingProcess, salt.state.Compiler):
                 self.opts['transport'],
                 opts=self.opts,
                 listen=True)
+        self.set_tag_filter()
         self.wrap = ReactWrap(self.opts)
 
-        for data in self.event.iter_events(full=True):
+        while True:
+            data = self.event.get_event(full=True)
+            # A reactor map file is read again once it changed, check it
+            # while no event comes in as well, since the events of the new
+            # reactors are not sent before the filter is set again
+            self.set_tag_filter()
+            if data is None:
+                continue
             # skip all events fired by ourselves
             if data['data'].get('user') == self.wrap.event_user:
                 continue
             if data['tag'].endswith('salt/reactors/manage/add'):
                 _data = data['data']
                 res = self.add_reactor(_data['event'], _data['reactors'])
+                self.set_tag_filter()
                 self.event.fire_event({'reactors': self.list_all(),
                                        'result': res},
                                       'salt/reactors/manage/add-complete')
             elif data['tag'].endswith('salt/reactors/manage/delete'):
                 _data = data['data']
                 res = self.delete_reactor(_data['event'])
+                self.set_tag_filter()
                 self.event.fire_event({'reactors': self.list_all(),
                                        'result': res},
                                       'salt/reactors/manage/delete-complete')
@@ -273,7 +370,7 @@ class ReactWrap(object):
             ReactWrap.client_cache = salt.utils.cache.CacheDict(opts['reactor_refresh_interval'])
 
         self.pool = salt.utils.process.ThreadPool(
-            self.opts['reactor_worker_threads'],  # number of workers for runner/wheel
+            self.opts['reactor_worker_threads'],  # number of workers for local/runner/wheel
             queue_size=self.opts['reactor_worker_hwm']  # queue size for those workers
         )
 
@@ -300,21 +397,36 @@ class ReactWrap(object):
                     exc_info=True
                     )
 
+    def fire_async(self, func, args=None, kwargs=None):
+        '''
+        Run the reaction in the worker threads, unless their queue is full
+        '''
+        if not self.pool.fire_async(func, args=args, kwargs=kwargs):
+            log.error(
+                'Reactor worker queue is full, dropping the reaction. '
+                'Increase reactor_worker_hwm or reactor_worker_threads.'
+            )
+
     def local(self, *args, **kwargs):
         '''
         Wrap LocalClient for running :ref:`execution modules <all-salt.modules>`
         '''
-        if 'local' not in self.client_cache:
-            self.client_cache['local'] = salt.client.LocalClient(self.opts['conf_file'])
+        self.fire_async(self._local, args=args, kwargs=kwargs)
+
+    cmd = local
+
+    def _local(self, *args, **kwargs):
+        # A LocalClient can not be shared by the worker threads
+        key = 'local_{0}'.format(threading.current_thread().ident)
+        if key not in self.client_cache:
+            self.client_cache[key] = salt.client.LocalClient(self.opts['conf_file'])
         try:
-            self.client_cache['local'].cmd_async(*args, **kwargs)
+            self.client_cache[key].cmd_async(*args, **kwargs)
         except SystemExit:
             log.warning('Attempt to exit reactor. Ignored.')
         except Exception as exc:
             log.warning('Exception caught by reactor: {0}'.format(exc))
 
-    cmd = local
-
     def runner(self, fun, **kwargs):
         '''
         Wrap RunnerClient for executing :ref:`runner modules <all-salt.runners>`
@@ -322,7 +434,7 @@ class ReactWrap(object):
         if 'runner' not in self.client_cache:
             self.client_cache['runner'] = salt.runner.RunnerClient(self.opts)
         try:
-            self.pool.fire_async(self.client_cache['runner'].low, args=(fun, kwargs))
+            self.fire_async(self.client_cache['runner'].low, args=(fun, kwargs))
         except SystemExit:
             log.warning('Attempt to exit in reactor by runner. Ignored')
         except Exception as exc:
@@ -335,7 +447,7 @@ class ReactWrap(object):
         if 'wheel' not in self.client_cache:
             self.client_cache['wheel'] = salt.wheel.Wheel(self.opts)
         try:
-            self.pool.fire_async(self.client_cache['wheel'].low, args=(fun, kwargs))
+            self.fire_async(self.client_cache['wheel'].low, args=(fun, kwargs))
         except SystemExit:
             log.warning('Attempt to in reactor by whell. Ignored.')
         except Exception as exc:
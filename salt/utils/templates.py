@@ -10,6 +10,7 @@ import codecs
 import os
 import imp
 import logging
+import re
 import tempfile
 import traceback
 import sys
@@ -22,6 +23,7 @@ import jinja2.ext
 import salt.utils
 import salt.utils.yamlencoding
 import salt.utils.locales
+import salt.version
 from salt.exceptions import (
     SaltRenderError, CommandExecutionError, SaltInvocationError
 )
@@ -33,6 +35,9 @@ import salt.ext.six as six
 
 log = logging.getLogger(__name__)
 
+# The jinja environments of this process, keyed by their options
+_JINJA_ENVS = {}
+
 
 TEMPLATE_DIRNAME = os.path.join(saltpath[0], 'templates')
 
@@ -110,6 +115,7 @@ def wrap_tmpl_func(render_str):
                     to_str=False,
                     context=None,
                     tmplpath=None,
+                    jinja_cache=None,
                     **kws):
 
         if context is None:
@@ -174,8 +180,11 @@ def wrap_tmpl_func(render_str):
         else:  # assume tmplsrc is file-like.
             tmplstr = tmplsrc.read()
             tmplsrc.close()
+        render_kwargs = {}
+        if jinja_cache is not None:
+            render_kwargs['jinja_cache'] = jinja_cache
         try:
-            output = render_str(tmplstr, context, tmplpath)
+            output = render_str(tmplstr, context, tmplpath, **render_kwargs)
             if salt.utils.is_windows():
                 # Write out with Windows newlines
                 output = os.linesep.join(output.splitlines())
@@ -288,33 +297,24 @@ def _get_jinja_error(trace, context=None):
     return line, out
 
 
-def render_jinja_tmpl(tmplstr, context, tmplpath=None):
-    opts = context['opts']
-    saltenv = context['saltenv']
-    loader = None
-    newline = False
-
-    if tmplstr and not isinstance(tmplstr, six.text_type):
-        # http://jinja.pocoo.org/docs/api/#unicode
-        tmplstr = tmplstr.decode(SLS_ENCODING)
-
-    if tmplstr.endswith('\n'):
-        newline = True
+def _get_jinja_env(opts):
+    '''
+    Return the jinja environment shared by the templates rendered with the
+    same jinja options. It has no loader, every render uses an overlay of
+    it with its own loader.
+    '''
+    allow_undefined = bool(opts.get('allow_undefined', False))
+    trim_blocks = bool(opts.get('jinja_trim_blocks', False))
+    lstrip_blocks = bool(opts.get('jinja_lstrip_blocks', False))
+    bytecode_dir = None
+    if opts.get('jinja_bytecode_cache', True) and opts.get('cachedir'):
+        bytecode_dir = os.path.join(opts['cachedir'], 'jinja')
 
-    if not saltenv:
-        if tmplpath:
-            # i.e., the template is from a file outside the state tree
-            #
-            # XXX: FileSystemLoader is not being properly instantiated here is
-            # it? At least it ain't according to:
-            #
-            #   http://jinja.pocoo.org/docs/api/#jinja2.FileSystemLoader
-            loader = jinja2.FileSystemLoader(
-                context, os.path.dirname(tmplpath))
-    else:
-        loader = salt.utils.jinja.SaltCacheLoader(opts, saltenv, pillar_rend=context.get('_pillar_rend', False))
+    key = (allow_undefined, trim_blocks, lstrip_blocks, bytecode_dir)
+    if key in _JINJA_ENVS:
+        return _JINJA_ENVS[key]
 
-    env_args = {'extensions': [], 'loader': loader}
+    env_args = {'extensions': [], 'loader': None}
 
     if hasattr(jinja2.ext, 'with_'):
         env_args['extensions'].append('jinja2.ext.with_')
@@ -328,14 +328,33 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
     # trim_blocks removes newlines around Jinja blocks
     # lstrip_blocks strips tabs and spaces from the beginning of
     # line to the start of a block.
-    if opts.get('jinja_trim_blocks', False):
+    if trim_blocks:
         log.debug('Jinja2 trim_blocks is enabled')
         env_args['trim_blocks'] = True
-    if opts.get('jinja_lstrip_blocks', False):
+    if lstrip_blocks:
         log.debug('Jinja2 lstrip_blocks is enabled')
         env_args['lstrip_blocks'] = True
 
-    if opts.get('allow_undefined', False):
+    if bytecode_dir is not None:
+        try:
+            if not os.path.isdir(bytecode_dir):
+                os.makedirs(bytecode_dir)
+        except OSError as exc:
+            log.warning(
+                'Unable to create the jinja bytecode cache directory '
+                '{0}: {1}'.format(bytecode_dir, exc)
+            )
+        else:
+            # The compiled templates depend on the salt extensions and on
+            # the options of the environment
+            pattern = '__salt_{0}_{1:d}{2:d}_%s.cache'.format(
+                re.sub(r'[^\w.-]', '_', salt.version.__version__),
+                trim_blocks,
+                lstrip_blocks)
+            env_args['bytecode_cache'] = salt.utils.jinja.SaltBytecodeCache(
+                bytecode_dir, pattern)
+
+    if allow_undefined:
         jinja_env = jinja2.Environment(**env_args)
     else:
         jinja_env = jinja2.Environment(undefined=jinja2.StrictUndefined,
@@ -352,6 +371,75 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
 
     jinja_env.tests['list'] = salt.utils.is_list
 
+    _JINJA_ENVS[key] = jinja_env
+    return jinja_env
+
+
+def _get_jinja_code(base_env, jinja_env, tmplstr, tmplpath=None,
+                    jinja_cache=None):
+    '''
+    Return the compiled code of a template. The code is looked up in the
+    cache of the caller, then in the bytecode cache, before compiling the
+    template. Only the templates rendered from a file are kept in the
+    bytecode cache, which then holds one file per template path.
+    '''
+    if jinja_cache is not None and tmplpath:
+        cached = jinja_cache.get(tmplpath)
+        if cached is not None and cached[0] == tmplstr \
+                and cached[1] is base_env:
+            return cached[2]
+
+    bytecode_cache = jinja_env.bytecode_cache
+    bucket = None
+    code = None
+    if bytecode_cache is not None and tmplpath and os.path.isabs(tmplpath):
+        # The bucket checks the source of the template, and is overwritten
+        # when the template changes
+        bucket = bytecode_cache.get_bucket(jinja_env, tmplpath, None, tmplstr)
+        code = bucket.code
+    if code is None:
+        code = jinja_env.compile(tmplstr)
+        if bucket is not None:
+            bucket.code = code
+            bytecode_cache.set_bucket(bucket)
+
+    if jinja_cache is not None and tmplpath:
+        jinja_cache[tmplpath] = (tmplstr, base_env, code)
+    return code
+
+
+def render_jinja_tmpl(tmplstr, context, tmplpath=None, jinja_cache=None):
+    opts = context['opts']
+    saltenv = context['saltenv']
+    loader = None
+    newline = False
+
+    if tmplstr and not isinstance(tmplstr, six.text_type):
+        # http://jinja.pocoo.org/docs/api/#unicode
+        tmplstr = tmplstr.decode(SLS_ENCODING)
+
+    if tmplstr.endswith('\n'):
+        newline = True
+
+    if not saltenv:
+        if tmplpath:
+            # i.e., the template is from a file outside the state tree
+            #
+            # XXX: FileSystemLoader is not being properly instantiated here is
+            # it? At least it ain't according to:
+            #
+            #   http://jinja.pocoo.org/docs/api/#jinja2.FileSystemLoader
+            loader = jinja2.FileSystemLoader(
+                context, os.path.dirname(tmplpath))
+    else:
+        loader = salt.utils.jinja.SaltCacheLoader(opts, saltenv, pillar_rend=context.get('_pillar_rend', False))
+
+    base_env = _get_jinja_env(opts)
+    jinja_env = base_env.overlay(loader=loader)
+    # The loader adds the path of the loaded templates to the globals, keep
+    # them out of the shared environment
+    jinja_env.globals = jinja_env.globals.copy()
+
     decoded_context = {}
     for key, value in six.iteritems(context):
         if not isinstance(value, string_types):
@@ -361,7 +449,13 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
         decoded_context[key] = salt.utils.locales.sdecode(value)
 
     try:
-        template = jinja_env.from_string(tmplstr)
+        code = _get_jinja_code(base_env,
+                               jinja_env,
+                               tmplstr,
+                               tmplpath,
+                               jinja_cache)
+        template = jinja_env.template_class.from_code(
+            jinja_env, code, jinja_env.make_globals(None))
         template.globals.update(decoded_context)
         output = template.render(**decoded_context)
     except jinja2.exceptions.TemplateSyntaxError as exc:
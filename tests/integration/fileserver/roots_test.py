@@ -17,6 +17,7 @@ ensure_in_syspath('../..')
 import integration
 from salt.fileserver import roots
 from salt import fileclient
+import salt.utils
 
 roots.__opts__ = {}
 
@@ -83,6 +84,36 @@ class RootsTest(integration.ModuleCase):
                          'OLD MAN:  Hee hee ha ha!\n\n',
                  'dest': 'testfile'})
 
+    def test_serve_window(self):
+        path = os.path.join(integration.FILES, 'file', 'base', 'testfile')
+        with salt.utils.fopen(path, 'rb') as fp_:
+            contents = fp_.read()
+        with patch.dict(roots.__opts__, {'file_roots': self.master_opts['file_roots'],
+                                        'fileserver_ignoresymlinks': False,
+                                        'fileserver_followsymlinks': False,
+                                        'file_ignore_regex': False,
+                                        'file_ignore_glob': False,
+                                        'file_buffer_size': 100}):
+            load = {'saltenv': 'base',
+                    'path': path,
+                    'loc': 0}
+            fnd = {'path': path,
+                   'rel': 'testfile'}
+            ret = roots.serve_window(load, fnd, 2)
+            self.assertEqual(ret['dest'], 'testfile')
+            self.assertFalse(ret['eof'])
+            self.assertEqual(ret['chunks'],
+                             [{'loc': 0, 'data': contents[:100]},
+                              {'loc': 100, 'data': contents[100:200]}])
+
+            # The last window stops at the end of the file
+            load['loc'] = 200
+            ret = roots.serve_window(load, fnd, 100)
+            self.assertTrue(ret['eof'])
+            self.assertEqual(
+                ''.join(chunk['data'] for chunk in ret['chunks']),
+                contents[200:])
+
     @skipIf(True, "Update test not yet implemented")
     def test_update(self):
         pass
@@ -12,6 +12,7 @@ import inspect
 import tempfile
 import shutil
 import os
+import time
 import collections
 
 # Import Salt Testing libs
@@ -539,6 +540,163 @@ def bot():
 '''
 
 
+virtual_template = '''
+__virtualname__ = 'loaderindexed'
+
+def __virtual__():
+    return __virtualname__
+
+def test():
+    return ({val})
+'''
+
+
+class LazyLoaderIndexTest(TestCase):
+    '''
+    Test the index of the modules loaded by earlier loaders
+    '''
+    def setUp(self):
+        self.opts = minion_config(None)
+        self.opts['grains'] = grains(self.opts)
+        self.tmp_dir = tempfile.mkdtemp(dir=integration.TMP)
+        self.opts['cachedir'] = os.path.join(self.tmp_dir, 'cache')
+        self.opts['loader_index'] = True
+        self.mod_dir = os.path.join(self.tmp_dir, 'modules')
+        os.makedirs(self.mod_dir)
+        self.update_module(1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def update_module(self, val):
+        path = os.path.join(self.mod_dir, 'zzz_indexed.py')
+        with open(path, 'wb') as fh:
+            fh.write(virtual_template.format(val=val))
+        try:
+            os.unlink(path + 'c')
+        except OSError:
+            pass
+        # the index tells a changed file apart by its mtime
+        os.utime(path, (val, val))
+
+    def new_loader(self):
+        return LazyLoader([self.mod_dir], self.opts, tag='module')
+
+    def test_index(self):
+        loader = self.new_loader()
+        self.assertEqual(loader._indexed_files('loaderindexed'), [])
+        self.assertEqual(loader['loaderindexed.test'](), 1)
+
+        # the file is found from the index by the next loaders
+        loader = self.new_loader()
+        self.assertEqual(loader._indexed_files('loaderindexed', 'test'),
+                         ['zzz_indexed'])
+        self.assertEqual(loader['loaderindexed.test'](), 1)
+
+        # but not once it changed
+        self.update_module(2)
+        loader = self.new_loader()
+        self.assertEqual(loader._indexed_files('loaderindexed'), [])
+        self.assertEqual(loader['loaderindexed.test'](), 2)
+
+    def test_disabled(self):
+        self.opts['loader_index'] = False
+        loader = self.new_loader()
+        self.assertEqual(loader['loaderindexed.test'](), 1)
+        self.assertFalse(os.path.exists(self.opts['cachedir']))
+
+
+slow_virtual_template = '''
+import time
+
+def __virtual__():
+    time.sleep(0.5)
+    return True
+
+def test():
+    return {val}
+'''
+
+dependent_virtual_template = '''
+def __virtual__():
+    return __salt__['slow0.test']() == 0
+
+def test():
+    return True
+'''
+
+
+class LazyLoaderVirtualWorkersTest(TestCase):
+    '''
+    Test running the __virtual__ functions from threads in _load_all
+    '''
+    def setUp(self):
+        self.opts = minion_config(None)
+        self.opts['grains'] = grains(self.opts)
+        self.opts['loader_index'] = False
+        self.opts['loader_virtual_workers'] = 4
+        self.tmp_dir = tempfile.mkdtemp(dir=integration.TMP)
+        # its __virtual__ needs slow0, which another thread may be loading
+        with open(os.path.join(self.tmp_dir, 'aaa_dependent.py'), 'wb') as fh:
+            fh.write(dependent_virtual_template)
+        for val in range(4):
+            path = os.path.join(self.tmp_dir, 'slow{0}.py'.format(val))
+            with open(path, 'wb') as fh:
+                fh.write(slow_virtual_template.format(val=val))
+        self.loader = LazyLoader([self.tmp_dir], self.opts, tag='module')
+        self.loader.pack['__salt__'] = self.loader
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_all(self):
+        start = time.time()
+        self.loader._load_all()
+        self.assertLess(time.time() - start, 1.5)
+        for val in range(4):
+            self.assertEqual(self.loader['slow{0}.test'.format(val)](), val)
+        self.assertTrue(self.loader['aaa_dependent.test']())
+
+    def test_load_stats(self):
+        self.loader._load_all()
+        stats = self.loader.load_stats
+        self.assertEqual(sorted(stats),
+                         ['aaa_dependent', 'slow0', 'slow1', 'slow2', 'slow3'])
+        self.assertGreaterEqual(stats['slow1']['virtual'], 0.5)
+        self.assertTrue(stats['slow1']['loaded'])
+
+
+class LazyLoaderPreloadTest(TestCase):
+    '''
+    Test loading modules ahead of their first use
+    '''
+    def setUp(self):
+        self.opts = minion_config(None)
+        self.opts['grains'] = grains(self.opts)
+        self.opts['loader_index'] = False
+        self.tmp_dir = tempfile.mkdtemp(dir=integration.TMP)
+        for val in range(3):
+            path = os.path.join(self.tmp_dir, 'preload{0}.py'.format(val))
+            with open(path, 'wb') as fh:
+                fh.write(mod_template.format(val=val))
+        self.loader = LazyLoader([self.tmp_dir], self.opts, tag='module')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_preload(self):
+        self.loader.preload(['preload1'])
+        self.assertEqual(list(self.loader.loaded_modules), ['preload1'])
+        self.assertIn('preload1.test', self.loader._dict)
+        self.assertFalse(self.loader.loaded)
+
+    def test_preload_all(self):
+        self.loader.preload(['*'])
+        self.assertTrue(self.loader.loaded)
+        for val in range(3):
+            self.assertIn('preload{0}'.format(val), self.loader.loaded_modules)
+
+
 class LazyLoaderDeepSubmodReloadingTest(TestCase):
     module_name = 'loadertestsubmoddeep'
     libs = ('top_lib', 'mid_lib', 'bot_lib')
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the cost of a publication on the TCP publisher against the number of
+subscribers.
+
+The publication is sent once the way the publisher used to do it, serialized
+by the master worker and framed again by the publisher for all of the
+subscribers, and once the way it is done now, framed a single time by the
+master worker with the frame shared by all of the subscriber streams.
+
+Usage::
+
+    python tests/perf/publish_fanout.py --size 262144 --subscribers 1,10,100,500
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function
+import logging
+import optparse
+import os
+import socket
+import time
+
+# Import 3rd-party libs
+import tornado.gen
+import tornado.ioloop
+import tornado.iostream
+
+# Import salt libs
+import salt.payload
+import salt.transport.tcp
+from salt.transport.frame import frame_msg
+
+log = logging.getLogger(__name__)
+
+
+def parse():
+    '''
+    Parse the command line
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-s',
+        '--size',
+        dest='size',
+        default=1024,
+        type='int',
+        help='The size of the published load, in bytes')
+    parser.add_option(
+        '-n',
+        '--subscribers',
+        dest='subscribers',
+        default='1,10,100,500',
+        help='A comma separated list of the subscriber counts to measure')
+    parser.add_option(
+        '-p',
+        '--publications',
+        dest='publications',
+        default=200,
+        type='int',
+        help='The number of publications to time for each subscriber count')
+    options, _ = parser.parse_args()
+    return options
+
+
+class FanoutBench(object):
+    '''
+    A TCP publisher with subscribers connected over socket pairs
+    '''
+    def __init__(self, subscribers):
+        self.io_loop = tornado.ioloop.IOLoop()
+        self.serial = salt.payload.Serial({})
+        self.pub_server = salt.transport.tcp.PubServer(
+            {'connected_registry': False}, io_loop=self.io_loop)
+        self.readers = []
+        for idx in range(subscribers):
+            server_side, client_side = socket.socketpair()
+            client_side.setblocking(0)
+            stream = tornado.iostream.IOStream(server_side, io_loop=self.io_loop)
+            client = salt.transport.tcp.Subscriber(stream, 'sub{0}'.format(idx))
+            self.pub_server.clients.add(client)
+            self.readers.append(client_side)
+
+    def close(self):
+        for client in self.pub_server.clients:
+            client.stream.close()
+        for reader in self.readers:
+            reader.close()
+        self.io_loop.close()
+
+    @tornado.gen.coroutine
+    def _legacy_publish_payload(self, package, _):
+        '''
+        The publisher side of the publication before the frame was shared
+        '''
+        log.debug('TCP PubServer sending payload: {0}'.format(package))
+        payload = frame_msg(package['payload'])
+        for client in self.pub_server.clients:
+            f = client.stream.write(payload)
+            self.io_loop.add_future(f, lambda f: True)
+        log.trace('TCP PubServer finished publishing payload')
+
+    def legacy(self, payload):
+        '''
+        Serialize the payload in the worker and frame it in the publisher
+        '''
+        package = {'payload': self.serial.dumps(payload)}
+        self._legacy_publish_payload(package, None)
+
+    def shared(self, payload):
+        '''
+        Frame the payload once in the worker and share the frame
+        '''
+        package = {'frame': frame_msg(payload)}
+        self.pub_server.publish_payload(package, None)
+
+    @tornado.gen.coroutine
+    def drain(self):
+        '''
+        Read everything the subscribers were sent
+        '''
+        while True:
+            for reader in self.readers:
+                try:
+                    while reader.recv(1024 * 1024):
+                        pass
+                except socket.error:
+                    pass
+            if not any(client.stream.writing()
+                       for client in self.pub_server.clients):
+                break
+            yield tornado.gen.moment
+
+    def run(self, method, payload, publications):
+        '''
+        Return the average time spent in the publisher per publication
+        '''
+        spent = 0
+        for _ in range(publications):
+            start = time.time()
+            method(payload)
+            spent += time.time() - start
+            self.io_loop.run_sync(self.drain)
+        return spent / publications
+
+
+def main():
+    options = parse()
+    payload = {'enc': 'aes', 'load': os.urandom(options.size)}
+    print('{0:>12} {1:>14} {2:>14} {3:>8}'.format(
+        'subscribers', 'legacy (ms)', 'shared (ms)', 'ratio'))
+    for subscribers in options.subscribers.split(','):
+        bench = FanoutBench(int(subscribers))
+        try:
+            legacy = bench.run(bench.legacy, payload, options.publications)
+            shared = bench.run(bench.shared, payload, options.publications)
+        finally:
+            bench.close()
+        print('{0:>12} {1:>14.3f} {2:>14.3f} {3:>8.2f}'.format(
+            subscribers, legacy * 1000, shared * 1000, legacy / shared))
+
+
+if __name__ == '__main__':
+    main()
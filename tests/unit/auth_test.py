@@ -110,7 +110,7 @@ class MasterACLTestCase(integration.ModuleCase):
         self.clear = salt.master.ClearFuncs(opts, MagicMock())
 
         # overwrite the _send_pub method so we don't have to serialize MagicMock
-        self.clear._send_pub = lambda payload: True
+        self.clear._send_pub = lambda payload, minions=None: True
 
         # make sure to return a JID, instead of a mock
         self.clear.mminion.returners = {'.prep_jid': lambda x: 1}
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.cache.cache_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the minion data cache drivers
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.cache
+import salt.config
+
+
+class CacheDriverTestsMixin(object):
+    '''
+    Tests run against every cache driver
+    '''
+    driver = None
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        opts = salt.config.master_config(None)
+        opts['cachedir'] = self.cachedir
+        opts['cache'] = self.driver
+        opts['extension_modules'] = os.path.join(self.cachedir, 'extmods')
+        self.cache = salt.cache.Cache(opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def test_store_fetch(self):
+        data = {'grains': {'os': 'Ubuntu'}, 'pillar': {'foo': [1, 2]}}
+        self.cache.store('minions/web1', 'data', data)
+        self.assertEqual(self.cache.fetch('minions/web1', 'data'), data)
+        self.assertTrue(self.cache.contains('minions/web1', 'data'))
+        self.assertTrue(self.cache.contains('minions/web1'))
+        self.assertIsNotNone(self.cache.updated('minions/web1', 'data'))
+
+    def test_missing(self):
+        self.assertIsNone(self.cache.fetch('minions/web1', 'data'))
+        self.assertIsNone(self.cache.updated('minions/web1', 'data'))
+        self.assertFalse(self.cache.contains('minions/web1', 'data'))
+        self.assertFalse(self.cache.contains('minions/web1'))
+        self.assertEqual(self.cache.list('minions'), [])
+
+    def test_list(self):
+        self.cache.store('minions/web1', 'data', {})
+        self.cache.store('minions/web1', 'mine', {})
+        self.cache.store('minions/web2', 'data', {})
+        self.assertEqual(sorted(self.cache.list('minions')), ['web1', 'web2'])
+        self.assertEqual(sorted(self.cache.list('minions/web1')),
+                         ['data', 'mine'])
+
+    def test_fetch_many(self):
+        for idx in range(3):
+            self.cache.store('minions/web{0}'.format(idx), 'data', {'id': idx})
+        self.assertEqual(
+            self.cache.fetch_many(['minions/web0', 'minions/web2',
+                                   'minions/web9'], 'data'),
+            {'minions/web0': {'id': 0}, 'minions/web2': {'id': 2}})
+
+    def test_flush(self):
+        self.cache.store('minions/web1', 'data', {})
+        self.cache.store('minions/web1', 'mine', {})
+        self.cache.store('minions/web2', 'data', {})
+        self.cache.flush('minions/web1', 'mine')
+        self.assertEqual(self.cache.list('minions/web1'), ['data'])
+        self.cache.flush('minions/web1')
+        self.assertFalse(self.cache.contains('minions/web1'))
+        self.assertEqual(self.cache.list('minions'), ['web2'])
+
+
+class LocalfsCacheTestCase(CacheDriverTestsMixin, TestCase):
+    driver = 'localfs'
+
+    def test_layout(self):
+        '''
+        Make sure the data is stored where the minion data cache always was
+        '''
+        self.cache.store('minions/web1', 'data', {})
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.cachedir, 'minions', 'web1', 'data.p')))
+
+
+class Sqlite3CacheTestCase(CacheDriverTestsMixin, TestCase):
+    driver = 'sqlite3'
+
+    def test_single_file(self):
+        self.cache.store('minions/web1', 'data', {})
+        self.assertTrue(os.path.isfile(os.path.join(self.cachedir, 'cache.db')))
+        self.assertFalse(os.path.isdir(os.path.join(self.cachedir, 'minions')))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(LocalfsCacheTestCase, Sqlite3CacheTestCase, needs_daemon=False)
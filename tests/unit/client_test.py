@@ -6,6 +6,9 @@
 # Import python libs
 from __future__ import absolute_import
 
+# Import 3rd-party libs
+import tornado.ioloop
+
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
 from salttesting.helpers import ensure_in_syspath
@@ -26,6 +29,15 @@ class LocalClientTestCase(TestCase,
         local_client = client.LocalClient(self.get_config_file_path('master'))
         self.assertIsInstance(local_client, client.LocalClient, 'LocalClient did not create a LocalClient instance')
 
+    def test_event_tag_filter(self):
+        local_client = client.LocalClient(self.get_config_file_path('master'))
+        self.assertEqual(local_client.event.tag_filters,
+                         [['startswith', 'salt/job/'], ['startswith', 'syndic/']])
+        # The subscriber of a passed io_loop is shared, it is left unfiltered
+        local_client = client.LocalClient(self.get_config_file_path('master'),
+                                          io_loop=tornado.ioloop.IOLoop())
+        self.assertIsNone(local_client.event.tag_filters)
+
     def test_check_pub_data(self):
         just_minions = {'minions': ['m1', 'm2']}
         jid_no_minions = {'jid': '1234', 'minions': []}
@@ -2,6 +2,9 @@
 
 # python libs
 from __future__ import absolute_import
+import os
+import shutil
+import tempfile
 
 # salt testing libs
 from salttesting import TestCase, skipIf
@@ -108,6 +111,93 @@ class CryptTestCase(TestCase):
             self.assertTrue(crypt.verify_signature('/keydir/keyname.pub', MSG, SIG))
 
 
+@skipIf(not HAS_PYCRYPTO_RSA, 'pycrypto >= 2.6 is not available')
+class MinionKeyCacheTestCase(TestCase):
+    '''
+    Test the cache of the minion public keys
+    '''
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.pki_dir, 'minions'))
+        self.pub_path = os.path.join(self.pki_dir, 'minions', 'minion1')
+        with salt.utils.fopen(self.pub_path, 'w+') as fp_:
+            fp_.write(PUBKEY_DATA)
+        self.cache = crypt.MinionKeyCache({'pki_dir': self.pki_dir})
+        self.token = crypt.private_encrypt(
+            Crypto.PublicKey.RSA.importKey(PRIVKEY_DATA), 'salt')
+
+    def tearDown(self):
+        shutil.rmtree(self.pki_dir, ignore_errors=True)
+
+    def test_get(self):
+        '''
+        Keys are loaded once, again when their file changes and forgotten when
+        it goes away
+        '''
+        key = self.cache.get('minion1')
+        self.assertEqual(key.exportKey('PEM'), PUBKEY_DATA)
+        self.assertIs(self.cache.get('minion1'), key)
+        self.assertIsNone(self.cache.get('minion2'))
+
+        # A key accepted again is written to a new file
+        os.remove(self.pub_path)
+        with salt.utils.fopen(self.pub_path, 'w+') as fp_:
+            fp_.write(PUBKEY_DATA + '\n')
+        self.assertIsNot(self.cache.get('minion1'), key)
+
+        os.remove(self.pub_path)
+        self.assertIsNone(self.cache.get('minion1'))
+        self.assertEqual(self.cache.keys, {})
+
+    def test_verify_token(self):
+        '''
+        Tokens are verified once with the minion key
+        '''
+        with patch('salt.crypt.public_decrypt',
+                   MagicMock(side_effect=crypt.public_decrypt)) as decrypt:
+            self.assertTrue(self.cache.verify_token('minion1', self.token))
+            self.assertTrue(self.cache.verify_token('minion1', self.token))
+            self.assertEqual(decrypt.call_count, 1)
+        self.assertRaises(ValueError, self.cache.verify_token,
+                          'minion1', self.token[::-1])
+        self.assertFalse(self.cache.verify_token('minion2', self.token))
+
+        os.remove(self.pub_path)
+        self.assertFalse(self.cache.verify_token('minion1', self.token))
+
+
+class AuthRetryTestCase(TestCase):
+    '''
+    Test the waits of the minions between their sign in attempts
+    '''
+    def setUp(self):
+        # The waits do not depend on the state of a singleton
+        self.auth = object.__new__(crypt.AsyncAuth)
+
+    def test_retry_wait(self):
+        '''
+        The wait is stretched at random
+        '''
+        for _ in range(20):
+            wait = self.auth._retry_wait(10)
+            self.assertTrue(10 <= wait <= 15)
+        self.assertEqual(self.auth._retry_wait(0), 0)
+
+    def test_busy_master(self):
+        '''
+        The wait asked for by a busy master is used once
+        '''
+        self.auth._busy({'ret': 'busy', 'retry_after': 120.0})
+        self.assertEqual(self.auth.retry_after, 120.0)
+        self.assertTrue(120 <= self.auth._retry_wait(10) <= 180)
+        self.assertIsNone(self.auth.retry_after)
+        self.assertTrue(10 <= self.auth._retry_wait(10) <= 15)
+
+        self.auth._busy({'ret': 'busy', 'retry_after': 'soon'})
+        self.assertEqual(self.auth._retry_wait(10), 0)
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(CryptTestCase, needs_daemon=False)
+    run_tests(CryptTestCase, MinionKeyCacheTestCase, AuthRetryTestCase,
+              needs_daemon=False)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.fileclient_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the minion file client
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import collections
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, patch
+ensure_in_syspath('../')
+
+# Import salt libs
+import salt.config
+import salt.fileclient
+import salt.fileserver
+import salt.utils
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+@skipIf(salt.utils.is_windows(), 'Hard links are not used on Windows')
+class BlobCacheTestCase(TestCase):
+    '''
+    Test salt.fileclient.BlobCache
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.opts = {'cachedir': self.cachedir}
+        self.blobs = salt.fileclient.BlobCache(self.opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def _write(self, name, contents):
+        path = os.path.join(self.cachedir, 'files', name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with salt.utils.fopen(path, 'w') as fp_:
+            fp_.write(contents)
+        return path
+
+    def test_hash_index(self):
+        path = self._write('base/foo', 'foo')
+        hsum = salt.utils.get_hash(path, 'md5')
+        self.assertEqual(self.blobs.hash(path, 'md5'), hsum)
+        with patch('salt.utils.get_hash') as get_hash:
+            self.assertEqual(self.blobs.hash(path, 'md5'), hsum)
+            # The index persists across the file clients
+            self.blobs.save(force=True)
+            blobs = salt.fileclient.BlobCache(self.opts)
+            self.assertEqual(blobs.hash(path, 'md5'), hsum)
+            self.assertFalse(get_hash.called)
+        # The file is hashed again once it changed
+        self._write('base/foo', 'bar')
+        self.assertEqual(self.blobs.hash(path, 'md5'),
+                         salt.utils.get_hash(path, 'md5'))
+
+    def test_link(self):
+        path = self._write('base/foo', 'foo')
+        hsum = self.blobs.add(path, 'md5')
+        self.assertTrue(os.path.isfile(self.blobs.blob_path(hsum, 'md5')))
+
+        dest = os.path.join(self.cachedir, 'files', 'dev', 'foo')
+        os.makedirs(os.path.dirname(dest))
+        self.assertTrue(self.blobs.link(hsum, 'md5', dest))
+        self.assertEqual(os.stat(dest).st_ino, os.stat(path).st_ino)
+        self.assertFalse(self.blobs.link('0' * 32, 'md5', dest))
+
+    def test_add_existing_blob(self):
+        path = self._write('base/foo', 'foo')
+        other = self._write('dev/foo', 'foo')
+        self.blobs.add(path, 'md5')
+        self.blobs.add(other, 'md5')
+        # The content is only stored once
+        self.assertEqual(os.stat(path).st_ino, os.stat(other).st_ino)
+
+    def test_detach(self):
+        path = self._write('base/foo', 'foo')
+        hsum = self.blobs.add(path, 'md5')
+        blob = self.blobs.blob_path(hsum, 'md5')
+        self.blobs.detach(path)
+        self.assertFalse(os.path.exists(path))
+        # Nothing links to the blob anymore
+        self.assertFalse(os.path.exists(blob))
+
+    def test_corrupted_blob(self):
+        path = self._write('base/foo', 'foo')
+        hsum = self.blobs.add(path, 'md5')
+        # Writing a cached file in place changes the blob
+        with salt.utils.fopen(path, 'a') as fp_:
+            fp_.write('bar')
+        dest = os.path.join(self.cachedir, 'files', 'dev', 'foo')
+        os.makedirs(os.path.dirname(dest))
+        self.assertFalse(self.blobs.link(hsum, 'md5', dest))
+        self.assertFalse(os.path.exists(self.blobs.blob_path(hsum, 'md5')))
+
+    def test_clean(self):
+        path = self._write('base/foo', 'foo')
+        kept = self._write('base/bar', 'bar')
+        hsum = self.blobs.add(path, 'md5')
+        kept_hsum = self.blobs.add(kept, 'md5')
+        self.blobs.save(force=True)
+        # A cached file removed outside of the file client
+        os.remove(path)
+        self.blobs.clean(3600)
+        self.assertTrue(os.path.exists(self.blobs.blob_path(hsum, 'md5')))
+        self.blobs.clean()
+        self.assertFalse(os.path.exists(self.blobs.blob_path(hsum, 'md5')))
+        self.assertTrue(os.path.exists(self.blobs.blob_path(kept_hsum, 'md5')))
+        index = salt.fileclient.BlobCache(self.opts).index
+        self.assertNotIn(path, index)
+        self.assertIn(kept, index)
+
+
+class FakeChannel(object):
+    '''
+    A channel sending the requests of the file client to a local fileserver
+    '''
+    def __init__(self, fileserver):
+        self.fileserver = fileserver
+        self.calls = collections.Counter()
+        self.manifests = True
+
+    def send(self, load, **kwargs):
+        load = dict(load)
+        cmd = load.pop('cmd')
+        self.calls[cmd] += 1
+        if cmd == '_file_manifest' and not self.manifests:
+            # An older master
+            return False
+        return getattr(self.fileserver, cmd[1:])(load)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class ManifestTestCase(TestCase):
+    '''
+    Test caching the files of the master from a manifest
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp_dir, 'roots')
+        os.makedirs(os.path.join(self.root, 'sub'))
+        for idx in range(5):
+            with salt.utils.fopen(os.path.join(self.root, 'sub', str(idx)), 'w') as fp_:
+                fp_.write('file {0}\n'.format(idx))
+        master_opts = salt.config.master_config(None)
+        master_opts['file_roots'] = {'base': [self.root]}
+        master_opts['cachedir'] = os.path.join(self.tmp_dir, 'master')
+        self.channel = FakeChannel(salt.fileserver.Fileserver(master_opts))
+        minion_opts = salt.config.minion_config(None)
+        minion_opts['cachedir'] = os.path.join(self.tmp_dir, 'minion')
+        with patch('salt.transport.Channel.factory',
+                   return_value=self.channel):
+            self.client = salt.fileclient.RemoteClient(minion_opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_file_manifest(self):
+        manifest = self.client.file_manifest(prefix='sub')
+        self.assertEqual(sorted(manifest), ['sub/{0}'.format(idx) for idx in range(5)])
+        path = os.path.join(self.root, 'sub', '0')
+        self.assertEqual(manifest['sub/0']['hsum'],
+                         salt.utils.get_hash(path, manifest['sub/0']['hash_type']))
+        self.assertEqual(manifest['sub/0']['size'], os.path.getsize(path))
+        self.assertEqual(
+            sorted(self.client.file_manifest(paths=['sub/1', 'sub/missing'])),
+            ['sub/1'])
+
+    def test_cache_dir(self):
+        self.assertEqual(len(self.client.cache_dir('salt://sub')), 5)
+        self.assertEqual(self.channel.calls['_file_hash'], 0)
+        self.assertEqual(self.channel.calls['_serve_file'], 5)
+
+        # Only the changed files are downloaded again
+        self.channel.calls.clear()
+        with salt.utils.fopen(os.path.join(self.root, 'sub', '3'), 'w') as fp_:
+            fp_.write('changed')
+        self.client.cache_dir('salt://sub')
+        self.assertEqual(self.channel.calls['_file_manifest'], 1)
+        self.assertEqual(self.channel.calls['_file_hash'], 0)
+        self.assertEqual(self.channel.calls['_serve_file'], 1)
+
+    def test_cache_files(self):
+        self.client.cache_files(['salt://sub/0', 'salt://sub/1'])
+        self.assertEqual(self.channel.calls['_file_manifest'], 1)
+        self.assertEqual(self.channel.calls['_file_hash'], 0)
+
+    def test_no_manifest(self):
+        self.channel.manifests = False
+        self.assertEqual(len(self.client.cache_dir('salt://sub')), 5)
+        self.assertEqual(self.channel.calls['_file_hash'], 5)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(BlobCacheTestCase, ManifestTestCase, needs_daemon=False)
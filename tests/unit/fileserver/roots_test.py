@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.fileserver.roots_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the file lists of the roots fileserver kept up to date by the watcher
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, patch
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.config
+import salt.utils
+from salt.fileserver import roots
+
+roots.__opts__ = {}
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class RootsWatcherTestCase(TestCase):
+    '''
+    Test salt.fileserver.roots.RootsWatcher
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp_dir, 'roots')
+        for path in ('top.sls', 'a/init.sls', 'a/b/file', 'empty/'):
+            self._write(path)
+        self.opts = salt.config.master_config(None)
+        self.opts['cachedir'] = os.path.join(self.tmp_dir, 'cache')
+        self.opts['file_roots'] = {'base': [self.root]}
+        self.opts['fileserver_watch'] = True
+        self.watcher = roots.RootsWatcher(self.opts)
+        self.watcher.rescan()
+        self.watcher.flush()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        roots._SNAPSHOTS.clear()
+
+    def _write(self, rel, contents='foo'):
+        path = os.path.join(self.root, rel)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        if not rel.endswith('/'):
+            with salt.utils.fopen(path, 'w') as fp_:
+                fp_.write(contents)
+        return path
+
+    def _walk(self, form):
+        '''
+        Return a file list walked the way it is without the watcher
+        '''
+        opts = dict(self.opts, fileserver_watch=False)
+        opts['cachedir'] = tempfile.mkdtemp(dir=self.tmp_dir)
+        with patch.dict(roots.__opts__, opts):
+            return sorted(roots._file_lists({'saltenv': 'base'}, form))
+
+    def _lists(self, form):
+        with patch.dict(roots.__opts__, self.opts):
+            return sorted(roots._file_lists({'saltenv': 'base'}, form))
+
+    def test_file_lists(self):
+        for form in ('files', 'dirs', 'empty_dirs', 'links'):
+            self.assertEqual(self._lists(form), self._walk(form))
+
+    def test_changes(self):
+        self.watcher.changed(self._write('a/new'))
+        self.watcher.changed(self._write('c/d/e'))
+        self.watcher.changed(os.path.join(self.root, 'c'), isdir=True)
+        shutil.rmtree(os.path.join(self.root, 'a', 'b'))
+        self.watcher.changed(os.path.join(self.root, 'a', 'b'), isdir=True)
+        os.rmdir(os.path.join(self.root, 'empty'))
+        self.watcher.changed(os.path.join(self.root, 'empty'), isdir=True)
+        self.watcher.flush()
+        self.assertEqual(self._lists('files'),
+                         ['a/init.sls', 'a/new', 'c/d/e', 'top.sls'])
+        for form in ('files', 'dirs', 'empty_dirs'):
+            self.assertEqual(self._lists(form), self._walk(form))
+
+    def test_refresh_hash(self):
+        path = os.path.join(self.root, 'top.sls')
+        load = {'saltenv': 'base', 'path': 'top.sls'}
+        fnd = {'path': path, 'rel': 'top.sls'}
+        with patch.dict(roots.__opts__, self.opts):
+            roots.file_hash(load, fnd)
+            self._write('top.sls', 'bar')
+            self.watcher.changed(path)
+            self.watcher.flush()
+            with patch('salt.utils.get_hash') as get_hash:
+                ret = roots.file_hash(load, fnd)
+                self.assertFalse(get_hash.called)
+        self.assertEqual(ret['hsum'],
+                         salt.utils.get_hash(path, self.opts['hash_type']))
+
+    def test_stale_heartbeat(self):
+        self._write('new')
+        self.assertNotIn('new', self._lists('files'))
+        heartbeat = os.path.join(self.opts['cachedir'], 'file_lists/roots/.watch')
+        os.utime(heartbeat, (0, 0))
+        # The file roots are walked again
+        self.assertIn('new', self._lists('files'))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(RootsWatcherTestCase, needs_daemon=False)
@@ -9,7 +9,10 @@
 
 # Import python libs
 from __future__ import absolute_import
+import os
+import shutil
 import tempfile
+import time
 
 # Import Salt Testing libs
 from salttesting import skipIf, TestCase
@@ -19,6 +22,7 @@ ensure_in_syspath('../')
 
 # Import salt libs
 import salt.pillar
+import salt.utils
 
 
 @skipIf(NO_MOCK, NO_MOCK_REASON)
@@ -254,6 +258,91 @@ p2:
         client.get_state.side_effect = get_state
 
 
+
+class PillarCacheTestCase(TestCase):
+    '''
+    Test the cache of the compiled pillar
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.opts = {
+            'cachedir': os.path.join(self.tmp_dir, 'cache'),
+            'pki_dir': self.tmp_dir,
+            'cache': 'localfs',
+            'extension_modules': os.path.join(self.tmp_dir, 'extmods'),
+            'pillar_roots': {'base': [os.path.join(self.tmp_dir, 'pillar')]},
+            'pillar_cache_ttl': 3600,
+        }
+        os.makedirs(self.opts['pillar_roots']['base'][0])
+        self.grains = {'os': 'Ubuntu', 'id': 'minion'}
+        self.pillar = {'foo': 'bar', 'baz': [1, 2]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_store_fetch(self):
+        cache = salt.pillar.PillarCache(self.opts)
+        self.assertIsNone(cache.fetch('minion', self.grains, 'base'))
+        cache.store('minion', self.grains, self.pillar, 'base')
+        self.assertEqual(cache.fetch('minion', self.grains, 'base'),
+                         self.pillar)
+        # Another environment is another entry
+        self.assertIsNone(cache.fetch('minion', self.grains, 'dev'))
+        self.assertIsNone(cache.fetch('minion', self.grains, 'base',
+                                      ext={'cmd_yaml': 'cat'}))
+
+    def test_grains_change(self):
+        cache = salt.pillar.PillarCache(self.opts)
+        cache.store('minion', self.grains, self.pillar, 'base')
+        grains = dict(self.grains, os='Debian')
+        self.assertIsNone(cache.fetch('minion', grains, 'base'))
+
+    def test_ttl(self):
+        cache = salt.pillar.PillarCache(self.opts)
+        cache.store('minion', self.grains, self.pillar, 'base')
+        with patch('time.time', MagicMock(return_value=time.time() + 3601)):
+            self.assertIsNone(cache.fetch('minion', self.grains, 'base'))
+
+    def test_clear(self):
+        cache = salt.pillar.PillarCache(self.opts)
+        cache.store('minion', self.grains, self.pillar, 'base')
+        cache.store('other', self.grains, self.pillar, 'base')
+        cache.clear('minion')
+        self.assertIsNone(cache.fetch('minion', self.grains, 'base'))
+        self.assertEqual(cache.fetch('other', self.grains, 'base'),
+                         self.pillar)
+        cache.clear()
+        self.assertIsNone(cache.fetch('other', self.grains, 'base'))
+
+    def test_encrypt(self):
+        self.opts['pillar_cache_encrypt'] = True
+        cache = salt.pillar.PillarCache(self.opts)
+        cache.store('minion', self.grains, self.pillar, 'base')
+        stored = cache.cache.fetch('pillar/minion',
+                                   cache._entry('base', None, None))
+        self.assertNotIn('pillar', stored)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.tmp_dir, 'pillar_cache.key')))
+        # Another master process reads the same key
+        self.assertEqual(
+            salt.pillar.PillarCache(self.opts).fetch(
+                'minion', self.grains, 'base'),
+            self.pillar)
+
+    def test_check_roots(self):
+        cache = salt.pillar.PillarCache(self.opts)
+        self.assertTrue(cache.check_roots())
+        cache.store('minion', self.grains, self.pillar, 'base')
+        self.assertFalse(cache.check_roots())
+        self.assertEqual(cache.fetch('minion', self.grains, 'base'),
+                         self.pillar)
+        sls = os.path.join(self.opts['pillar_roots']['base'][0], 'top.sls')
+        with salt.utils.fopen(sls, 'w') as fp_:
+            fp_.write('base: {}\n')
+        self.assertTrue(cache.check_roots())
+        self.assertIsNone(cache.fetch('minion', self.grains, 'base'))
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(PillarTestCase, needs_daemon=False)
+    run_tests(PillarTestCase, PillarCacheTestCase, needs_daemon=False)
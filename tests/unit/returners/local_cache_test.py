@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.returners.local_cache_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+
+# Import Salt Testing libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.utils
+from salt.returners import local_cache
+from salt.utils.process import SignalHandlingMultiprocessingProcess
+
+
+class BufferingWorker(SignalHandlingMultiprocessingProcess):
+    '''
+    A worker which buffers a return and waits to be stopped
+    '''
+    def __init__(self, jid, ready):
+        super(BufferingWorker, self).__init__()
+        self.jid = jid
+        self.ready = ready
+
+    def run(self):
+        local_cache.returner({'jid': self.jid, 'id': 'alpha', 'return': True})
+        self.ready.set()
+        while True:
+            time.sleep(0.1)
+
+
+class LocalCacheIndexTestCase(TestCase):
+    '''
+    Test the job index of the local_cache returner
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        local_cache.__opts__ = {'cachedir': self.cachedir,
+                                'hash_type': 'md5',
+                                'keep_jobs': 24,
+                                'job_cache_store_endtime': True}
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def _add_job(self, jid, fun='test.ping', minions=('alpha', 'beta')):
+        local_cache.prep_jid(passed_jid=jid)
+        local_cache.save_load(
+            jid,
+            {'jid': jid, 'fun': fun, 'arg': [], 'tgt': '*',
+             'tgt_type': 'glob', 'user': 'root'},
+            minions=list(minions))
+        for minion in minions:
+            local_cache.returner(
+                {'jid': jid, 'id': minion, 'return': True})
+        local_cache.update_endtime(jid, 'Thu, 01 Jan 2015 00:00:00')
+
+    def test_index_matches_walk(self):
+        '''
+        The jobs listed from the index are the same as the ones found by
+        walking the job cache, before and after the index is rebuilt
+        '''
+        # Creating the index up front makes the jobs below append to it
+        local_cache.get_jids()
+        self._add_job('20150101000000000001')
+        self._add_job('20150101010000000002', fun='saltutil.find_job')
+        self._add_job('20150101010000000003')
+
+        expected = {}
+        for jid, job, _, _ in local_cache._walk_through(local_cache._job_dir()):
+            expected[jid] = local_cache.salt.utils.jid.format_jid_instance(jid, job)
+            expected[jid]['EndTime'] = 'Thu, 01 Jan 2015 00:00:00'
+        self.assertEqual(local_cache.get_jids(), expected)
+
+        shutil.rmtree(local_cache._index_dir())
+        self.assertEqual(local_cache.get_jids(), expected)
+        entry = local_cache._index_read('2015010101')['20150101010000000003']
+        self.assertEqual(entry['minions'], 2)
+        self.assertEqual(entry['returned'], set(['alpha', 'beta']))
+
+    def test_get_jids_filter(self):
+        '''
+        Only the most recent jobs are returned, oldest first
+        '''
+        local_cache.get_jids()
+        self._add_job('20150101000000000001')
+        self._add_job('20150101010000000002', fun='saltutil.find_job')
+        self._add_job('20150101020000000003')
+        self._add_job('20150101020000000004')
+
+        jids = [job['JID'] for job in local_cache.get_jids_filter(3)]
+        self.assertEqual(
+            jids,
+            ['20150101000000000001', '20150101020000000003', '20150101020000000004'])
+        jids = [job['JID'] for job in local_cache.get_jids_filter(2, False)]
+        self.assertEqual(jids, ['20150101020000000003', '20150101020000000004'])
+
+    def test_clean_old_jobs(self):
+        '''
+        Expired jobs are removed from the cache and from the index
+        '''
+        local_cache.get_jids()
+        old = '20150101000000000001'
+        new = local_cache.salt.utils.jid.gen_jid()
+        self._add_job(old)
+        self._add_job(new)
+
+        # A job directory without a jid file is not in the index
+        corrupted = local_cache._jid_dir('corrupted')
+        os.makedirs(corrupted)
+
+        local_cache.clean_old_jobs()
+        self.assertFalse(os.path.isdir(local_cache._jid_dir(old)))
+        self.assertTrue(os.path.isdir(local_cache._jid_dir(new)))
+        self.assertFalse(os.path.isdir(corrupted))
+        self.assertEqual(list(local_cache.get_jids()), [new])
+
+    def test_unsorted_segment(self):
+        '''
+        The jobs without a timestamp in their jid are listed as the oldest
+        '''
+        local_cache.get_jids()
+        self._add_job('myjob')
+        self._add_job('20150101000000000001')
+        self.assertEqual(local_cache._index_segments(),
+                         [local_cache.INDEX_UNSORTED, '2015010100'])
+        jids = [job['JID'] for job in local_cache.get_jids_filter(1)]
+        self.assertEqual(jids, ['20150101000000000001'])
+
+
+class LocalCacheBatchTestCase(TestCase):
+    '''
+    Test the batched return writer of the local_cache returner
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        local_cache.__opts__ = {'cachedir': self.cachedir,
+                                'hash_type': 'md5',
+                                'keep_jobs': 24,
+                                'job_cache_batch_returns': True,
+                                'job_cache_batch_size': 3,
+                                'job_cache_batch_interval': 60}
+
+    def tearDown(self):
+        local_cache.flush_returns()
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def test_batched_returns(self):
+        '''
+        Buffered returns are written in batches and read back by get_jid
+        '''
+        jid = local_cache.prep_jid()
+        for minion in ('alpha', 'beta'):
+            local_cache.returner(
+                {'jid': jid, 'id': minion, 'return': minion, 'out': 'txt'})
+        batches = os.path.join(local_cache._jid_dir(jid), local_cache.RETURNS_DIR)
+        self.assertFalse(os.path.isdir(batches))
+
+        # The third return fills the batch
+        local_cache.returner({'jid': jid, 'id': 'gamma', 'return': 'gamma'})
+        self.assertEqual(len(os.listdir(batches)), 1)
+
+        local_cache.returner({'jid': jid, 'id': 'delta', 'return': 'delta'})
+        self.assertEqual(
+            local_cache.get_jid(jid),
+            {'alpha': {'return': 'alpha', 'out': 'txt'},
+             'beta': {'return': 'beta', 'out': 'txt'},
+             'gamma': {'return': 'gamma'},
+             'delta': {'return': 'delta'}})
+        self.assertEqual(len(os.listdir(batches)), 2)
+
+    def test_duplicate_return(self):
+        '''
+        Duplicate returns are rejected before they are buffered
+        '''
+        jid = local_cache.prep_jid()
+        load = {'jid': jid, 'id': 'alpha', 'return': True}
+        self.assertIsNone(local_cache.returner(dict(load)))
+        self.assertFalse(local_cache.returner(dict(load)))
+        self.assertFalse(
+            local_cache.returner(dict(load, jid='20150101000000000001')))
+        self.assertEqual(local_cache.get_jid(jid), {'alpha': {'return': True}})
+
+    @skipIf(salt.utils.is_windows(), 'The worker is stopped with SIGTERM')
+    def test_flush_on_exit(self):
+        '''
+        The returns buffered by a worker are written when it is stopped
+        '''
+        jid = local_cache.prep_jid()
+        ready = multiprocessing.Event()
+        worker = BufferingWorker(jid, ready)
+        worker.start()
+        try:
+            self.assertTrue(ready.wait(10))
+            self.assertEqual(local_cache.get_jid(jid), {})
+            os.kill(worker.pid, signal.SIGTERM)
+            worker.join(10)
+        finally:
+            if worker.is_alive():
+                worker.terminate()
+        self.assertEqual(local_cache.get_jid(jid), {'alpha': {'return': True}})
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(LocalCacheIndexTestCase, LocalCacheBatchTestCase,
+              needs_daemon=False)
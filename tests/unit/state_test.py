@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.state_test
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Test calling the state chunks from worker processes
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import textwrap
+import time
+
+# Import Salt Testing libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch
+ensure_in_syspath('../')
+
+# Import salt libs
+import integration
+import salt.config
+import salt.loader
+import salt.utils
+from salt.state import HighState
+
+
+@skipIf(salt.utils.is_windows(), 'The state workers are forked')
+class StateWorkersTestCase(TestCase):
+    '''
+    Test salt.state.State.call_chunks_parallel
+    '''
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp(dir=integration.TMP)
+        self.state_tree_dir = os.path.join(self.root_dir, 'state_tree')
+        os.makedirs(self.state_tree_dir)
+        self.opts = salt.config.minion_config(None)
+        self.opts['root_dir'] = self.root_dir
+        self.opts['cachedir'] = os.path.join(self.root_dir, 'cachedir')
+        self.opts['state_events'] = False
+        self.opts['id'] = 'match'
+        self.opts['file_client'] = 'local'
+        self.opts['file_roots'] = {'base': [self.state_tree_dir]}
+        self.opts['test'] = False
+        self.opts['state_workers'] = 2
+        self.opts['grains'] = salt.loader.grains(self.opts)
+        self.log = os.path.join(self.root_dir, 'log')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir, ignore_errors=True)
+
+    def run_sls(self, content):
+        with salt.utils.fopen(os.path.join(self.state_tree_dir, 'sls.sls'), 'w') as fp_:
+            fp_.write(textwrap.dedent(content.format(log=self.log)))
+        highstate = HighState(self.opts)
+        highstate.push_active()
+        try:
+            high, errors = highstate.render_highstate({'base': ['sls']})
+            self.assertEqual(errors, [])
+            ret = highstate.state.call_high(high)
+        finally:
+            highstate.pop_active()
+        ret = dict((tag.split('_|-')[1], val) for tag, val in ret.items())
+        return ret
+
+    def logged(self):
+        with salt.utils.fopen(self.log) as fp_:
+            return fp_.read().split()
+
+    def test_independent_states(self):
+        start = time.time()
+        ret = self.run_sls('''
+            a:
+              cmd.run:
+                - name: sleep 1; echo a >> {log}
+            b:
+              cmd.run:
+                - name: sleep 1; echo b >> {log}
+            ''')
+        self.assertLess(time.time() - start, 1.9)
+        self.assertTrue(ret['a']['result'])
+        self.assertTrue(ret['b']['result'])
+        self.assertIn('duration', ret['a'])
+        self.assertEqual(sorted(self.logged()), ['a', 'b'])
+
+    def test_requisites(self):
+        ret = self.run_sls('''
+            a:
+              cmd.run:
+                - name: sleep 0.5; echo a >> {log}
+            b:
+              cmd.run:
+                - name: echo b >> {log}
+                - require:
+                  - cmd: a
+            c:
+              cmd.run:
+                - name: echo c >> {log}
+            d:
+              cmd.run:
+                - name: echo d >> {log}
+                - onchanges:
+                  - test: e
+            e:
+              test.succeed_without_changes
+            ''')
+        self.assertEqual(self.logged(), ['c', 'a', 'b'])
+        self.assertLess(ret['a']['__run_num__'], ret['b']['__run_num__'])
+        self.assertTrue(ret['d']['result'])
+        self.assertNotIn('duration', ret['d'])
+
+    def test_order(self):
+        self.run_sls('''
+            a:
+              cmd.run:
+                - name: echo a >> {log}
+            b:
+              cmd.run:
+                - name: sleep 0.5; echo b >> {log}
+                - order: 1
+            c:
+              cmd.run:
+                - name: echo c >> {log}
+                - order: last
+            ''')
+        self.assertEqual(self.logged(), ['b', 'a', 'c'])
+
+    def test_failhard(self):
+        ret = self.run_sls('''
+            a:
+              test.fail_without_changes:
+                - failhard: True
+            b:
+              cmd.run:
+                - name: sleep 0.5; echo b >> {log}
+            c:
+              cmd.run:
+                - name: echo c >> {log}
+            ''')
+        self.assertFalse(ret['a']['result'])
+        self.assertTrue(ret['b']['result'])
+        self.assertNotIn('c', ret)
+        self.assertEqual(self.logged(), ['b'])
+
+    def test_serial_states(self):
+        with patch('salt.state.STATE_WORKERS_SERIAL', frozenset(['cmd'])):
+            ret = self.run_sls('''
+                a:
+                  cmd.run:
+                    - name: sleep 0.5; echo a >> {log}
+                b:
+                  cmd.run:
+                    - name: echo b >> {log}
+                c:
+                  test.succeed_without_changes
+                ''')
+        # b does not start before a is done
+        self.assertEqual(self.logged(), ['a', 'b'])
+        self.assertTrue(ret['b']['result'])
+        self.assertTrue(ret['c']['result'])
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(StateWorkersTestCase, needs_daemon=False)
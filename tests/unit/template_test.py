@@ -5,6 +5,8 @@
 
 # Import Python libs
 from __future__ import absolute_import
+import os
+import tempfile
 
 # Import Salt Testing libs
 from salttesting import TestCase
@@ -29,6 +31,36 @@ class TemplateTestCase(TestCase):
         ret = template.compile_template(['1', '2', '3'], None, None)
         self.assertDictEqual(ret, {})
 
+    def test_compile_template_jinja_cache(self):
+        '''
+        Test that the jinja_cache is only passed to the renderers accepting it
+        '''
+        calls = []
+
+        def jinja(data, saltenv, sls, jinja_cache=None, **kws):
+            calls.append(('jinja', jinja_cache, kws))
+            return data
+
+        def yaml(data, saltenv, sls, **kws):
+            calls.append(('yaml', None, kws))
+            return {'a': 'b'}
+
+        fd_, path = tempfile.mkstemp()
+        os.write(fd_, b'a: b\n')
+        os.close(fd_)
+        cache = {}
+        try:
+            ret = template.compile_template(path,
+                                            {'jinja': jinja, 'yaml': yaml},
+                                            'jinja|yaml',
+                                            jinja_cache=cache)
+        finally:
+            os.remove(path)
+        self.assertEqual(ret, {'a': 'b'})
+        self.assertIs(calls[0][1], cache)
+        self.assertEqual(calls[1][0], 'yaml')
+        self.assertNotIn('jinja_cache', calls[1][2])
+
     def test_check_render_pipe_str(self):
         '''
         Check that all renderers specified in the pipe string are available.
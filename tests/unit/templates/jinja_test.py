@@ -4,6 +4,7 @@
 from __future__ import absolute_import
 import os
 import copy
+import shutil
 import tempfile
 import json
 import datetime
@@ -13,11 +14,13 @@ import pprint
 from salttesting.unit import skipIf, TestCase
 from salttesting.case import ModuleCase
 from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch
 ensure_in_syspath('../../')
 
 # Import salt libs
 import salt.loader
 import salt.utils
+import salt.utils.templates
 from salt.exceptions import SaltRenderError
 from salt.ext.six.moves import builtins
 from salt.utils import get_context
@@ -142,10 +145,14 @@ class TestSaltCacheLoader(TestCase):
 
 
 class TestGetTemplate(TestCase):
-    def __init__(self, *args, **kws):
-        TestCase.__init__(self, *args, **kws)
+    def setUp(self):
+        # The templates are served from a copy in the cachedir, so that the
+        # caches written by the renders stay out of the source tree
+        self.cachedir = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(TEMPLATES_DIR, 'files'),
+                        os.path.join(self.cachedir, 'files'))
         self.local_opts = {
-            'cachedir': TEMPLATES_DIR,
+            'cachedir': self.cachedir,
             'file_client': 'local',
             'file_ignore_regex': None,
             'file_ignore_glob': None,
@@ -162,6 +169,9 @@ class TestGetTemplate(TestCase):
                 'extmods'),
         }
 
+    def tearDown(self):
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
     def test_fallback(self):
         '''
         A Template with a filesystem loader is returned as fallback
@@ -199,7 +209,7 @@ class TestGetTemplate(TestCase):
         filename = os.path.join(TEMPLATES_DIR, 'files', 'test', 'hello_import')
         out = render_jinja_tmpl(
                 salt.utils.fopen(filename).read(),
-                dict(opts={'cachedir': TEMPLATES_DIR, 'file_client': 'remote',
+                dict(opts={'cachedir': self.cachedir, 'file_client': 'remote',
                            'file_roots': self.local_opts['file_roots'],
                            'pillar_roots': self.local_opts['pillar_roots']},
                      a='Hi', b='Salt', saltenv='test'))
@@ -290,7 +300,7 @@ class TestGetTemplate(TestCase):
         filename = os.path.join(TEMPLATES_DIR, 'files', 'test', 'hello_import')
         out = render_jinja_tmpl(
                 salt.utils.fopen(filename).read(),
-                dict(opts={'cachedir': TEMPLATES_DIR, 'file_client': 'remote',
+                dict(opts={'cachedir': self.cachedir, 'file_client': 'remote',
                            'file_roots': self.local_opts['file_roots'],
                            'pillar_roots': self.local_opts['pillar_roots']},
                      a='Hi', b='Sàlt', saltenv='test'))
@@ -303,7 +313,7 @@ class TestGetTemplate(TestCase):
         filename = os.path.join(TEMPLATES_DIR, 'files', 'test', 'non_ascii')
         out = render_jinja_tmpl(
                 salt.utils.fopen(filename).read(),
-                dict(opts={'cachedir': TEMPLATES_DIR, 'file_client': 'remote',
+                dict(opts={'cachedir': self.cachedir, 'file_client': 'remote',
                            'file_roots': self.local_opts['file_roots'],
                            'pillar_roots': self.local_opts['pillar_roots']},
                      a='Hi', b='Sàlt', saltenv='test'))
@@ -344,6 +354,79 @@ class TestGetTemplate(TestCase):
             result = fp.read().decode('utf-8')
             self.assertEqual(u'Assunção\n', result)
 
+    def test_jinja_cache(self):
+        '''
+        A template found in the jinja_cache is not compiled again, unless its
+        source changed
+        '''
+        fn_ = os.path.join(TEMPLATES_DIR, 'files', 'test', 'hello_simple')
+        cache = {}
+        compile_ = Environment.compile
+        with patch.object(Environment, 'compile', autospec=True,
+                          side_effect=compile_) as compiled:
+            for tmplstr in ('{{ a }}', '{{ a }}', '{{ a }}!'):
+                out = render_jinja_tmpl(
+                        tmplstr,
+                        dict(opts=dict(self.local_opts,
+                                       jinja_bytecode_cache=False),
+                             saltenv='test', a='b'),
+                        tmplpath=fn_,
+                        jinja_cache=cache)
+            self.assertEqual(out, 'b!')
+            self.assertEqual(compiled.call_count, 2)
+        self.assertEqual(list(cache), [fn_])
+
+    def test_bytecode_cache(self):
+        '''
+        The compiled templates are kept in the cachedir and used by the
+        renders of the other processes, until the template changes
+        '''
+        fn_ = os.path.join(TEMPLATES_DIR, 'files', 'test', 'hello_simple')
+        opts = self.local_opts
+        compile_ = Environment.compile
+        with patch.object(Environment, 'compile', autospec=True,
+                          side_effect=compile_) as compiled:
+            for tmplstr in ('{{ a }}', '{{ a }}', '{{ a }}!'):
+                # Every render starts from a new environment, as in a new
+                # process
+                salt.utils.templates._JINJA_ENVS.clear()
+                out = render_jinja_tmpl(
+                        tmplstr,
+                        dict(opts=opts, saltenv='test', a='b'),
+                        tmplpath=fn_)
+            self.assertEqual(out, 'b!')
+            self.assertEqual(compiled.call_count, 2)
+            # A template rendered from a string is not cached
+            for _ in range(2):
+                out = render_jinja_tmpl(
+                        '{{ a }}?',
+                        dict(opts=opts, saltenv='test', a='b'))
+            self.assertEqual(out, 'b?')
+            self.assertEqual(compiled.call_count, 4)
+        self.assertEqual(
+            len(os.listdir(os.path.join(opts['cachedir'], 'jinja'))), 1)
+
+    def test_shared_environment(self):
+        '''
+        The renders with the same jinja options share their environment,
+        the templates loaded by one render do not change it
+        '''
+        fn_ = os.path.join(TEMPLATES_DIR, 'files', 'test', 'hello_import')
+        opts = dict(self.local_opts, jinja_bytecode_cache=False)
+        with salt.utils.fopen(fn_) as fp_:
+            tmplstr = fp_.read()
+        for _ in range(2):
+            out = render_jinja_tmpl(tmplstr, dict(opts=opts, saltenv='test'))
+            self.assertEqual(out, 'Hey world !a b !\n')
+        jinja_env = salt.utils.templates._get_jinja_env(opts)
+        self.assertIs(jinja_env, salt.utils.templates._get_jinja_env(opts))
+        self.assertIsNone(jinja_env.loader)
+        self.assertNotIn('tplfile', jinja_env.globals)
+        self.assertIsNot(
+            jinja_env,
+            salt.utils.templates._get_jinja_env(
+                dict(opts, jinja_trim_blocks=True)))
+
     def test_get_context_has_enough_context(self):
         template = '1\n2\n3\n4\n5\n6\n7\n8\n9\na\nb\nc\nd\ne\nf'
         context = get_context(template, 8)
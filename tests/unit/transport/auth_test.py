@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.transport.auth_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+
+ensure_in_syspath('../../')
+
+# Import Salt libs
+from salt.transport.mixins.auth import TokenBucket
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class TokenBucketTestCase(TestCase):
+    '''
+    Test the token bucket limiting the rate of the authentications
+    '''
+    @patch('time.time')
+    def test_acquire(self, time_mock):
+        '''
+        The requests over the burst are told to wait for their turn
+        '''
+        time_mock.return_value = 1000.0
+        bucket = TokenBucket(10, 2)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+        self.assertAlmostEqual(bucket.acquire(), 0.2)
+
+        # The first of the turned away requests gets a token in time, the
+        # backlog drains at the same rate
+        time_mock.return_value = 1000.1
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), 0.2)
+
+        # An idle bucket fills up to the burst
+        time_mock.return_value = 1100.0
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+
+    def test_default_burst(self):
+        '''
+        The burst defaults to the rate, and at least one request
+        '''
+        self.assertEqual(TokenBucket(20).burst, 20)
+        self.assertEqual(TokenBucket(0.5).burst, 1)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(TokenBucketTestCase, needs_daemon=False)
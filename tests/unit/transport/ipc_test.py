@@ -7,7 +7,9 @@
 from __future__ import absolute_import
 import os
 import logging
+import socket
 
+import msgpack
 import tornado.gen
 import tornado.ioloop
 import tornado.testing
@@ -24,7 +26,7 @@ from salt.ext.six.moves import range
 # Import Salt Testing libs
 import integration
 
-from salttesting.mock import MagicMock
+from salttesting.mock import MagicMock, patch
 from salttesting.helpers import ensure_in_syspath
 
 log = logging.getLogger(__name__)
@@ -141,6 +143,159 @@ class IPCMessageClient(BaseIPCReqCase):
         self.assertEqual(self.payloads[:-1], [None, None, 'foo', 'foo'])
 
 
+class IPCMessagePubSubCase(tornado.testing.AsyncTestCase):
+    '''
+    Test the tag filters of the publisher/subscriber pair
+    '''
+    def setUp(self):
+        super(IPCMessagePubSubCase, self).setUp()
+        self.socket_path = os.path.join(integration.TMP, 'ipc_pub_test.ipc')
+        self.pub_channel = salt.transport.ipc.IPCMessagePublisher(
+            self.socket_path,
+            io_loop=self.io_loop,
+        )
+        self.pub_channel.start()
+        self.sub_channel = salt.transport.ipc.IPCMessageSubscriber(
+            socket_path=self.socket_path,
+            io_loop=self.io_loop,
+        )
+        self.payloads = []
+
+    def tearDown(self):
+        self.sub_channel.close()
+        self.pub_channel.close()
+        os.unlink(self.socket_path)
+        super(IPCMessagePubSubCase, self).tearDown()
+
+    def _handle_payload(self, payload):
+        self.payloads.append(payload)
+        if payload == 'stop':
+            self.stop()
+
+    def _wait_for_filters(self):
+        # The publisher reads the filters in the background
+        while not self.pub_channel.stats() or \
+                self.pub_channel.stats()[0]['filters'] is None:
+            self.io_loop.add_timeout(self.io_loop.time() + 0.01, self.stop)
+            self.wait()
+
+    def test_filters(self):
+        self.sub_channel.subscribe([['startswith', 'salt/job/'],
+                                    ['fnmatch', 'salt/auth*']])
+        self.sub_channel.connect(callback=self.stop)
+        self.wait()
+        self._wait_for_filters()
+        self.sub_channel.read_async(self._handle_payload)
+
+        for tag in ('salt/job/1/ret', 'salt/key', 'salt/auth'):
+            self.pub_channel.publish(tag, tag=tag)
+        # Messages published without a tag go to everyone
+        self.pub_channel.publish('stop')
+        self.wait()
+
+        self.assertEqual(self.payloads, ['salt/job/1/ret', 'salt/auth', 'stop'])
+        stats = self.pub_channel.stats()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['delivered'], 3)
+        self.assertEqual(stats[0]['dropped'], 1)
+
+    def test_unfiltered(self):
+        self.sub_channel.connect(callback=self.stop)
+        self.wait()
+        self.sub_channel.read_async(self._handle_payload)
+
+        self.pub_channel.publish('salt/key', tag='salt/key')
+        self.pub_channel.publish('stop', tag='stop')
+        self.wait()
+
+        self.assertEqual(self.payloads, ['salt/key', 'stop'])
+        self.assertEqual(self.pub_channel.stats()[0]['dropped'], 0)
+
+
+class IPCMessagePublisherOverflowCase(tornado.testing.AsyncTestCase):
+    '''
+    Test the bounded subscriber queues of the publisher
+    '''
+    def setUp(self):
+        super(IPCMessagePublisherOverflowCase, self).setUp()
+        self.socket_path = os.path.join(integration.TMP, 'ipc_overflow_test.ipc')
+        self.pub_channel = None
+        self.sock = None
+        self.overflows = []
+
+    def tearDown(self):
+        if self.sock is not None:
+            self.sock.close()
+        if self.pub_channel is not None:
+            self.pub_channel.close()
+            os.unlink(self.socket_path)
+        super(IPCMessagePublisherOverflowCase, self).tearDown()
+
+    def _handle_overflow(self, subscribers):
+        self.overflows.extend(subscribers)
+        self.stop()
+
+    def _start(self, policy):
+        self.pub_channel = salt.transport.ipc.IPCMessagePublisher(
+            self.socket_path,
+            io_loop=self.io_loop,
+            max_queue_size=1024 * 1024,
+            overflow_policy=policy,
+            overflow_handler=self._handle_overflow,
+        )
+        self.pub_channel.start()
+        # A subscriber which never reads
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+        while not self.pub_channel.streams:
+            self.io_loop.add_timeout(self.io_loop.time() + 0.01, self.stop)
+            self.wait()
+
+    def _publish(self):
+        # 50 messages of 100KB each, published before any can be written
+        for idx in range(50):
+            self.pub_channel.publish('{0}:{1}'.format(idx, 'x' * 100 * 1024))
+
+    def _queued(self):
+        queue = list(self.pub_channel.queues.values())[0]
+        return [int(msgpack.loads(pack)['body'].split(':')[0]) for pack in queue]
+
+    @patch('salt.transport.ipc.OVERFLOW_REPORT_INTERVAL', 0.1)
+    def test_drop_oldest(self):
+        self._start('drop_oldest')
+        self._publish()
+        queued = self._queued()
+        self.assertEqual(queued, list(range(50 - len(queued), 50)))
+        stats = self.pub_channel.stats()[0]
+        self.assertLessEqual(stats['queued'], 1024 * 1024)
+        self.assertEqual(stats['overflowed'], 50 - len(queued))
+        self.wait()
+        self.assertEqual(self.overflows, [{'id': 1,
+                                           'overflowed': 50 - len(queued),
+                                           'disconnected': False}])
+
+    @patch('salt.transport.ipc.OVERFLOW_REPORT_INTERVAL', 0.1)
+    def test_drop_newest(self):
+        self._start('drop_newest')
+        self._publish()
+        queued = self._queued()
+        self.assertEqual(queued, list(range(len(queued))))
+        self.assertEqual(self.pub_channel.stats()[0]['overflowed'],
+                         50 - len(queued))
+
+    @patch('salt.transport.ipc.OVERFLOW_REPORT_INTERVAL', 0.1)
+    def test_disconnect(self):
+        self._start('disconnect')
+        self._publish()
+        self.assertEqual(self.pub_channel.stats(), [])
+        self.wait()
+        self.assertEqual(len(self.overflows), 1)
+        self.assertTrue(self.overflows[0]['disconnected'])
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(IPCMessageClient, needs_daemon=False)
+    run_tests([IPCMessageClient,
+               IPCMessagePubSubCase,
+               IPCMessagePublisherOverflowCase],
+              needs_daemon=False)
@@ -6,17 +6,25 @@
 # Import python libs
 from __future__ import absolute_import
 import os
+import shutil
+import socket
+import tempfile
 import threading
 
 import tornado.gen
 import tornado.ioloop
+import tornado.testing
 from tornado.testing import AsyncTestCase
 
 import salt.config
+import salt.crypt
 import salt.utils
+import salt.utils.cache
 import salt.transport.server
 import salt.transport.client
+import salt.transport.tcp
 import salt.exceptions
+from salt.transport.frame import frame_msg, WRITE_CHUNK_SIZE
 
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
@@ -184,7 +192,145 @@ class AsyncPubChannelTest(BaseTCPPubCase, PubChannelMixin):
     Tests around the publish system
     '''
 
+
+class PubServerTestCase(AsyncTestCase):
+    '''
+    Test the identification of the subscribers of the TCP publisher and the
+    targeted delivery of the publications
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.pki_dir = os.path.join(cls.tmp_dir, 'pki')
+        os.makedirs(os.path.join(cls.pki_dir, 'minions'))
+        for minion in ('alpha', 'beta'):
+            minion_pki = os.path.join(cls.pki_dir, minion)
+            os.makedirs(minion_pki)
+            salt.crypt.gen_keys(minion_pki, 'minion', 1024)
+            shutil.copy(os.path.join(minion_pki, 'minion.pub'),
+                        os.path.join(cls.pki_dir, 'minions', minion))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def setUp(self):
+        super(PubServerTestCase, self).setUp()
+        self.opts = {'pki_dir': self.pki_dir,
+                     'sock_dir': self.tmp_dir,
+                     'connected_registry': True}
+        salt.utils.cache.ConnectedRegistry(self.opts, create=True)
+        self.registry = salt.utils.cache.ConnectedRegistry(self.opts)
+        self.pub_server = salt.transport.tcp.PubServer(self.opts, io_loop=self.io_loop)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(5)
+        sock.setblocking(0)
+        self.port = sock.getsockname()[1]
+        self.pub_server.add_socket(sock)
+        self.received = {}
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.pub_server.stop()
+        self.registry.close()
+        super(PubServerTestCase, self).tearDown()
+
+    def _subscribe(self, name, minion_id=None):
+        '''
+        Connect a subscriber, which identifies itself if given a minion id
+        '''
+        self.received[name] = []
+        callback = None
+        if minion_id is not None:
+            chan = salt.transport.tcp.AsyncTCPPubChannel(
+                {'id': minion_id,
+                 'pki_dir': os.path.join(self.pki_dir, minion_id)},
+                io_loop=self.io_loop)
+            callback = chan._handshake
+        client = salt.transport.tcp.SaltMessageClient(
+            {}, '127.0.0.1', self.port, io_loop=self.io_loop,
+            connect_callback=callback)
+        if minion_id is not None:
+            chan.message_client = client
+        client.on_recv(self.received[name].append)
+        self.clients.append(client)
+        return client
+
+    @tornado.gen.coroutine
+    def _wait(self, condition):
+        for _ in range(100):
+            if condition():
+                break
+            yield tornado.gen.sleep(0.05)
+
+    @tornado.testing.gen_test
+    def test_targeted_publish(self):
+        '''
+        Targeted publications are only sent to the targeted minions and to the
+        subscribers which did not identify themselves
+        '''
+        alpha = self._subscribe('alpha', 'alpha')
+        self._subscribe('beta', 'beta')
+        self._subscribe('anonymous')
+        yield self._wait(lambda: len(self.pub_server.present) == 2)
+        self.assertEqual(set(self.pub_server.present), set(['alpha', 'beta']))
+        self.assertEqual(self.registry.connected(), set(['alpha', 'beta']))
+
+        yield self.pub_server.publish_payload({'frame': frame_msg('all')}, None)
+        yield self.pub_server.publish_payload(
+            {'frame': frame_msg('targeted'), 'topic_lst': ['alpha', 'gamma']},
+            None)
+        yield self._wait(lambda: len(self.received['anonymous']) == 2)
+        self.assertEqual(self.received['alpha'], ['all', 'targeted'])
+        self.assertEqual(self.received['beta'], ['all'])
+        self.assertEqual(self.received['anonymous'], ['all', 'targeted'])
+
+        alpha.close()
+        yield self._wait(lambda: 'alpha' not in self.pub_server.present)
+        self.assertEqual(self.registry.connected(), set(['beta']))
+
+    @tornado.testing.gen_test
+    def test_large_publish(self):
+        '''
+        A frame larger than a write chunk reaches all of the subscribers intact
+        '''
+        self._subscribe('alpha', 'alpha')
+        self._subscribe('anonymous')
+        yield self._wait(lambda: len(self.pub_server.clients) == 2)
+
+        body = 'x' * (3 * WRITE_CHUNK_SIZE + 7)
+        yield self.pub_server.publish_payload({'frame': frame_msg(body)}, None)
+        yield self._wait(lambda: len(self.received['anonymous']) == 1 and
+                         len(self.received['alpha']) == 1)
+        self.assertEqual(self.received['alpha'], [body])
+        self.assertEqual(self.received['anonymous'], [body])
+
+    @tornado.testing.gen_test
+    def test_unverified_subscriber(self):
+        '''
+        A subscriber which can not prove its identity stays unidentified
+        '''
+        os.rename(os.path.join(self.pki_dir, 'beta', 'minion.pem'),
+                  os.path.join(self.pki_dir, 'beta', 'minion.pem.bak'))
+        shutil.copy(os.path.join(self.pki_dir, 'alpha', 'minion.pem'),
+                    os.path.join(self.pki_dir, 'beta', 'minion.pem'))
+        try:
+            self._subscribe('beta', 'beta')
+            yield self._wait(lambda: self.pub_server.clients)
+            # Leave the subscriber the time to go through the handshake
+            yield tornado.gen.sleep(0.5)
+            self.assertEqual(self.pub_server.present, {})
+            self.assertEqual(len(self.pub_server.unidentified), 1)
+        finally:
+            os.rename(os.path.join(self.pki_dir, 'beta', 'minion.pem.bak'),
+                      os.path.join(self.pki_dir, 'beta', 'minion.pem'))
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(ClearReqTestCases, needs_daemon=False)
     run_tests(AESReqTestCases, needs_daemon=False)
+    run_tests(PubServerTestCase, needs_daemon=False)
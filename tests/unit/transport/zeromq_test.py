@@ -18,8 +18,11 @@ from tornado.testing import AsyncTestCase
 import tornado.gen
 
 import salt.config
+import salt.payload
 import salt.utils
 import salt.transport.server
+import salt.transport.zeromq
+from salt.transport.mixins.auth import TokenBucket
 import salt.transport.client
 import salt.exceptions
 
@@ -192,7 +195,49 @@ class AsyncPubChannelTest(BaseZMQPubCase, PubChannelMixin):
         return zmq.eventloop.ioloop.ZMQIOLoop()
 
 
+class AuthRoutingTestCase(TestCase):
+    '''
+    Test the detection of the requests for the auth workers
+    '''
+    def setUp(self):
+        opts = {'auth_workers': 1, 'sock_dir': '/tmp'}
+        self.chan = salt.transport.zeromq.ZeroMQReqServerChannel(opts)
+        self.chan.serial = salt.payload.Serial(opts)
+
+    def _frame(self, payload):
+        return zmq.Frame(self.chan.serial.dumps(payload))
+
+    def test_is_auth(self):
+        '''
+        Only the clear _auth requests go to the auth workers
+        '''
+        auth = {'enc': 'clear',
+                'load': {'cmd': '_auth', 'id': 'minion', 'pub': 'key'}}
+        self.assertTrue(self.chan._is_auth(self._frame(auth)))
+        self.assertFalse(self.chan._is_auth(self._frame(
+            {'enc': 'clear', 'load': {'cmd': 'publish', 'arg': ['_auth']}})))
+        self.assertFalse(self.chan._is_auth(self._frame(
+            {'enc': 'aes', 'load': 'x' * 100})))
+        self.assertFalse(self.chan._is_auth(zmq.Frame('_auth')))
+        auth['load']['pub'] = 'x' * salt.transport.zeromq.AUTH_PAYLOAD_MAX
+        self.assertFalse(self.chan._is_auth(self._frame(auth)))
+
+    def test_auth_channel(self):
+        '''
+        The auth workers connect to their own socket
+        '''
+        self.chan.auth_bucket = TokenBucket(10)
+        auth_chan = self.chan.auth_channel()
+        self.assertTrue(auth_chan.auth)
+        self.assertIs(auth_chan.auth_bucket, self.chan.auth_bucket)
+        self.assertEqual(auth_chan._workers_uri(auth=auth_chan.auth),
+                         'ipc:///tmp/auth_workers.ipc')
+        self.chan.opts['auth_workers'] = 0
+        self.assertIsNone(self.chan.auth_channel())
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(ClearReqTestCases, needs_daemon=False)
     run_tests(AESReqTestCases, needs_daemon=False)
+    run_tests(AuthRoutingTestCase, needs_daemon=False)
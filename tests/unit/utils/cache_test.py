@@ -8,10 +8,12 @@
 
 # Import python libs
 from __future__ import absolute_import
+import shutil
+import tempfile
 import time
 
 # Import Salt Testing libs
-from salttesting import TestCase
+from salttesting import TestCase, skipIf
 from salttesting.helpers import ensure_in_syspath
 ensure_in_syspath('../../')
 
@@ -47,6 +49,58 @@ class CacheDictTestCase(TestCase):
         self.assertRaises(KeyError, cd.__getitem__, 'foo')
 
 
+@skipIf(not cache.HAS_FCNTL, 'fcntl is not available')
+class ConnectedRegistryTestCase(TestCase):
+    '''
+    Test the memory mapped registry of connected minions
+    '''
+    def setUp(self):
+        self.sock_dir = tempfile.mkdtemp()
+        self.opts = {'sock_dir': self.sock_dir,
+                     'connected_registry': True,
+                     'connected_registry_size': 4}
+
+    def tearDown(self):
+        shutil.rmtree(self.sock_dir, ignore_errors=True)
+
+    def test_connect_disconnect(self):
+        '''
+        Changes made through one registry are seen through another one
+        '''
+        self.assertIsNone(cache.ConnectedRegistry(self.opts).connected())
+        writer = cache.ConnectedRegistry(self.opts, create=True)
+        reader = cache.get_connected_registry(self.opts)
+        self.assertEqual(reader.connected(), set())
+
+        writer.connect('alpha')
+        writer.connect('beta')
+        writer.connect('alpha')
+        self.assertEqual(reader.connected(), set(['alpha', 'beta']))
+        writer.disconnect('alpha')
+        writer.disconnect('gamma')
+        self.assertEqual(reader.connected(), set(['beta']))
+        self.assertEqual(reader.filter(['alpha', 'beta', 'gamma']), ['beta'])
+
+        reader.sync(['gamma', 'delta'])
+        self.assertEqual(writer.connected(), set(['gamma', 'delta']))
+
+        # Recreating the registry, as the master does when it starts
+        cache.ConnectedRegistry(self.opts, create=True)
+        self.assertEqual(reader.connected(), set())
+
+    def test_overflow(self):
+        '''
+        A full registry is no longer used
+        '''
+        registry = cache.ConnectedRegistry(self.opts, create=True)
+        for minion in ('a', 'b', 'c', 'd'):
+            registry.connect(minion)
+        self.assertEqual(len(registry.connected()), 4)
+        registry.connect('e')
+        self.assertIsNone(registry.connected())
+        self.assertIsNone(registry.filter(['a']))
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(CacheDictTestCase, needs_daemon=False)
+    run_tests(CacheDictTestCase, ConnectedRegistryTestCase, needs_daemon=False)
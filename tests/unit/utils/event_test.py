@@ -294,6 +294,26 @@ class TestSaltEvent(TestCase):
             evt2 = me2.get_event(tag='evt1')
             self.assertGotEvent(evt2, {'data': 'foo1'})
 
+    def test_event_tag_filter(self):
+        '''Test the publisher only sends a client the events it filters for'''
+        with eventpublisher_process():
+            me1 = event.MasterEvent(SOCK_DIR, listen=True)
+            me2 = event.MasterEvent(SOCK_DIR, listen=False)
+            me2.set_tag_filter(['evt2', 'evt3*'], 'fnmatch')
+            me2.connect_pub()
+            # Give the publisher time to read the filter
+            time.sleep(0.5)
+            me1.fire_event({'data': 'foo1'}, 'evt1')
+            me1.fire_event({'data': 'foo2'}, 'evt2')
+            me1.fire_event({'data': 'foo3'}, 'evt3/sub')
+            evt1 = me1.get_event(tag='')
+            self.assertGotEvent(evt1, {'data': 'foo1'})
+            evt2 = me2.get_event(tag='')
+            self.assertGotEvent(evt2, {'data': 'foo2'})
+            evt3 = me2.get_event(tag='')
+            self.assertGotEvent(evt3, {'data': 'foo3'})
+            self.assertRaises(ValueError, me2.set_tag_filter, ['evt'], 'regex')
+
     @expectedFailure
     def test_event_nested_sub_all(self):
         '''Test nested event subscriptions do not drop events, get event for all tags'''
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.gitfs_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the file index written by salt.utils.gitfs.GitFS, and the
+    concurrent fetching of the remotes
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+# Import Salt Testing libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, patch
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.config
+import salt.utils.gitfs
+
+
+class FakeRepo(salt.utils.gitfs.GitProvider):
+    '''
+    A remote whose environments are dicts mapping repo paths to contents
+    '''
+    def __init__(self, remote, trees, root='', mountpoint=''):  # pylint: disable=W0231
+        self.id = remote
+        self.root = root
+        self.mountpoint = mountpoint
+        self.trees = trees
+        self.walked = 0
+        self.read = []
+        self.fetch_time = 0
+        self.fetch_result = False
+        self.fetched = 0
+        self.locked = False
+
+    def clear_lock(self):
+        self.locked = False
+        return [], []
+
+    def fetch(self):
+        if self.locked:
+            return False
+        self.fetched += 1
+        self.locked = True
+        time.sleep(self.fetch_time)
+        return self.fetch_result
+
+    def dir_list(self, tgt_env):
+        ret = set()
+        for path in self.trees.get(tgt_env, {}):
+            path = os.path.dirname(path)
+            while path:
+                ret.add(path)
+                path = os.path.dirname(path)
+        return ret
+
+    def get_tree_id(self, tgt_env):
+        if tgt_env not in self.trees:
+            return None
+        return hashlib.sha1(repr(sorted(self.trees[tgt_env].items()))).hexdigest()
+
+    def walk_blobs(self, tgt_env):
+        self.walked += 1
+        for path, data in sorted(self.trees.get(tgt_env, {}).items()):
+            mode = stat.S_IFREG | 0o644
+            if isinstance(data, tuple):
+                # A symlink, given as a 1-tuple of its target
+                mode = stat.S_IFLNK
+                data = data[0]
+            yield (path, mode, hashlib.sha1(data).hexdigest(),
+                   lambda path=path, data=data: self._read(path, data))
+
+    def _read(self, path, data):
+        self.read.append(path)
+        return data
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class GitFSFileIndexTestCase(TestCase):
+    '''
+    Test the file index of salt.utils.gitfs.GitFS
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.opts = salt.config.master_config(None)
+        self.opts['cachedir'] = self.tmp_dir
+        self.repo = FakeRepo('file:///repo',
+                             {'base': {'top.sls': 'foo',
+                                       'a/init.sls': 'bar',
+                                       'a/link': ('init.sls',)}})
+        self.gitfs = self._gitfs(self.repo)
+        self.gitfs.write_file_index()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        salt.utils.gitfs._FILE_INDEXES.clear()
+
+    def _gitfs(self, *remotes):
+        with patch.object(salt.utils.gitfs.GitBase, 'get_provider'):
+            gitfs = salt.utils.gitfs.GitFS(self.opts)
+        gitfs.remotes = list(remotes)
+        gitfs.envs = lambda ignore_cache=False: ['base']
+        return gitfs
+
+    def test_file_lists(self):
+        load = {'saltenv': 'base'}
+        self.assertEqual(self.gitfs.file_list(load),
+                         ['a/init.sls', 'a/link', 'top.sls'])
+        self.assertEqual(self.gitfs.dir_list(load), ['a'])
+        self.assertEqual(self.gitfs.symlink_list(load),
+                         {'a/link': 'init.sls'})
+        self.assertEqual(self.repo.walked, 1)
+
+    def test_file_hash(self):
+        load = {'saltenv': 'base', 'path': 'top.sls'}
+        fnd = {'path': '/nonexistent/top.sls', 'rel': 'top.sls'}
+        ret = self.gitfs.file_hash(load, fnd)
+        self.assertEqual(
+            ret['hsum'],
+            getattr(hashlib, self.opts['hash_type'])('foo').hexdigest()
+        )
+
+    def test_unchanged_tree(self):
+        self.gitfs.write_file_index()
+        self.assertEqual(self.repo.walked, 1)
+        self.repo.trees['base']['new'] = 'baz'
+        self.gitfs.write_file_index()
+        self.assertEqual(self.repo.walked, 2)
+        self.assertIn('new', self.gitfs.file_list({'saltenv': 'base'}))
+
+    def test_unchanged_blobs(self):
+        self.assertEqual(sorted(self.repo.read),
+                         ['a/init.sls', 'a/link', 'top.sls'])
+        self.repo.read = []
+        self.repo.trees['base']['top.sls'] = 'baz'
+        self.gitfs.write_file_index()
+        # Only the changed file and the symlink are read again
+        self.assertEqual(sorted(self.repo.read), ['a/link', 'top.sls'])
+        ret = self.gitfs.file_hash({'saltenv': 'base', 'path': 'a/init.sls'},
+                                   {'path': '/nonexistent/a/init.sls',
+                                    'rel': 'a/init.sls'})
+        self.assertEqual(
+            ret['hsum'],
+            getattr(hashlib, self.opts['hash_type'])('bar').hexdigest()
+        )
+
+    def test_changed_remotes(self):
+        other = FakeRepo('file:///other', {'base': {'other.sls': 'baz'}})
+        gitfs = self._gitfs(self.repo, other)
+        self.assertIsNone(gitfs.file_index('base'))
+        gitfs.write_file_index()
+        self.assertEqual(gitfs.file_list({'saltenv': 'base'}),
+                         ['a/init.sls', 'a/link', 'other.sls', 'top.sls'])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class FetchRemotesTestCase(TestCase):
+    '''
+    Test salt.utils.gitfs.GitBase.fetch_remotes
+    '''
+    def setUp(self):
+        self.opts = salt.config.master_config(None)
+        self.opts['gitfs_fetch_workers'] = 2
+        self.opts['gitfs_fetch_timeout'] = 1
+        self.remotes = [FakeRepo('file:///repo{0}'.format(x), {})
+                        for x in range(4)]
+        with patch.object(salt.utils.gitfs.GitBase, 'get_provider'):
+            self.gitfs = salt.utils.gitfs.GitFS(self.opts)
+        self.gitfs.remotes = self.remotes
+
+    def tearDown(self):
+        salt.utils.gitfs._LATE_FETCHES.clear()
+        salt.utils.gitfs._RUNNING_FETCHES.clear()
+
+    def test_fetch_remotes(self):
+        self.assertFalse(self.gitfs.fetch_remotes())
+        self.remotes[2].fetch_result = True
+        self.assertTrue(self.gitfs.fetch_remotes())
+        self.assertFalse(any(x.locked for x in self.remotes))
+
+    def test_timeout(self):
+        self.remotes[0].fetch_time = 3
+        self.remotes[0].fetch_result = True
+        self.remotes[1].fetch_time = 0.2
+        start = time.time()
+        self.assertFalse(self.gitfs.fetch_remotes())
+        self.assertLess(time.time() - start, 2.5)
+        # The slow fetch keeps its lock until it is done
+        self.assertTrue(self.remotes[0].locked)
+        self.assertFalse(any(x.locked for x in self.remotes[1:]))
+        time.sleep(3)
+        self.assertFalse(self.remotes[0].locked)
+        # Its changes are reported by the next fetch
+        self.remotes[0].fetch_time = 0
+        self.remotes[0].fetch_result = False
+        self.assertTrue(self.gitfs.fetch_remotes())
+
+    def test_late_fetch_running(self):
+        self.remotes[0].fetch_time = 2
+        self.remotes[0].fetch_result = True
+        self.assertFalse(self.gitfs.fetch_remotes())
+        # The remote is skipped while its fetch is running, and its lock is
+        # left alone
+        self.assertFalse(self.gitfs.fetch_remotes())
+        self.assertTrue(self.remotes[0].locked)
+        self.assertEqual(self.remotes[0].fetched, 1)
+        self.assertEqual(self.remotes[1].fetched, 2)
+        time.sleep(2)
+        self.assertFalse(self.remotes[0].locked)
+        self.remotes[0].fetch_time = 0
+        self.assertTrue(self.gitfs.fetch_remotes())
+        self.assertEqual(self.remotes[0].fetched, 2)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests([GitFSFileIndexTestCase, FetchRemotesTestCase],
+              needs_daemon=False)
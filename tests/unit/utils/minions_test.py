@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.minions_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the in-memory index of the minion data cache
+'''
+
+# Import python libs
+from __future__ import absolute_import
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.config
+import salt.utils
+from salt.utils import minions
+
+DATA = {
+    'web1': {'grains': {'os': 'Ubuntu',
+                        'osrelease': '14.04',
+                        'roles': ['web', 'db'],
+                        'ipv4': ['127.0.0.1', '10.0.0.1'],
+                        'locale_info': {'defaultlanguage': 'en_US'},
+                        'disks': [{'name': 'sda'}]},
+             'pillar': {'app': {'version': '1:2.0'}}},
+    'web2': {'grains': {'os': 'ubuntu',
+                        'osrelease': '12.04',
+                        'roles': ['web'],
+                        'ipv4': ['10.0.0.2'],
+                        'locale_info': {'defaultlanguage': 'de_DE'},
+                        'disks': [{'name': 'vda'}]},
+             'pillar': {'app': {'version': '1:1.0'}}},
+    'db1': {'grains': {'os': 'CentOS',
+                       'osrelease': '7',
+                       'roles': 'db',
+                       'num_cpus': 8},
+            'pillar': {}},
+}
+
+EXPRS = (
+    ('grains', 'os:Ubuntu'),
+    ('grains', 'os:ubun*'),
+    ('grains', 'os:*'),
+    ('grains', 'osrelease:1?.04'),
+    ('grains', 'roles:db'),
+    ('grains', 'roles:0:web'),
+    ('grains', 'ipv4:10.0.0.*'),
+    ('grains', 'locale_info:defaultlanguage:en_US'),
+    ('grains', 'locale_info:defaultlanguage'),
+    ('grains', 'disks:name:vda'),
+    ('grains', 'num_cpus:8'),
+    ('grains', 'missing:foo'),
+    ('grains', 'os'),
+    ('pillar', 'app:version:1:2.0'),
+    ('pillar', 'app:version:1:*'),
+)
+
+
+class MinionDataIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.index = minions.MinionDataIndex()
+        for minion_id, data in DATA.items():
+            self.index.update(minion_id, data)
+
+    def _expected(self, search_type, expr, **kwargs):
+        return set(
+            minion_id for minion_id, data in DATA.items()
+            if salt.utils.subdict_match(data[search_type], expr, **kwargs)
+        )
+
+    def test_match_like_subdict_match(self):
+        for search_type, expr in EXPRS:
+            self.assertEqual(self.index.match(search_type, expr),
+                             self._expected(search_type, expr),
+                             expr)
+
+    def test_regex_and_exact_match(self):
+        for search_type, expr in EXPRS:
+            self.assertEqual(
+                self.index.match(search_type, expr, exact_match=True),
+                self._expected(search_type, expr, exact_match=True),
+                expr)
+        self.assertEqual(self.index.match('grains', 'os:(ubuntu|centos)$',
+                                          regex_match=True),
+                         set(['web1', 'web2', 'db1']))
+
+    def test_update_and_remove(self):
+        self.index.update('web1', {'grains': {'os': 'Debian'}, 'pillar': {}})
+        self.assertEqual(self.index.match('grains', 'os:Ubuntu'),
+                         set(['web2']))
+        self.assertEqual(self.index.match('grains', 'os:Debian'),
+                         set(['web1']))
+        self.index.remove('web2')
+        self.assertNotIn('web2', self.index)
+        self.assertEqual(self.index.match('grains', 'os:Ubuntu'), set())
+        self.assertNotIn('12.04', self.index.values['grains'][('osrelease',)])
+        for minion_id in list(self.index.ids()):
+            self.index.remove(minion_id)
+        self.assertEqual(self.index.values['grains'], {})
+        self.assertEqual(self.index.nested['grains'], {})
+        self.assertEqual(self.index.lists['grains'], {})
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class CkMinionsIndexTestCase(TestCase):
+    '''
+    Test the targets CkMinions does not look up in the index
+    '''
+    def setUp(self):
+        opts = salt.config.master_config(None)
+        opts['minion_data_cache'] = True
+        opts['minion_data_cache_index'] = True
+        opts['grains'] = {'ipv4': ['10.0.0.1']}
+        with patch('salt.cache.Cache'):
+            self.ckminions = minions.CkMinions(opts)
+        self.ckminions.cache.list.return_value = ['web1', 'web2']
+        self.ckminions.cache.fetch_many.side_effect = lambda banks, key: dict(
+            (bank, DATA[bank.split('/')[1]]) for bank in banks)
+        self.ckminions._data_cache_cli = MagicMock()
+
+    def test_ipcidr(self):
+        self.assertEqual(
+            sorted(self.ckminions._check_ipcidr_minions('10.0.0.0/24', False)),
+            ['web1', 'web2'])
+        self.assertEqual(self.ckminions._data_cache_cli.match.call_count, 0)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests([MinionDataIndexTestCase, CkMinionsIndexTestCase],
+              needs_daemon=False)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.reactor_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import fnmatch
+import os
+import shutil
+import tempfile
+import threading
+
+# Import Salt Testing libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
+ensure_in_syspath('../../')
+
+# Import salt libs
+import integration
+import salt.config
+import salt.utils
+import salt.utils.reactor
+
+REACT_MAP = [
+    {'salt/minion/*/start': ['/srv/reactor/start.sls']},
+    {'salt/auth': '/srv/reactor/auth.sls'},
+    {'salt/job/*/ret/web?': ['/srv/reactor/web.sls']},
+    {'salt/*': ['/srv/reactor/all.sls']},
+    {'salt/auth': ['/srv/reactor/auth2.sls']},
+    {'[ab]/tag': ['/srv/reactor/ab.sls']},
+    {'salt/job/*': 42},
+    'not a dict',
+]
+
+TAGS = [
+    'salt/auth',
+    'salt/minion/web1/start',
+    'salt/job/20160101/ret/web1',
+    'salt/job/20160101/ret/db1',
+    'a/tag',
+    'c/tag',
+    'salt',
+    '',
+]
+
+
+def fnmatch_reactors(react_map, tag):
+    '''
+    Match the tag against every entry of the reactor map
+    '''
+    reactors = []
+    for ropt in react_map:
+        if not isinstance(ropt, dict):
+            continue
+        key, val = next(iter(ropt.items()))
+        if fnmatch.fnmatch(tag, key):
+            if isinstance(val, str):
+                reactors.append(val)
+            elif isinstance(val, list):
+                reactors.extend(val)
+    return reactors
+
+
+class ReactorDispatchTestCase(TestCase):
+    '''
+    Test salt.utils.reactor.ReactorDispatch
+    '''
+    def test_matches_fnmatch(self):
+        dispatch = salt.utils.reactor.ReactorDispatch(REACT_MAP)
+        for tag in TAGS:
+            self.assertEqual(dispatch(tag), fnmatch_reactors(REACT_MAP, tag),
+                             tag)
+
+    def test_lookups(self):
+        dispatch = salt.utils.reactor.ReactorDispatch(REACT_MAP)
+        self.assertEqual(sorted(dispatch.exact), ['salt/auth'])
+        self.assertEqual(sorted(dispatch.prefixes), ['salt/'])
+        self.assertEqual([key for key, _ in dispatch.globs],
+                         ['salt/minion/*/start', 'salt/job/*/ret/web?', '[ab]/tag'])
+        self.assertEqual(dispatch.tags,
+                         ['salt/minion/*/start', 'salt/auth',
+                          'salt/job/*/ret/web?', 'salt/*', 'salt/auth',
+                          '[ab]/tag'])
+
+    def test_no_globs(self):
+        dispatch = salt.utils.reactor.ReactorDispatch([{'a': ['/a.sls']}])
+        self.assertIsNone(dispatch.globs_regex)
+        self.assertEqual(dispatch('a'), ['/a.sls'])
+        self.assertEqual(dispatch('b'), [])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class ReactorMapTestCase(TestCase):
+    '''
+    Test reading the reactor map of salt.utils.reactor.Reactor
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(dir=integration.TMP)
+        self.map_file = os.path.join(self.tmp_dir, 'reactor.conf')
+        self.write_map('- salt/auth: /srv/reactor/auth.sls\n')
+        opts = salt.config.master_config(None)
+        opts['reactor'] = self.map_file
+        with patch('salt.minion.MasterMinion', MagicMock()):
+            self.reactor = salt.utils.reactor.Reactor(opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_map(self, content, mtime=None):
+        with salt.utils.fopen(self.map_file, 'w') as fp_:
+            fp_.write(content)
+        if mtime is not None:
+            os.utime(self.map_file, (mtime, mtime))
+
+    def test_read_once(self):
+        with patch.object(self.reactor, 'read_reactor_map',
+                          wraps=self.reactor.read_reactor_map) as read:
+            self.assertEqual(self.reactor.list_reactors('salt/auth'),
+                             ['/srv/reactor/auth.sls'])
+            self.assertEqual(self.reactor.list_reactors('salt/key'), [])
+            self.assertEqual(read.call_count, 1)
+
+    def test_reload_on_change(self):
+        self.assertEqual(self.reactor.list_reactors('salt/key'), [])
+        mtime = os.path.getmtime(self.map_file)
+        self.write_map('- salt/key: /srv/reactor/key.sls\n', mtime + 10)
+        self.assertEqual(self.reactor.list_reactors('salt/key'),
+                         ['/srv/reactor/key.sls'])
+
+    def test_tag_filter(self):
+        self.reactor.event = MagicMock()
+        self.reactor.set_tag_filter()
+        self.reactor.set_tag_filter()
+        self.reactor.event.set_tag_filter.assert_called_once_with(
+            ['*salt/reactors/manage/*', 'salt/auth'], 'fnmatch')
+        # The filter follows the changes of the reactor map file
+        self.write_map('- salt/key: /srv/reactor/key.sls\n',
+                       os.path.getmtime(self.map_file) + 10)
+        self.reactor.set_tag_filter()
+        self.reactor.event.set_tag_filter.assert_called_with(
+            ['*salt/reactors/manage/*', 'salt/key'], 'fnmatch')
+
+    def test_invalid_map(self):
+        self.write_map('{{', os.path.getmtime(self.map_file) + 10)
+        self.assertEqual(self.reactor.list_reactors('salt/auth'), [])
+        os.remove(self.map_file)
+        self.assertEqual(self.reactor.list_reactors('salt/auth'), [])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class ReactWrapTestCase(TestCase):
+    '''
+    Test running the reactions in the worker threads of
+    salt.utils.reactor.ReactWrap
+    '''
+    def setUp(self):
+        self.opts = salt.config.master_config(None)
+        self.opts['reactor_worker_threads'] = 1
+        self.opts['reactor_worker_hwm'] = 1
+        salt.utils.reactor.ReactWrap.client_cache = None
+
+    def tearDown(self):
+        salt.utils.reactor.ReactWrap.client_cache = None
+
+    def test_local(self):
+        called = threading.Event()
+        threads = []
+
+        def cmd_async(*args, **kwargs):
+            threads.append(threading.current_thread())
+            called.set()
+
+        client = MagicMock()
+        client.return_value.cmd_async.side_effect = cmd_async
+        with patch('salt.client.LocalClient', client):
+            wrap = salt.utils.reactor.ReactWrap(self.opts)
+            wrap.local('*', 'test.ping')
+            self.assertTrue(called.wait(5))
+        client.return_value.cmd_async.assert_called_once_with('*', 'test.ping')
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_queue_full(self):
+        wrap = salt.utils.reactor.ReactWrap(self.opts)
+        release = threading.Event()
+        wrap.pool.fire_async(release.wait)
+        # Wait for the worker to take the blocking job off the queue
+        while not wrap.pool._job_queue.empty():
+            release.wait(0.01)
+        wrap.pool.fire_async(release.wait)
+        try:
+            with patch.object(salt.utils.reactor.log, 'error') as error:
+                wrap.local('*', 'test.ping')
+                self.assertEqual(error.call_count, 1)
+        finally:
+            release.set()
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests([ReactorDispatchTestCase, ReactorMapTestCase, ReactWrapTestCase],
+              needs_daemon=False)